@@ -0,0 +1,133 @@
+"""
+Admission control for expensive endpoints.
+
+AdmissionController lets `max_concurrent` requests run at once and queues
+up to `max_queue` more, each for at most `max_wait` seconds. Requests
+beyond that are shed immediately with Overloaded, which the API turns
+into a 503 with Retry-After (or a degraded answer), so a traffic spike
+serves some requests quickly instead of timing every client out.
+Slots are handed to waiters in arrival order.
+"""
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+
+from app.metrics import registry
+
+
+ADMISSION_IN_FLIGHT = registry.gauge(
+    "admission_in_flight", "Requests holding an admission slot", ("pool",)
+)
+ADMISSION_QUEUE_DEPTH = registry.gauge(
+    "admission_queue_depth", "Requests waiting for an admission slot", ("pool",)
+)
+ADMISSION_SHED = registry.counter(
+    "admission_shed_total", "Requests rejected by admission control", ("pool", "reason")
+)
+ADMISSION_WAIT = registry.histogram(
+    "admission_wait_seconds", "Time spent queued before admission", ("pool",)
+)
+
+
+class Overloaded(Exception):
+    """Raised when a request is shed; `retry_after` is a hint in seconds"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Server overloaded ({reason})")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    def __init__(self, name: str, max_concurrent: int = 4, max_queue: int = 64,
+                 max_wait: float = 0.5, retry_after: int = 1):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.retry_after = retry_after
+        self.active = 0
+        self.admitted = 0
+        self.shed = {"queue_full": 0, "timeout": 0}
+        self._waiters: deque = deque()
+
+    async def acquire(self, max_wait: Optional[float] = None):
+        """
+        Take a slot, queueing if needed; raises Overloaded when shed.
+        `max_wait` can shorten the queue wait (e.g. to a request deadline).
+        """
+        if self.active < self.max_concurrent and not self._waiters:
+            self._admit(0.0)
+            return
+        if len(self._waiters) >= self.max_queue:
+            self._shed("queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._report()
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(waiter, self.max_wait if max_wait is None else min(max_wait, self.max_wait))
+        except asyncio.TimeoutError:
+            self._discard(waiter)
+            self._shed("timeout")
+        except asyncio.CancelledError:
+            self._discard(waiter)
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as the client went away
+                self.release()
+            raise
+        # release() kept `active` unchanged when it handed the slot over
+        self.active -= 1
+        self._admit(time.monotonic() - start)
+
+    def release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                self._report()
+                return
+        self.active -= 1
+        self._report()
+
+    @asynccontextmanager
+    async def slot(self, max_wait: Optional[float] = None):
+        await self.acquire(max_wait)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def _admit(self, waited: float):
+        self.active += 1
+        self.admitted += 1
+        ADMISSION_WAIT.observe(waited, pool=self.name)
+        self._report()
+
+    def _shed(self, reason: str):
+        self.shed[reason] += 1
+        ADMISSION_SHED.inc(pool=self.name, reason=reason)
+        raise Overloaded(reason, self.retry_after)
+
+    def _discard(self, waiter):
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+        self._report()
+
+    def _report(self):
+        ADMISSION_IN_FLIGHT.set(self.active, pool=self.name)
+        ADMISSION_QUEUE_DEPTH.set(len(self._waiters), pool=self.name)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "in_flight": self.active,
+            "queued": len(self._waiters),
+            "admitted": self.admitted,
+            "shed": dict(self.shed),
+        }
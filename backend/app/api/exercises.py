@@ -1,48 +1,19 @@
 """
 Exercises API Router
 """
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from typing import Optional, List
-from pydantic import BaseModel
-import pandas as pd
-import os
-
-router = APIRouter()
-
-# Path to the exercise dataset
-# Path to the exercise dataset
-def get_data_path():
-    # Priority 1: Docker/Production path (ml_data in app root)
-    docker_path = os.path.join(os.getcwd(), "ml_data", "megaGymDataset.csv")
-    if os.path.exists(docker_path):
-        return docker_path
-    
-    # Priority 2: Local development path (relative to this file)
-    local_path = os.path.join(os.path.dirname(__file__), "..", "..", "..", "ml", "data", "megaGymDataset.csv")
-    if os.path.exists(local_path):
-        return local_path
-    
-    # Priority 3: CI/CD path inside backend
-    ci_path = os.path.join(os.getcwd(), "backend", "ml_data", "megaGymDataset.csv")
-    if os.path.exists(ci_path):
-        return ci_path
-        
-    return local_path
-
-DATA_PATH = get_data_path()
+from pydantic import BaseModel, Field
+import csv
+import io
 
+# Exercise and ExerciseCatalog live in the shared dataset registry
+from app.dataset import Exercise, ExerciseCatalog, get_catalog
+from app.fastjson import FAST_JSON_RESPONSES, RawJSONResponse, splice_object
+from app.compression import etag
 
-class Exercise(BaseModel):
-    """Exercise model"""
-    id: int
-    title: str
-    description: Optional[str] = None
-    type: Optional[str] = None
-    body_part: Optional[str] = None
-    equipment: Optional[str] = None
-    level: Optional[str] = None
-    rating: Optional[float] = None
-    rating_desc: Optional[str] = None
+router = APIRouter()
 
 
 class ExerciseListResponse(BaseModel):
@@ -51,23 +22,29 @@ class ExerciseListResponse(BaseModel):
     total: int
     page: int
     page_size: int
+    next_after_id: Optional[int] = None
 
 
-def load_exercises() -> pd.DataFrame:
-    """Load exercises from CSV file"""
-    if not os.path.exists(DATA_PATH):
-        return pd.DataFrame()
-    
-    df = pd.read_csv(DATA_PATH)
-    # Clean column names
-    df.columns = df.columns.str.strip().str.lower().str.replace(' ', '_')
-    return df
+MAX_BULK_IDS = 500
+
+
+class ExerciseBulkRequest(BaseModel):
+    """Request model for bulk exercise lookup"""
+    ids: List[int] = Field(..., max_length=MAX_BULK_IDS, description="Exercise IDs to fetch")
+
+
+class ExerciseBulkResponse(BaseModel):
+    """Response model for bulk exercise lookup"""
+    exercises: List[Exercise]
+    missing: List[int]
 
 
 @router.get("/", response_model=ExerciseListResponse)
 async def get_exercises(
+    response: Response,
     page: int = Query(1, ge=1, description="Page number"),
     page_size: int = Query(20, ge=1, le=100, description="Items per page"),
+    after_id: Optional[int] = Query(None, description="Keyset cursor: return exercises after this id (overrides page)"),
     body_part: Optional[str] = Query(None, description="Filter by body part"),
     equipment: Optional[str] = Query(None, description="Filter by equipment"),
     level: Optional[str] = Query(None, description="Filter by level"),
@@ -76,93 +53,143 @@ async def get_exercises(
     """
     Get all exercises with pagination and filtering
     """
-    df = load_exercises()
-    
-    if df.empty:
-        return ExerciseListResponse(exercises=[], total=0, page=page, page_size=page_size)
+    catalog = get_catalog()
     
-    # Apply filters
-    if body_part:
-        df = df[df['bodypart'].str.lower() == body_part.lower()]
-    if equipment:
-        df = df[df['equipment'].str.lower() == equipment.lower()]
-    if level:
-        df = df[df['level'].str.lower() == level.lower()]
-    if exercise_type:
-        df = df[df['type'].str.lower() == exercise_type.lower()]
+    ids = catalog.select(
+        body_part=body_part,
+        equipment=equipment,
+        level=level,
+        exercise_type=exercise_type
+    )
+    page_ids = catalog.page_ids(ids, page, page_size, after_id)
     
-    total = len(df)
+    next_after_id = None
+    if page_ids and page_ids[-1] != ids[-1]:
+        next_after_id = page_ids[-1]
     
-    # Pagination
-    start = (page - 1) * page_size
-    end = start + page_size
-    df_page = df.iloc[start:end]
+    # Pages only change with the dataset, so compressed bodies are cached per version
+    tag = etag("exercises", catalog.version, page, page_size, after_id, body_part, equipment, level, exercise_type)
     
-    exercises = []
-    for idx, row in df_page.iterrows():
-        exercises.append(Exercise(
-            id=idx,
-            title=str(row.get('title')) if pd.notna(row.get('title')) else "Unknown",
-            description=str(row.get('desc')) if pd.notna(row.get('desc')) else None,
-            type=str(row.get('type')) if pd.notna(row.get('type')) else None,
-            body_part=str(row.get('bodypart')) if pd.notna(row.get('bodypart')) else None,
-            equipment=str(row.get('equipment')) if pd.notna(row.get('equipment')) else None,
-            level=str(row.get('level')) if pd.notna(row.get('level')) else None,
-            rating=float(row.get('rating')) if pd.notna(row.get('rating')) else None,
-            rating_desc=str(row.get('ratingdesc')) if pd.notna(row.get('ratingdesc')) else None
-        ))
+    if FAST_JSON_RESPONSES:
+        return RawJSONResponse(splice_object("exercises", catalog.fragments_for(page_ids), {
+            "total": len(ids),
+            "page": page,
+            "page_size": page_size,
+            "next_after_id": next_after_id
+        }), headers={"ETag": tag})
     
+    response.headers["ETag"] = tag
     return ExerciseListResponse(
-        exercises=exercises,
-        total=total,
+        exercises=[catalog.get(i) for i in page_ids],
+        total=len(ids),
         page=page,
-        page_size=page_size
+        page_size=page_size,
+        next_after_id=next_after_id
     )
 
 
 @router.get("/filters")
-async def get_filters():
+async def get_filters(response: Response):
     """
     Get available filter options
     """
-    df = load_exercises()
-    
-    if df.empty:
-        return {
-            "body_parts": [],
-            "equipment": [],
-            "levels": [],
-            "types": []
-        }
+    catalog = get_catalog()
     
+    response.headers["ETag"] = etag("filters", catalog.version)
     return {
-        "body_parts": sorted(df['bodypart'].dropna().unique().tolist()),
-        "equipment": sorted(df['equipment'].dropna().unique().tolist()),
-        "levels": sorted(df['level'].dropna().unique().tolist()),
-        "types": sorted(df['type'].dropna().unique().tolist())
+        "body_parts": catalog.facet_values.get('bodypart', []),
+        "equipment": catalog.facet_values.get('equipment', []),
+        "levels": catalog.facet_values.get('level', []),
+        "types": catalog.facet_values.get('type', [])
     }
 
 
+EXPORT_CHUNK_ROWS = 500
+EXPORT_CSV_FIELDS = list(Exercise.model_fields)
+
+
+def _export_ndjson(catalog: ExerciseCatalog, ids: List[int]):
+    """Yield the selection as NDJSON, a chunk of rows at a time"""
+    for start in range(0, len(ids), EXPORT_CHUNK_ROWS):
+        chunk = catalog.fragments_for(ids[start:start + EXPORT_CHUNK_ROWS])
+        yield b'\n'.join(chunk) + b'\n'
+
+
+def _export_csv(catalog: ExerciseCatalog, ids: List[int]):
+    """Yield the selection as CSV with a header row, a chunk of rows at a time"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_CSV_FIELDS)
+    for start in range(0, len(ids), EXPORT_CHUNK_ROWS):
+        for exercise_id in ids[start:start + EXPORT_CHUNK_ROWS]:
+            record = catalog.get(exercise_id)
+            writer.writerow([getattr(record, field) for field in EXPORT_CSV_FIELDS])
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+@router.get("/export")
+async def export_exercises(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="Export format: ndjson or csv"),
+    body_part: Optional[str] = Query(None, description="Filter by body part"),
+    equipment: Optional[str] = Query(None, description="Filter by equipment"),
+    level: Optional[str] = Query(None, description="Filter by level"),
+    exercise_type: Optional[str] = Query(None, description="Filter by exercise type")
+):
+    """
+    Stream the full (optionally filtered) catalog as NDJSON or CSV
+    """
+    catalog = get_catalog()
+    
+    ids = catalog.select(
+        body_part=body_part,
+        equipment=equipment,
+        level=level,
+        exercise_type=exercise_type
+    )
+    
+    if format == "csv":
+        return StreamingResponse(
+            _export_csv(catalog, ids),
+            media_type="text/csv",
+            headers={"Content-Disposition": 'attachment; filename="exercises.csv"'}
+        )
+    return StreamingResponse(_export_ndjson(catalog, ids), media_type="application/x-ndjson")
+
+
+@router.post("/bulk", response_model=ExerciseBulkResponse)
+async def get_exercises_bulk(request: ExerciseBulkRequest):
+    """
+    Get many exercises by ID in one call.
+    Duplicate IDs are returned once; unknown IDs are listed in `missing`.
+    """
+    catalog = get_catalog()
+    
+    found = []
+    missing = []
+    for exercise_id in dict.fromkeys(request.ids):
+        if catalog.get(exercise_id) is None:
+            missing.append(exercise_id)
+        else:
+            found.append(exercise_id)
+    
+    if FAST_JSON_RESPONSES:
+        return RawJSONResponse(splice_object("exercises", catalog.fragments_for(found), {"missing": missing}))
+    
+    return ExerciseBulkResponse(exercises=[catalog.get(i) for i in found], missing=missing)
+
+
 @router.get("/{exercise_id}", response_model=Exercise)
 async def get_exercise(exercise_id: int):
     """
     Get a specific exercise by ID
     """
-    df = load_exercises()
+    exercise = get_catalog().get(exercise_id)
     
-    if df.empty or exercise_id < 0 or exercise_id >= len(df):
+    if exercise is None:
         raise HTTPException(status_code=404, detail="Exercise not found")
     
-    row = df.iloc[exercise_id]
-    
-    return Exercise(
-        id=exercise_id,
-        title=str(row.get('title')) if pd.notna(row.get('title')) else "Unknown",
-        description=str(row.get('desc')) if pd.notna(row.get('desc')) else None,
-        type=str(row.get('type')) if pd.notna(row.get('type')) else None,
-        body_part=str(row.get('bodypart')) if pd.notna(row.get('bodypart')) else None,
-        equipment=str(row.get('equipment')) if pd.notna(row.get('equipment')) else None,
-        level=str(row.get('level')) if pd.notna(row.get('level')) else None,
-        rating=float(row.get('rating')) if pd.notna(row.get('rating')) else None,
-        rating_desc=str(row.get('ratingdesc')) if pd.notna(row.get('ratingdesc')) else None
-    )
+    return exercise
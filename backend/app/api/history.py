@@ -0,0 +1,102 @@
+"""
+Workout History API Router
+
+Logged sets go into a write-behind buffer and are inserted into the
+`history` table in batches, so logging costs the client a memory append
+rather than a database round trip. Reads merge buffered and stored rows.
+"""
+from fastapi import APIRouter, HTTPException, Query
+from typing import Optional, List
+from pydantic import BaseModel, Field
+from datetime import datetime
+from uuid import uuid4
+import os
+
+from app.db import supabase, run_query
+from app.write_buffer import WriteBehindBuffer, BufferFullError
+
+router = APIRouter()
+
+
+# --- Models ---
+
+class HistoryCreate(BaseModel):
+    """Logged set model"""
+    exercise_title: str = Field(..., min_length=1)
+    sets: Optional[int] = Field(None, ge=0)
+    reps: Optional[int] = Field(None, ge=0)
+    weight: Optional[float] = Field(None, ge=0)
+    duration_seconds: Optional[int] = Field(None, ge=0)
+    performed_at: Optional[str] = Field(None, description="ISO timestamp; defaults to now")
+
+
+class HistoryEntry(BaseModel):
+    """Workout history entry model"""
+    id: str
+    user_id: str
+    exercise_title: str
+    sets: Optional[int] = None
+    reps: Optional[int] = None
+    weight: Optional[float] = None
+    duration_seconds: Optional[int] = None
+    performed_at: str
+    created_at: str
+
+
+HISTORY_COLUMNS = "id, user_id, exercise_title, sets, reps, weight, duration_seconds, performed_at, created_at"
+
+
+# --- Buffer ---
+
+history_buffer = WriteBehindBuffer(
+    supabase,
+    "history",
+    batch_size=int(os.getenv("HISTORY_BATCH_SIZE", "200")),
+    flush_interval=float(os.getenv("HISTORY_FLUSH_INTERVAL_SECONDS", "1.0")),
+    max_pending=int(os.getenv("HISTORY_BUFFER_MAX", "10000")),
+    backpressure_timeout=float(os.getenv("HISTORY_BACKPRESSURE_TIMEOUT_SECONDS", "2.0")),
+)
+
+
+# --- Endpoints ---
+
+@router.post("/{user_id}/history", response_model=HistoryEntry, status_code=202)
+async def log_history(user_id: str, entry: HistoryCreate):
+    """
+    Log a completed set. Accepted immediately; persisted by the buffer.
+    """
+    now = datetime.now().isoformat()
+    row = {
+        "id": str(uuid4()),
+        "user_id": user_id,
+        **entry.model_dump(),
+        "performed_at": entry.performed_at or now,
+        "created_at": now
+    }
+    
+    try:
+        await history_buffer.append(row)
+    except BufferFullError:
+        raise HTTPException(status_code=503, detail="History buffer is full, retry later", headers={"Retry-After": "1"})
+    
+    return HistoryEntry(**row)
+
+
+@router.get("/{user_id}/history", response_model=List[HistoryEntry])
+async def get_history(user_id: str, limit: int = Query(50, ge=1, le=500, description="Most recent entries to return")):
+    """
+    Get a user's workout history, newest first
+    """
+    # Snapshot the buffer first: a row flushed while the query runs is then
+    # in the snapshot, the query result, or both - never neither
+    rows = {row["id"]: row for row in history_buffer.buffered("user_id", user_id)}
+    
+    # Only the newest `limit` stored rows can make the merged page
+    res = await run_query(
+        supabase.table("history").select(HISTORY_COLUMNS).eq("user_id", user_id)
+        .order("performed_at", desc=True).limit(limit)
+    )
+    rows.update((row["id"], row) for row in res.data)
+    
+    entries = sorted(rows.values(), key=lambda r: (r.get("performed_at") or "", r["id"]), reverse=True)
+    return [HistoryEntry(**row) for row in entries[:limit]]
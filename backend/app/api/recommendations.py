@@ -1,54 +1,25 @@
 """
 Recommendations API Router
 """
-from fastapi import APIRouter, HTTPException
-from typing import Optional, List, Dict, Any
+from fastapi import APIRouter, HTTPException, Response
+from typing import Optional, List, Dict, Any, Tuple
 from pydantic import BaseModel, Field
+import logging
 import os
-import joblib
-import pandas as pd
+import time
 
 # Import the shared model class
 from app.ml.recommendation_model import GymRecommendationModel
+from app.fastjson import FAST_JSON_RESPONSES, RawJSONResponse, dumps
+# Dataset and model paths are owned by the shared registry
+from app.dataset import MODEL_PATH, registry
+from app.metrics import MODEL_LOAD_SECONDS, observe_stage
+from app.compression import etag
+from app.admission import AdmissionController, Overloaded
+from app.profiling import run_in_worker
 
 router = APIRouter()
-
-# Path to the exercise dataset and model
-def get_data_path():
-    # Priority 1: Docker/Production path (ml_data in app root)
-    docker_path = os.path.join(os.getcwd(), "ml_data", "megaGymDataset.csv")
-    if os.path.exists(docker_path):
-        return docker_path
-    
-    # Priority 2: Local development path (relative to this file)
-    local_path = os.path.join(os.path.dirname(__file__), "..", "..", "..", "ml", "data", "megaGymDataset.csv")
-    if os.path.exists(local_path):
-        return local_path
-        
-    return local_path
-
-def get_model_path():
-    # Priority 1: CI/CD Downloaded Path (inside app/ml/models)
-    # The CI workflow downloads it to backend/app/ml/models/
-    # And Docker copies backend/ to /app/
-    ci_path = os.path.join(os.path.dirname(__file__), "..", "ml", "models", "recommendation_model.joblib")
-    if os.path.exists(ci_path):
-        return ci_path
-
-    # Priority 2: Docker volume mount (if using volumes)
-    docker_vol_path = os.path.join(os.getcwd(), "ml_models", "recommendation_model.joblib")
-    if os.path.exists(docker_vol_path):
-        return docker_vol_path
-        
-    # Priority 3: Local development path
-    local_path = os.path.join(os.path.dirname(__file__), "..", "..", "..", "ml", "models", "recommendation_model.joblib")
-    if os.path.exists(local_path):
-        return local_path
-        
-    return local_path
-
-DATA_PATH = get_data_path()
-MODEL_PATH = get_model_path()
+logger = logging.getLogger(__name__)
 
 
 class RecommendationRequest(BaseModel):
@@ -59,6 +30,10 @@ class RecommendationRequest(BaseModel):
     exercise_type: Optional[str] = Field(None, description="Exercise type ('Strength', 'Stretching', 'Cardio')")
     limit: int = Field(10, ge=1, le=50, description="Number of recommendations to return")
     exclude_exercises: Optional[List[str]] = Field(None, description="Exercise titles to exclude")
+    deadline_ms: Optional[int] = Field(
+        None, ge=1, le=60000,
+        description="Time budget; when it runs out the best results so far are returned with partial=true"
+    )
 
 
 class RecommendedExercise(BaseModel):
@@ -79,63 +54,153 @@ class RecommendationResponse(BaseModel):
     recommendations: List[RecommendedExercise]
     total_found: int
     filters_applied: dict
+    degraded: bool = Field(False, description="True when overload fell back to top-rated results")
+    partial: bool = Field(False, description="True when deadline_ms ran out before the whole catalog was scored")
+
 
+def new_model() -> GymRecommendationModel:
+    model = GymRecommendationModel()
+    model.stage_observer = observe_stage
+    return model
 
-# Initialize model
-recommendation_model = GymRecommendationModel()
+
+# The published model. Scoring runs on worker threads, so a model is never
+# modified once published: reloads build a new one and swap this reference,
+# and each request reads it once.
+recommendation_model = new_model()
 
 def initialize_model():
-    """Initialize the model by loading from disk or fitting on data"""
+    """
+    Initialize the model by loading from disk or fitting on data.
+    The fitted model shares the registry's DataFrame so recommendation
+    ids always match the exercises API.
+    """
+    global recommendation_model
+    start = time.perf_counter()
+    source = "load"
+    df = registry.get_dataframe()
+    model = new_model()
     try:
         if os.path.exists(MODEL_PATH):
-            print(f"Loading model from {MODEL_PATH}")
-            recommendation_model.load(MODEL_PATH)
+            logger.info("Loading model from %s", MODEL_PATH)
+            model.load(MODEL_PATH)
+            if df.empty:
+                # No CSV available: serve the catalog the model was trained on
+                registry.adopt(model.df)
+            elif not registry.matches(model.df):
+                logger.info("Saved model does not match the current dataset. Retraining...")
+                source = "fit"
+                model.fit(df)
         else:
-            print(f"Model file not found at {MODEL_PATH}. Training new model...")
-            if os.path.exists(DATA_PATH):
-                df = pd.read_csv(DATA_PATH)
-                # Clean column names
-                df.columns = df.columns.str.strip().str.lower().str.replace(' ', '_')
-                recommendation_model.fit(df)
+            logger.info("Model file not found at %s. Training new model...", MODEL_PATH)
+            source = "fit"
+            if not df.empty:
+                model.fit(df)
             else:
-                print(f"Data file not found at {DATA_PATH}. Model initialization failed.")
-    except Exception as e:
-        print(f"Error initializing model: {e}")
+                logger.warning("Data file not found at %s. Model initialization failed.", registry.data_path)
+    except Exception:
+        logger.exception("Error initializing model")
         # Fallback to training
-        if os.path.exists(DATA_PATH):
-             print("Fallback: Training model on data...")
-             df = pd.read_csv(DATA_PATH)
-             df.columns = df.columns.str.strip().str.lower().str.replace(' ', '_')
-             recommendation_model.fit(df)
+        if not df.empty:
+             logger.info("Fallback: Training model on data...")
+             source = "fit"
+             model = new_model().fit(df)
+    
+    if model.is_fitted:
+        MODEL_LOAD_SECONDS.set(time.perf_counter() - start, source=source)
+        # Drop the model's private copy in favour of the shared frame, and
+        # record its version so responses are tagged with what was scored
+        model.df = registry.df
+        model.catalog_version = registry.catalog.version
+        recommendation_model = model
 
-# Initialize on module load
+# Initialize on module load, and refit whenever the dataset is reloaded
 initialize_model()
+registry.on_reload(initialize_model)
+
+# Scoring runs on worker threads, at most RECOMMEND_MAX_CONCURRENCY at a time;
+# past the queue limits requests get a 503 (or top-rated results, see below)
+admission = AdmissionController(
+    "recommend",
+    max_concurrent=int(os.getenv("RECOMMEND_MAX_CONCURRENCY", "4")),
+    max_queue=int(os.getenv("RECOMMEND_MAX_QUEUE", "64")),
+    max_wait=float(os.getenv("RECOMMEND_MAX_QUEUE_WAIT_SECONDS", "0.5")),
+    retry_after=int(os.getenv("RECOMMEND_RETRY_AFTER_SECONDS", "1")),
+)
+OVERLOAD_FALLBACK = os.getenv("RECOMMEND_OVERLOAD_FALLBACK", "false").lower() == "true"
+
+
+def overloaded(error: Overloaded) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Recommendation service is overloaded, retry shortly",
+        headers={"Retry-After": str(error.retry_after)}
+    )
+
+
+def fallback_recommendations(request: RecommendationRequest) -> List[Dict[str, Any]]:
+    """Top-rated exercises matching the filters, from the catalog index without scoring"""
+    catalog = registry.catalog
+    ids = catalog.select(
+        body_part=request.body_part,
+        equipment=request.equipment,
+        level=request.level,
+        exercise_type=request.exercise_type
+    )
+    exclude = [catalog.find_by_title(title) for title in request.exclude_exercises or []]
+    return [
+        {**record.model_dump(exclude={"rating_desc"}), "similarity_score": 0.0}
+        for record in catalog.top_rated(ids, request.limit, exclude)
+    ]
+
+
+async def score(model: GymRecommendationModel, request: RecommendationRequest,
+                deadline: Optional[float]) -> Tuple[List[Dict[str, Any]], bool, bool]:
+    """(recommendations, degraded, partial) under admission control and the request deadline"""
+    try:
+        # Queueing past the deadline would leave no time to score
+        max_wait = None if deadline is None else deadline - time.perf_counter()
+        async with admission.slot(max_wait):
+            recommendations, partial = await run_in_worker(
+                model.recommend_within,
+                deadline,
+                body_part=request.body_part,
+                equipment=request.equipment,
+                level=request.level,
+                exercise_type=request.exercise_type,
+                limit=request.limit,
+                exclude_exercises=request.exclude_exercises
+            )
+        return recommendations, False, partial
+    except Overloaded as e:
+        if e.reason == "timeout" and deadline is not None and time.perf_counter() >= deadline:
+            # The budget ran out before a slot did: a deadline miss, not an overload
+            return [], False, True
+        if not OVERLOAD_FALLBACK:
+            raise overloaded(e)
+        return fallback_recommendations(request), True, False
 
 
 @router.post("/", response_model=RecommendationResponse)
-async def get_recommendations(request: RecommendationRequest):
+async def get_recommendations(request: RecommendationRequest, response: Response):
     """
     Get personalized exercise recommendations based on user preferences
     """
+    # The budget covers the whole request, including any refresh and queueing
+    deadline = time.perf_counter() + request.deadline_ms / 1000 if request.deadline_ms else None
+    
+    # Picks up dataset changes (and refits) before scoring
+    registry.refresh()
+    
     if not recommendation_model.is_fitted:
         # Try to initialize again
         initialize_model()
         if not recommendation_model.is_fitted:
              raise HTTPException(status_code=500, detail="Recommendation model could not be initialized")
+    model = recommendation_model
 
     try:
-        recommendations = recommendation_model.recommend(
-            body_part=request.body_part,
-            equipment=request.equipment,
-            level=request.level,
-            exercise_type=request.exercise_type,
-            limit=request.limit,
-            exclude_exercises=request.exclude_exercises
-        )
-        
-        recommended_exercises = [
-            RecommendedExercise(**rec) for rec in recommendations
-        ]
+        recommendations, degraded, partial = await score(model, request, deadline)
         
         filters_applied = {
             "body_part": request.body_part,
@@ -144,13 +209,37 @@ async def get_recommendations(request: RecommendationRequest):
             "exercise_type": request.exercise_type
         }
         
+        # Results are a pure function of the request and the version the model was fitted on
+        exact = not (degraded or partial) and model.catalog_version is not None
+        headers = {"ETag": etag("recommend", model.catalog_version, request.model_dump_json())} if exact else {}
+        
+        if FAST_JSON_RESPONSES:
+            # Model output already has the RecommendedExercise shape
+            return RawJSONResponse(dumps({
+                "recommendations": recommendations,
+                "total_found": len(recommendations),
+                "filters_applied": {k: v for k, v in filters_applied.items() if v is not None},
+                "degraded": degraded,
+                "partial": partial
+            }), headers=headers)
+        
+        response.headers.update(headers)
+        
+        recommended_exercises = [
+            RecommendedExercise(**rec) for rec in recommendations
+        ]
+        
         return RecommendationResponse(
             recommendations=recommended_exercises,
             total_found=len(recommended_exercises),
-            filters_applied={k: v for k, v in filters_applied.items() if v is not None}
+            filters_applied={k: v for k, v in filters_applied.items() if v is not None},
+            degraded=degraded,
+            partial=partial
         )
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Error generating recommendations: {e}")
+        logger.exception("Error generating recommendations")
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -159,16 +248,22 @@ async def get_similar_exercises(exercise_id: int, limit: int = 5):
     """
     Get exercises similar to a given exercise
     """
+    registry.refresh()
+    
     if not recommendation_model.is_fitted:
          initialize_model()
          if not recommendation_model.is_fitted:
             raise HTTPException(status_code=500, detail="Recommendation model not initialized")
+    model = recommendation_model
     
     try:
-        results = recommendation_model.get_similar_exercises(exercise_id, limit)
+        async with admission.slot():
+            results = await run_in_worker(model.get_similar_exercises, exercise_id, limit)
         return {"similar_exercises": results}
+    except Overloaded as e:
+        raise overloaded(e)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
-        print(f"Error getting similar exercises: {e}")
+        logger.exception("Error getting similar exercises")
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,12 +1,16 @@
 """
 Users API Router with Supabase Integration
 """
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Response
 from typing import Optional, List
 from pydantic import BaseModel, EmailStr, Field
 from datetime import datetime
 from uuid import uuid4
-from app.db import supabase
+import os
+from app.db import supabase, run_query, run_blocking, is_unique_violation, is_foreign_key_violation
+from app.cache import InvalidationChannel, cache_from_env
+from app.dataset import Exercise, get_catalog
+from app.fastjson import FAST_JSON_RESPONSES, RawJSONResponse, dumps, join_array, with_member
 
 router = APIRouter()
 
@@ -53,8 +57,75 @@ class Favorite(BaseModel):
     created_at: str
 
 
+class ExpandedFavorite(Favorite):
+    """Favorite joined with its catalog exercise (null if the title is unknown)"""
+    exercise: Optional[Exercise] = None
 
 
+MAX_BATCH_FAVORITES = 100
+
+
+class FavoriteBatchCreate(BaseModel):
+    """Batch favorite creation model"""
+    exercise_titles: List[str] = Field(..., min_length=1, max_length=MAX_BATCH_FAVORITES)
+
+
+class FavoriteBatchDelete(BaseModel):
+    """Batch favorite removal model"""
+    favorite_ids: List[str] = Field(..., min_length=1, max_length=MAX_BATCH_FAVORITES)
+
+
+class FavoriteBatchItem(BaseModel):
+    """Per-item result of a batch favorites call"""
+    exercise_title: Optional[str] = None
+    favorite_id: Optional[str] = None
+    status: str = Field(..., description="added, exists, duplicate, removed or not_found")
+    favorite: Optional[Favorite] = None
+
+
+class FavoriteBatchResult(BaseModel):
+    """Batch favorites response model"""
+    results: List[FavoriteBatchItem]
+    added: int = 0
+    removed: int = 0
+
+
+# --- Caches ---
+
+# Favorites are returned in keyset pages on (created_at, id); X-Next-After
+# carries the cursor for the next page
+DEFAULT_FAVORITES_PAGE = 100
+MAX_FAVORITES_PAGE = 500
+FAVORITE_COLUMNS = "id, user_id, exercise_title, created_at"
+USER_COLUMNS = "id, email, name, experience_level, fitness_goals, available_equipment, created_at"
+
+# Profiles and favorites are read on every frontend page but change rarely
+user_cache = cache_from_env("user")
+favorites_cache = cache_from_env("favorites")
+
+# Optional cross-worker invalidation through the local SQLite database
+invalidation_channel = None
+if os.getenv("CACHE_INVALIDATION_CHANNEL", "false").lower() == "true" and InvalidationChannel.supported(supabase):
+    invalidation_channel = InvalidationChannel(supabase, [user_cache, favorites_cache])
+
+
+def cache_stats():
+    """Hit-rate metrics for the users router caches"""
+    return {cache.name: cache.stats() for cache in (user_cache, favorites_cache)}
+
+
+async def sync_invalidations():
+    """Apply invalidations published by other workers (rate limited)"""
+    if invalidation_channel and invalidation_channel.due():
+        await run_blocking(invalidation_channel.poll)
+
+
+async def invalidate(cache, key: str):
+    """Drop a cache entry here and, if configured, in the other workers"""
+    cache.invalidate(key)
+    if invalidation_channel:
+        await run_blocking(lambda: invalidation_channel.publish(cache.name, key))
+
 
 # --- Helpers ---
 
@@ -70,12 +141,6 @@ def get_db():
 async def create_user(user: UserCreate):
     db = get_db()
     
-    # Check if email exists
-    existing = db.table("users").select("*").eq("email", user.email).execute()
-    if existing.data:
-        # User exists, treat as login
-        return User(**existing.data[0])
-    
     user_id = str(uuid4())
     new_user = {
         "id": user_id,
@@ -87,85 +152,177 @@ async def create_user(user: UserCreate):
         "created_at": datetime.now().isoformat()
     }
     
+    # Insert first and rely on the unique email constraint, so new users
+    # cost one round trip; only returning users pay for the lookup.
     try:
-        res = db.table("users").insert(new_user).execute()
+        res = await run_query(db.table("users").insert(new_user))
         # Return the created object implies verify it was made
         if not res.data:
              raise HTTPException(status_code=500, detail="Failed to create user")
         return User(**res.data[0])
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        if not is_unique_violation(e):
+            raise HTTPException(status_code=500, detail=str(e))
+    
+    # User exists, treat as login
+    existing = await run_query(db.table("users").select(USER_COLUMNS).eq("email", user.email))
+    if not existing.data:
+        raise HTTPException(status_code=500, detail="Failed to create user")
+    return User(**existing.data[0])
 
 
 @router.get("/{user_id}", response_model=User)
 async def get_user(user_id: str):
     db = get_db()
     
-    res = db.table("users").select("*").eq("id", user_id).execute()
+    await sync_invalidations()
+    cached = user_cache.get(user_id)
+    if cached is not None:
+        return cached
+    
+    epoch = user_cache.epoch()
+    res = await run_query(db.table("users").select(USER_COLUMNS).eq("id", user_id))
     
     if not res.data:
         raise HTTPException(status_code=404, detail="User not found")
     
-    return User(**res.data[0])
+    user = User(**res.data[0])
+    user_cache.put(user_id, user, epoch)
+    return user
 
 
 @router.put("/{user_id}", response_model=User)
 async def update_user(user_id: str, user_update: UserUpdate):
     db = get_db()
     
-    # Check existence
-    existing = db.table("users").select("id").eq("id", user_id).execute()
-    if not existing.data:
-        raise HTTPException(status_code=404, detail="User not found")
+    update_data = {k: v for k, v in user_update.model_dump().items() if v is not None}
     
-    update_data = {k: v for k, v in user_update.dict().items() if v is not None}
-    
-    if not update_data:
-        return User(**db.table("users").select("*").eq("id", user_id).execute().data[0])
-        
     try:
-        res = db.table("users").update(update_data).eq("id", user_id).execute()
-        return User(**res.data[0])
+        if update_data:
+            # The update returns the changed row; no row means no such user
+            res = await run_query(db.table("users").update(update_data).eq("id", user_id))
+        else:
+            res = await run_query(db.table("users").select(USER_COLUMNS).eq("id", user_id))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    
+    if not res.data:
+        raise HTTPException(status_code=404, detail="User not found")
+    if update_data:
+        await invalidate(user_cache, user_id)
+    return User(**res.data[0])
 
 
 @router.delete("/{user_id}")
 async def delete_user(user_id: str):
     db = get_db()
     
-    # Check existence
-    existing = db.table("users").select("id").eq("id", user_id).execute()
-    if not existing.data:
-        raise HTTPException(status_code=404, detail="User not found")
-        
     try:
         # Cascading delete usually handled by SQL, but explicit is okay too if configured
-        db.table("users").delete().eq("id", user_id).execute()
-        return {"message": "User deleted successfully"}
+        res = await run_query(db.table("users").delete().eq("id", user_id))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    
+    if not res.data:
+        raise HTTPException(status_code=404, detail="User not found")
+    await invalidate(user_cache, user_id)
+    await invalidate(favorites_cache, user_id)
+    return {"message": "User deleted successfully"}
 
 
 # --- Favorites Endpoints ---
 
-@router.get("/{user_id}/favorites", response_model=List[Favorite])
-async def get_favorites(user_id: str):
+def favorites_cursor(favorite: Favorite) -> str:
+    """Opaque X-Next-After value for continuing after a favorite"""
+    return f"{favorite.created_at},{favorite.id}"
+
+
+async def load_favorites(db, user_id: str, limit: int, after: Optional[str] = None) -> List[Favorite]:
+    """
+    Read one keyset page of a user's favorites ordered by (created_at, id),
+    fetching one extra row so the caller can tell whether another page
+    follows. The default first page is served through the cache.
+    """
+    cached_page = after is None and limit == DEFAULT_FAVORITES_PAGE
+    if cached_page:
+        await sync_invalidations()
+        cached = favorites_cache.get(user_id)
+        if cached is not None:
+            return cached
+        epoch = favorites_cache.epoch()
+    
+    rows = []
+    if after is not None:
+        created_at, _, favorite_id = after.rpartition(",")
+        # (created_at, id) > cursor: later ids at the same created_at, then later created_at
+        res = await run_query(
+            db.table("favorites").select(FAVORITE_COLUMNS).eq("user_id", user_id)
+            .eq("created_at", created_at).gt("id", favorite_id).order("id").limit(limit + 1)
+        )
+        rows = res.data
+    if len(rows) <= limit:
+        query = db.table("favorites").select(FAVORITE_COLUMNS).eq("user_id", user_id)
+        if after is not None:
+            query = query.gt("created_at", created_at)
+        res = await run_query(query.order("created_at").order("id").limit(limit + 1 - len(rows)))
+        rows = rows + res.data
+    favorites = [Favorite(**fav) for fav in rows]
+    if cached_page:
+        favorites_cache.put(user_id, favorites, epoch)
+    return favorites
+
+
+@router.get("/{user_id}/favorites", response_model=List[ExpandedFavorite], response_model_exclude_unset=True)
+async def get_favorites(
+    user_id: str,
+    response: Response,
+    expand: Optional[str] = Query(None, pattern="^exercise$", description="Set to 'exercise' to embed full exercise records"),
+    limit: int = Query(DEFAULT_FAVORITES_PAGE, ge=1, le=MAX_FAVORITES_PAGE, description="Favorites per page"),
+    after: Optional[str] = Query(None, pattern="^[^,]*,[^,]+$", description="Cursor to continue after (from X-Next-After)")
+):
     db = get_db()
     
-    res = db.table("favorites").select("*").eq("user_id", user_id).execute()
-    return [Favorite(**fav) for fav in res.data]
+    favorites = await load_favorites(db, user_id, limit, after)
+    headers = {}
+    if len(favorites) > limit:
+        favorites = favorites[:limit]
+        headers["X-Next-After"] = favorites_cursor(favorites[-1])
+    
+    if expand != "exercise":
+        response.headers.update(headers)
+        return favorites
+    
+    # Join against the in-memory catalog's title index
+    catalog = get_catalog()
+    matches = [catalog.find_by_title(fav.exercise_title) for fav in favorites]
+    
+    if FAST_JSON_RESPONSES:
+        return RawJSONResponse(join_array(
+            with_member(
+                dumps(fav.model_dump()),
+                "exercise",
+                catalog.fragments_for([exercise_id])[0] if exercise_id is not None else b'null'
+            )
+            for fav, exercise_id in zip(favorites, matches)
+        ), headers=headers)
+    
+    response.headers.update(headers)
+    return [
+        ExpandedFavorite(**fav.model_dump(), exercise=catalog.get(exercise_id) if exercise_id is not None else None)
+        for fav, exercise_id in zip(favorites, matches)
+    ]
 
 
 @router.post("/{user_id}/favorites", response_model=Favorite)
 async def add_favorite(user_id: str, favorite: FavoriteCreate):
     db = get_db()
     
-    # Check duplications using unique constraint or query
-    existing = db.table("favorites").select("id").eq("user_id", user_id).eq("exercise_title", favorite.exercise_title).execute()
-    if existing.data:
-         raise HTTPException(status_code=400, detail="Exercise already in favorites")
-
     new_favorite = {
         "id": str(uuid4()),
         "user_id": user_id,
@@ -174,25 +331,102 @@ async def add_favorite(user_id: str, favorite: FavoriteCreate):
     }
     
     try:
-        res = db.table("favorites").insert(new_favorite).execute()
+        res = await run_query(db.table("favorites").insert(new_favorite))
+        await invalidate(favorites_cache, user_id)
         return Favorite(**res.data[0])
+    except HTTPException:
+        raise
     except Exception as e:
+        # Duplicates are caught by the (user_id, exercise_title) unique constraint
+        if is_unique_violation(e):
+            raise HTTPException(status_code=400, detail="Exercise already in favorites")
         # Likely foreign key violation if user doesn't exist
-        if "foreign key constraint" in str(e).lower():
+        if is_foreign_key_violation(e):
              raise HTTPException(status_code=404, detail="User not found")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/{user_id}/favorites/batch", response_model=FavoriteBatchResult)
+async def add_favorites_batch(user_id: str, batch: FavoriteBatchCreate):
+    """
+    Add several favorites at once: one query for the titles already saved,
+    one multi-row insert for the rest.
+    """
+    db = get_db()
+    
+    titles = list(dict.fromkeys(batch.exercise_titles))
+    
+    # A concurrent add can slip in between the check and the insert; retry once
+    for attempt in range(2):
+        existing = await run_query(
+            db.table("favorites").select("exercise_title").eq("user_id", user_id).in_("exercise_title", titles)
+        )
+        existing_titles = {row["exercise_title"] for row in existing.data}
+        now = datetime.now().isoformat()
+        new_favorites = [
+            {"id": str(uuid4()), "user_id": user_id, "exercise_title": title, "created_at": now}
+            for title in titles if title not in existing_titles
+        ]
+        
+        try:
+            inserted = (await run_query(db.table("favorites").insert(new_favorites))).data if new_favorites else []
+            break
+        except HTTPException:
+            raise
+        except Exception as e:
+            if is_foreign_key_violation(e):
+                raise HTTPException(status_code=404, detail="User not found")
+            if not is_unique_violation(e) or attempt:
+                raise HTTPException(status_code=500, detail=str(e))
+    
+    if inserted:
+        await invalidate(favorites_cache, user_id)
+    
+    added = {row["exercise_title"]: Favorite(**row) for row in inserted}
+    results = []
+    seen = set()
+    for title in batch.exercise_titles:
+        if title in seen:
+            results.append(FavoriteBatchItem(exercise_title=title, status="duplicate"))
+        elif title in added:
+            results.append(FavoriteBatchItem(exercise_title=title, status="added", favorite=added[title]))
+        else:
+            results.append(FavoriteBatchItem(exercise_title=title, status="exists"))
+        seen.add(title)
+    
+    return FavoriteBatchResult(results=results, added=len(added))
+
+
+@router.delete("/{user_id}/favorites/batch", response_model=FavoriteBatchResult)
+async def remove_favorites_batch(user_id: str, batch: FavoriteBatchDelete):
+    """
+    Remove several favorites in one statement
+    """
+    db = get_db()
+    
+    ids = list(dict.fromkeys(batch.favorite_ids))
+    res = await run_query(db.table("favorites").delete().eq("user_id", user_id).in_("id", ids))
+    removed = {row["id"] for row in res.data}
+    
+    if removed:
+        await invalidate(favorites_cache, user_id)
+    
+    results = [
+        FavoriteBatchItem(favorite_id=favorite_id, status="removed" if favorite_id in removed else "not_found")
+        for favorite_id in ids
+    ]
+    return FavoriteBatchResult(results=results, removed=len(removed))
+
+
 @router.delete("/{user_id}/favorites/{favorite_id}")
 async def remove_favorite(user_id: str, favorite_id: str):
     db = get_db()
     
-    res = db.table("favorites").delete().eq("id", favorite_id).eq("user_id", user_id).execute()
+    res = await run_query(db.table("favorites").delete().eq("id", favorite_id).eq("user_id", user_id))
     
     if not res.data:
         raise HTTPException(status_code=404, detail="Favorite not found")
-        
+    
+    await invalidate(favorites_cache, user_id)
+    
     return {"message": "Favorite removed successfully"}
-
-
-
@@ -0,0 +1,133 @@
+"""
+In-process caches for hot read paths.
+
+TTLCache is a bounded LRU with per-entry expiry and hit/miss counters.
+InvalidationChannel optionally fans invalidations out to the other
+workers on the host through the local SQLite database.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries expire after `ttl` seconds.
+
+    Reads take a snapshot of `epoch()` before going to the database and
+    pass it to `put()`; if an invalidation happened in between, the put
+    is dropped so a stale read cannot overwrite a fresh invalidation.
+    """
+
+    def __init__(self, name: str, maxsize: int = 10000, ttl: float = 60.0):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._epoch = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is not _MISSING and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not _MISSING:
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def epoch(self) -> int:
+        """Invalidation counter to pass to put()"""
+        return self._epoch
+
+    def put(self, key: Hashable, value: Any, epoch: Optional[int] = None):
+        with self._lock:
+            if epoch is not None and epoch != self._epoch:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._epoch += 1
+            self.invalidations += 1
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class InvalidationChannel:
+    """
+    Cross-worker cache invalidation through the local database.
+
+    publish() records (cache, key) in the database; poll() applies any
+    entries written by other workers since the last poll, at most once
+    per `poll_interval` seconds. Requires a client exposing
+    publish_invalidation()/invalidations_since() (SQLiteClient does).
+    """
+
+    def __init__(self, client, caches: List[TTLCache], poll_interval: float = 0.5):
+        self.client = client
+        self.caches = {cache.name: cache for cache in caches}
+        self.poll_interval = poll_interval
+        self._last_seq = client.latest_invalidation()
+        self._next_poll = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def supported(client) -> bool:
+        return hasattr(client, "publish_invalidation") and hasattr(client, "invalidations_since")
+
+    def publish(self, cache_name: str, key: str):
+        self.client.publish_invalidation(cache_name, key)
+
+    def due(self) -> bool:
+        return time.monotonic() >= self._next_poll
+
+    def poll(self):
+        with self._lock:
+            self._next_poll = time.monotonic() + self.poll_interval
+            for seq, cache_name, key in self.client.invalidations_since(self._last_seq):
+                cache = self.caches.get(cache_name)
+                if cache is not None:
+                    cache.invalidate(key)
+                self._last_seq = max(self._last_seq, seq)
+
+
+def cache_from_env(name: str, default_size: int = 10000, default_ttl: float = 60.0) -> TTLCache:
+    """Build a cache sized by <NAME>_CACHE_SIZE / <NAME>_CACHE_TTL_SECONDS"""
+    prefix = name.upper()
+    return TTLCache(
+        name,
+        maxsize=int(os.getenv(f"{prefix}_CACHE_SIZE", default_size)),
+        ttl=float(os.getenv(f"{prefix}_CACHE_TTL_SECONDS", default_ttl)),
+    )
@@ -0,0 +1,201 @@
+"""
+Response compression.
+
+CompressionMiddleware compresses response bodies of compressible types
+with brotli (when the package is installed) or gzip, per the request's
+Accept-Encoding. Bodies under COMPRESSION_MINIMUM_SIZE bytes are sent
+as they are, and streaming responses are compressed chunk by chunk.
+
+Responses with an ETag are versioned: the endpoint derives the tag from
+the dataset generation and the request, so the compressed bytes are kept
+in a TTLCache keyed by (ETag, encoding) and each body is compressed once
+per version rather than once per request.
+"""
+import gzip
+import hashlib
+import os
+import zlib
+from typing import Optional
+
+from app.cache import cache_from_env
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - depends on the environment
+    brotli = None
+
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+# Set RESPONSE_COMPRESSION=false to leave compression to a proxy
+RESPONSE_COMPRESSION = os.getenv("RESPONSE_COMPRESSION", "true").lower() not in ("0", "false", "no")
+
+compressed_cache = cache_from_env("compressed", default_size=1000, default_ttl=300.0)
+
+
+def etag(*parts) -> str:
+    """Strong ETag for a response determined by `parts` (dataset generation, request parameters)"""
+    return '"' + hashlib.blake2b(repr(parts).encode("utf-8"), digest_size=12).hexdigest() + '"'
+
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """'br', 'gzip' or None for an Accept-Encoding header value"""
+    accepted = {}
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip()] = quality
+    wildcard = accepted.get("*", 0.0)
+    if brotli is not None and accepted.get("br", wildcard) > 0:
+        return "br"
+    if accepted.get("gzip", wildcard) > 0:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    # mtime=0 keeps the output (and so the cache) independent of the clock
+    return gzip.compress(body, compresslevel=6, mtime=0)
+
+
+class StreamCompressor:
+    """Incremental compressor flushing after every chunk so streams stay progressive"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=5)
+        else:
+            self._compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+
+    def compress(self, chunk: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.process(chunk) + self._compressor.flush()
+        return self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing responses for clients that accept it"""
+
+    def __init__(self, app, minimum_size: int = 500, cache=None):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.cache = cache
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or [])
+        encoding = negotiate(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        stream = None
+
+        async def compressing_send(message):
+            nonlocal start, stream
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start is not None:
+                response_start, start = start, None
+                if not self._compressible(response_start) or (not more_body and len(body) < self.minimum_size):
+                    stream = False
+                    await send(response_start)
+                    await send(message)
+                    return
+                if more_body:
+                    stream = StreamCompressor(encoding)
+                    await send(self._with_encoding(response_start, encoding, None))
+                else:
+                    compressed = self._compressed(body, encoding, response_start)
+                    await send(self._with_encoding(response_start, encoding, len(compressed)))
+                    await send({"type": "http.response.body", "body": compressed})
+                    return
+
+            if not stream:
+                await send(message)
+                return
+            chunk = stream.compress(body) if body else b""
+            if not more_body:
+                chunk += stream.finish()
+            await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        await self.app(scope, receive, compressing_send)
+
+    @staticmethod
+    def _compressible(start) -> bool:
+        if start["status"] < 200 or start["status"] in (204, 304):
+            return False
+        content_type = b""
+        for name, value in start.get("headers", []):
+            name = name.lower()
+            if name == b"content-encoding":
+                return False
+            if name == b"content-type":
+                content_type = value
+        return content_type.decode("latin-1").startswith(COMPRESSIBLE_TYPES)
+
+    def _compressed(self, body: bytes, encoding: str, start) -> bytes:
+        tag = _header(start, b"etag")
+        if tag is None or self.cache is None:
+            return compress(body, encoding)
+        key = (tag, encoding)
+        compressed = self.cache.get(key)
+        if compressed is None:
+            compressed = compress(body, encoding)
+            self.cache.put(key, compressed)
+        return compressed
+
+    @staticmethod
+    def _with_encoding(start, encoding: str, length: Optional[int]):
+        headers = []
+        for name, value in start.get("headers", []):
+            lowered = name.lower()
+            if lowered == b"content-length":
+                continue
+            if lowered == b"etag" and value.endswith(b'"'):
+                # A different representation needs a different strong tag
+                value = value[:-1] + b"-" + encoding.encode("latin-1") + b'"'
+            if lowered == b"vary" and b"accept-encoding" not in value.lower():
+                value += b", Accept-Encoding"
+            headers.append((name, value))
+        if length is not None:
+            headers.append((b"content-length", str(length).encode("latin-1")))
+        headers.append((b"content-encoding", encoding.encode("latin-1")))
+        if _header(start, b"vary") is None:
+            headers.append((b"vary", b"Accept-Encoding"))
+        return {**start, "headers": headers}
+
+
+def _header(start, name: bytes) -> Optional[bytes]:
+    for key, value in start.get("headers", []):
+        if key.lower() == name:
+            return value
+    return None
+
+
+def cache_stats():
+    return {compressed_cache.name: compressed_cache.stats()}
@@ -0,0 +1,367 @@
+"""
+Dataset Registry
+
+Single owner of the exercise dataset shared by all routers: resolves the
+dataset and model paths, loads the CSV once, and rebuilds the in-memory
+catalog (records, JSON fragments and facet index) when the file changes.
+The recommender's DataFrame is the registry's DataFrame, so browse and
+recommend endpoints always agree on exercise ids.
+"""
+from typing import Callable, Iterable, Optional, List, Dict
+from pydantic import BaseModel
+from bisect import bisect_right
+import numpy as np
+import pandas as pd
+import threading
+import os
+
+from app.fastjson import dumps
+
+
+# Path to the exercise dataset
+def get_data_path():
+    # Priority 1: Docker/Production path (ml_data in app root)
+    docker_path = os.path.join(os.getcwd(), "ml_data", "megaGymDataset.csv")
+    if os.path.exists(docker_path):
+        return docker_path
+    
+    # Priority 2: Local development path (relative to this file)
+    local_path = os.path.join(os.path.dirname(__file__), "..", "..", "ml", "data", "megaGymDataset.csv")
+    if os.path.exists(local_path):
+        return local_path
+    
+    # Priority 3: CI/CD path inside backend
+    ci_path = os.path.join(os.getcwd(), "backend", "ml_data", "megaGymDataset.csv")
+    if os.path.exists(ci_path):
+        return ci_path
+        
+    return local_path
+
+
+# Path to the trained model
+def get_model_path():
+    # Priority 1: CI/CD Downloaded Path (inside app/ml/models)
+    # The CI workflow downloads it to backend/app/ml/models/
+    # And Docker copies backend/ to /app/
+    ci_path = os.path.join(os.path.dirname(__file__), "ml", "models", "recommendation_model.joblib")
+    if os.path.exists(ci_path):
+        return ci_path
+
+    # Priority 2: Docker volume mount (if using volumes)
+    docker_vol_path = os.path.join(os.getcwd(), "ml_models", "recommendation_model.joblib")
+    if os.path.exists(docker_vol_path):
+        return docker_vol_path
+        
+    # Priority 3: Local development path
+    local_path = os.path.join(os.path.dirname(__file__), "..", "..", "ml", "models", "recommendation_model.joblib")
+    if os.path.exists(local_path):
+        return local_path
+        
+    return local_path
+
+
+DATA_PATH = get_data_path()
+MODEL_PATH = get_model_path()
+
+
+def clean_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Normalize dataset column names (e.g. 'BodyPart' -> 'bodypart')"""
+    df.columns = df.columns.str.strip().str.lower().str.replace(' ', '_')
+    return df
+
+
+def load_exercises(data_path: Optional[str] = None) -> pd.DataFrame:
+    """Load exercises from CSV file"""
+    data_path = data_path or DATA_PATH
+    if not os.path.exists(data_path):
+        return pd.DataFrame()
+    
+    return clean_columns(pd.read_csv(data_path))
+
+
+class Exercise(BaseModel):
+    """Exercise model"""
+    id: int
+    title: str
+    description: Optional[str] = None
+    type: Optional[str] = None
+    body_part: Optional[str] = None
+    equipment: Optional[str] = None
+    level: Optional[str] = None
+    rating: Optional[float] = None
+    rating_desc: Optional[str] = None
+
+
+# Query filter name -> dataset column
+FACET_COLUMNS = {
+    'body_part': 'bodypart',
+    'equipment': 'equipment',
+    'level': 'level',
+    'exercise_type': 'type'
+}
+
+
+class ExerciseCatalog:
+    """
+    In-memory exercise catalog built once per dataset version.
+    Holds prebuilt Exercise records, their pre-serialized JSON fragments
+    and a facet index mapping each lowercased facet value to the sorted
+    ids that carry it.
+    """
+
+    MAX_CACHED_SELECTIONS = 256
+
+    def __init__(self, df: pd.DataFrame, version=None):
+        self.version = version
+        self.records: List[Exercise] = []
+        self.fragments: List[bytes] = []
+        self.ids: List[int] = []
+        self.facets: Dict[str, Dict[str, List[int]]] = {}
+        self.facet_values: Dict[str, List[str]] = {}
+        self._positions: Dict[int, int] = {}
+        self._titles: Dict[str, int] = {}
+        self._selections: Dict[tuple, List[int]] = {}
+        self._id_array: Optional[np.ndarray] = None
+        self._rating_rank: Optional[np.ndarray] = None
+        self.selection_hits = 0
+        self.selection_misses = 0
+
+        if df.empty:
+            return
+
+        def column(name):
+            if name not in df.columns:
+                return [None] * len(df)
+            values = df[name]
+            return values.astype(object).where(values.notna(), None).tolist()
+
+        ids = [int(i) for i in df.index]
+        titles = column('title')
+        descs = column('desc')
+        types = column('type')
+        body_parts = column('bodypart')
+        equipment = column('equipment')
+        levels = column('level')
+        ratings = column('rating')
+        rating_descs = column('ratingdesc')
+
+        def text(value):
+            return str(value) if value is not None else None
+
+        for i, exercise_id in enumerate(ids):
+            self.records.append(Exercise(
+                id=exercise_id,
+                title=text(titles[i]) or "Unknown",
+                description=text(descs[i]),
+                type=text(types[i]),
+                body_part=text(body_parts[i]),
+                equipment=text(equipment[i]),
+                level=text(levels[i]),
+                rating=float(ratings[i]) if ratings[i] is not None else None,
+                rating_desc=text(rating_descs[i])
+            ))
+
+        # Records are kept in id order so keyset cursors can bisect
+        order = sorted(range(len(ids)), key=ids.__getitem__)
+        self.records = [self.records[i] for i in order]
+        self.ids = [ids[i] for i in order]
+        self._positions = {exercise_id: pos for pos, exercise_id in enumerate(self.ids)}
+        self.fragments = [dumps(record.model_dump()) for record in self.records]
+        # Lowercased title -> id (first occurrence wins), for joining favorites
+        for record in self.records:
+            self._titles.setdefault(record.title.lower(), record.id)
+
+        for column_name in FACET_COLUMNS.values():
+            index: Dict[str, List[int]] = {}
+            values = set()
+            for exercise_id, value in zip(ids, column(column_name)):
+                if value is None:
+                    continue
+                value = str(value)
+                values.add(value)
+                index.setdefault(value.lower(), []).append(exercise_id)
+            for posting in index.values():
+                posting.sort()
+            self.facets[column_name] = index
+            self.facet_values[column_name] = sorted(values)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def get(self, exercise_id: int) -> Optional[Exercise]:
+        """Return the record for an id, or None"""
+        pos = self._positions.get(exercise_id)
+        return self.records[pos] if pos is not None else None
+
+    def find_by_title(self, title: str) -> Optional[int]:
+        """Return the id of the exercise with this title (case-insensitive), or None"""
+        return self._titles.get(title.lower())
+
+    def select(self, **filters: Optional[str]) -> List[int]:
+        """
+        Return the sorted ids matching all given facet filters.
+        Intersections are cached per filter combination.
+        """
+        active = tuple(sorted(
+            (FACET_COLUMNS[name], value.lower())
+            for name, value in filters.items() if value
+        ))
+        if not active:
+            return self.ids
+
+        cached = self._selections.get(active)
+        if cached is not None:
+            self.selection_hits += 1
+            return cached
+        self.selection_misses += 1
+
+        postings = sorted(
+            (self.facets.get(column_name, {}).get(value, []) for column_name, value in active),
+            key=len
+        )
+        selected = postings[0]
+        for posting in postings[1:]:
+            members = set(posting)
+            selected = [i for i in selected if i in members]
+
+        if len(self._selections) >= self.MAX_CACHED_SELECTIONS:
+            self._selections.clear()
+        self._selections[active] = selected
+        return selected
+
+    def page_ids(self, ids: List[int], page: int, page_size: int, after_id: Optional[int] = None) -> List[int]:
+        """Slice a selection by keyset cursor (after_id) or page offset"""
+        if after_id is not None:
+            start = bisect_right(ids, after_id)
+        else:
+            start = (page - 1) * page_size
+        return ids[start:start + page_size]
+
+    def page(self, ids: List[int], page: int, page_size: int, after_id: Optional[int] = None) -> List[Exercise]:
+        """Return the records of one page of a selection"""
+        return [self.records[self._positions[i]] for i in self.page_ids(ids, page, page_size, after_id)]
+
+    def top_rated(self, ids: List[int], limit: int, exclude: Iterable[int] = ()) -> List[Exercise]:
+        """
+        The `limit` highest-rated records of a selection (unrated last, ties
+        by id), skipping `exclude`. Cheap enough to answer while overloaded.
+        """
+        if self._rating_rank is None:
+            ratings = np.array([-np.inf if r.rating is None else r.rating for r in self.records])
+            order = np.argsort(-ratings, kind='stable')
+            rank = np.empty(len(order), dtype=np.int64)
+            rank[order] = np.arange(len(order))
+            self._id_array, self._rating_rank = np.array(self.ids, dtype=np.int64), rank
+        # Records are in id order, so positions follow from a binary search
+        positions = np.searchsorted(self._id_array, np.asarray(ids, dtype=np.int64))
+        ranked = positions[np.argsort(self._rating_rank[positions], kind='stable')]
+        excluded = set(exclude)
+        results = []
+        for pos in ranked:
+            record = self.records[pos]
+            if record.id in excluded:
+                continue
+            results.append(record)
+            if len(results) == limit:
+                break
+        return results
+
+    def fragments_for(self, ids: List[int]) -> List[bytes]:
+        """Return the pre-serialized JSON of the given (known) ids"""
+        return [self.fragments[self._positions[i]] for i in ids]
+
+
+class DatasetRegistry:
+    """
+    Owns the loaded exercise DataFrame and its catalog.
+
+    The registry checks the CSV's mtime/size on access and reloads when it
+    changes, bumping `generation` and notifying reload listeners (the
+    recommender refits on the new data). When no CSV is available, a
+    DataFrame can be adopted from a loaded model instead.
+    """
+
+    def __init__(self, data_path: str):
+        self.data_path = data_path
+        self.source_version = None
+        self.generation = 0
+        self.df = pd.DataFrame()
+        self.catalog = ExerciseCatalog(self.df, self.generation)
+        self._loaded = False
+        self._listeners: List[Callable[[], None]] = []
+        self._lock = threading.RLock()
+
+    def _stat_version(self):
+        try:
+            stat = os.stat(self.data_path)
+            return (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+
+    def refresh(self) -> bool:
+        """Reload if the CSV changed since the last load. Returns True on reload."""
+        version = self._stat_version()
+        if self._loaded and (version is None or version == self.source_version):
+            # Unchanged, or the file went away: keep serving what we have
+            return False
+        with self._lock:
+            if self._loaded and (version is None or version == self.source_version):
+                return False
+            changed = self._loaded
+            self._set(load_exercises(self.data_path) if version else pd.DataFrame(), version)
+        if changed:
+            self._notify()
+        return True
+
+    def reload(self):
+        """Force a reload from disk and notify listeners"""
+        with self._lock:
+            version = self._stat_version()
+            self._set(load_exercises(self.data_path) if version else pd.DataFrame(), version)
+        self._notify()
+
+    def adopt(self, df: pd.DataFrame):
+        """Serve an externally loaded DataFrame (e.g. a model's) when there is no CSV"""
+        with self._lock:
+            self._set(df, self.source_version)
+
+    def _set(self, df: pd.DataFrame, version):
+        self.df = df
+        self.source_version = version
+        self.generation += 1
+        # (mtime/size, generation): distinct across processes serving different files
+        self.catalog = ExerciseCatalog(df, (version, self.generation))
+        self._loaded = True
+
+    def on_reload(self, listener: Callable[[], None]):
+        """Register a callback run after the dataset is reloaded"""
+        self._listeners.append(listener)
+
+    def _notify(self):
+        for listener in self._listeners:
+            listener()
+
+    def matches(self, df: Optional[pd.DataFrame]) -> bool:
+        """Whether df has the same rows (by id and title) as the registry's DataFrame"""
+        if df is None or len(df) != len(self.df) or 'title' not in df.columns:
+            return False
+        return df.index.equals(self.df.index) and df['title'].equals(self.df['title'])
+
+    def get_dataframe(self) -> pd.DataFrame:
+        """Return the current exercise DataFrame"""
+        self.refresh()
+        return self.df
+
+    def get_catalog(self) -> ExerciseCatalog:
+        """Return the current catalog"""
+        self.refresh()
+        return self.catalog
+
+
+# Create a singleton instance
+registry = DatasetRegistry(DATA_PATH)
+
+
+def get_catalog() -> ExerciseCatalog:
+    """Return the current in-memory catalog"""
+    return registry.get_catalog()
@@ -2,8 +2,27 @@
 Supabase Client Initialization
 """
 import os
+import asyncio
+import inspect
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException
 from supabase import create_client, Client
 from app.mock_db import MockClient
+from app.sqlite_db import SQLiteClient
+
+
+def get_local_client():
+    # Durable SQLite file if LOCAL_DB_PATH is set, otherwise in-memory mock
+    local_path = os.environ.get("LOCAL_DB_PATH")
+    if local_path:
+        return SQLiteClient(local_path)
+    client = MockClient()
+    # Optional synthetic users/favorites (see ml/generate_catalog.py)
+    fixtures_path = os.environ.get("MOCK_FIXTURES_PATH")
+    if fixtures_path:
+        counts = client.load_fixtures(fixtures_path)
+        print(f"Loaded mock fixtures from {fixtures_path}: {counts}")
+    return client
 
 def get_supabase():
     url = os.environ.get("SUPABASE_URL")
@@ -11,13 +30,60 @@ def get_supabase():
     
     # Check if URL/Key are set and not just placeholders
     if not url or not key or "your-project" in url:
-        return MockClient()
+        return get_local_client()
         
     try:
         return create_client(url, key)
     except Exception as e:
         print(f"Error connecting to Supabase: {e}")
-        return MockClient()
+        return get_local_client()
 
 # Create a singleton instance
 supabase = get_supabase()
+
+
+# --- Error mapping ---
+
+def is_unique_violation(error: Exception) -> bool:
+    """Whether a client error is a unique constraint violation (Postgres 23505)"""
+    return getattr(error, "code", None) == "23505" or "duplicate key" in str(error).lower()
+
+
+def is_foreign_key_violation(error: Exception) -> bool:
+    """Whether a client error is a foreign key violation (Postgres 23503)"""
+    return getattr(error, "code", None) == "23503" or "foreign key constraint" in str(error).lower()
+
+
+# --- Async access ---
+
+# supabase-py's query builders are synchronous; run them on a bounded pool so
+# a slow round trip never blocks the event loop. The singleton client keeps
+# its HTTP session, so pool threads share pooled connections.
+DB_MAX_WORKERS = int(os.environ.get("DB_MAX_WORKERS", "16"))
+DB_TIMEOUT_SECONDS = float(os.environ.get("DB_TIMEOUT_SECONDS", "10"))
+
+_executor = ThreadPoolExecutor(max_workers=DB_MAX_WORKERS, thread_name_prefix="db")
+
+
+async def run_query(query, timeout: float = DB_TIMEOUT_SECONDS):
+    """
+    Execute a query builder without blocking the event loop.
+    Async clients (whose execute() is a coroutine) are awaited directly.
+    Raises HTTPException(504) if the call exceeds `timeout` seconds.
+    """
+    if inspect.iscoroutinefunction(query.execute):
+        return await _with_timeout(query.execute(), timeout)
+    return await run_blocking(query.execute, timeout)
+
+
+async def run_blocking(fn, timeout: float = DB_TIMEOUT_SECONDS):
+    """Run a blocking database call on the DB thread pool"""
+    pending = asyncio.get_running_loop().run_in_executor(_executor, fn)
+    return await _with_timeout(pending, timeout)
+
+
+async def _with_timeout(pending, timeout: float):
+    try:
+        return await asyncio.wait_for(pending, timeout)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Database request timed out")
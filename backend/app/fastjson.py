@@ -0,0 +1,58 @@
+"""
+Fast JSON encoding for large list responses.
+
+Uses orjson when it is installed and falls back to the standard library
+encoder otherwise. List endpoints splice pre-serialized per-item fragments
+into the response body and return it as a raw Response, skipping the
+response_model re-validation FastAPI would otherwise do.
+"""
+import os
+from typing import Any, Dict, Iterable
+
+from fastapi import Response
+
+try:
+    import orjson
+
+    def dumps(obj: Any) -> bytes:
+        """Serialize obj to compact JSON bytes"""
+        return orjson.dumps(obj)
+
+except ImportError:  # pragma: no cover - depends on the environment
+    import json
+
+    def dumps(obj: Any) -> bytes:
+        """Serialize obj to compact JSON bytes"""
+        return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+# Set FAST_JSON_RESPONSES=false to fall back to regular response_model serialization
+FAST_JSON_RESPONSES = os.getenv("FAST_JSON_RESPONSES", "true").lower() not in ("0", "false", "no")
+
+
+def join_array(fragments: Iterable[bytes]) -> bytes:
+    """Join pre-serialized JSON values into a JSON array"""
+    return b'[' + b','.join(fragments) + b']'
+
+
+def splice_object(key: str, fragments: Iterable[bytes], fields: Dict[str, Any]) -> bytes:
+    """
+    Build a JSON object whose `key` holds the spliced fragments
+    and whose remaining members are `fields`.
+    """
+    head = b'{' + dumps(key) + b':' + join_array(fragments)
+    if not fields:
+        return head + b'}'
+    return head + b',' + dumps(fields)[1:]
+
+
+def with_member(obj: bytes, key: str, value: bytes) -> bytes:
+    """Append a pre-serialized member to an encoded JSON object"""
+    if obj == b'{}':
+        return b'{' + dumps(key) + b':' + value + b'}'
+    return obj[:-1] + b',' + dumps(key) + b':' + value + b'}'
+
+
+class RawJSONResponse(Response):
+    """Response whose content is already-encoded JSON bytes"""
+    media_type = "application/json"
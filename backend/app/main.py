@@ -2,18 +2,36 @@
 Gym Exercise Recommendation API - Main Entry Point 
 and testing pull request
 """
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
+import logging
 import os
 
-from app.api import exercises, recommendations, users
+from app.api import exercises, recommendations, users, history
+from app.traffic import capture_from_env
+from app.profiling import profiling_from_env
+from app import compression, dataset, metrics
 
 # Load environment variables
 load_dotenv()
 
+# Per-request debug logging (e.g. in the recommender) only shows with LOG_LEVEL=DEBUG
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING").upper())
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start background writers; drain them on shutdown"""
+    history.history_buffer.start()
+    yield
+    await history.history_buffer.stop()
+
+
 # Create FastAPI app
 app = FastAPI(
+    lifespan=lifespan,
     title="Gym Exercise Recommendation API",
     description="API for recommending gym exercises based on user preferences",
     version="1.0.0",
@@ -30,12 +48,30 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Browsers hide other response headers from scripts; favorites pages need the cursor
+    expose_headers=["X-Next-After"],
 )
 
+# Optional request capture for benchmarks/replay.py (TRAFFIC_CAPTURE_PATH)
+traffic_writer = capture_from_env(app)
+
+# Optional sampled request profiling (PROFILE_DIR)
+profile_store = profiling_from_env(app)
+
+if compression.RESPONSE_COMPRESSION:
+    app.add_middleware(
+        compression.CompressionMiddleware,
+        minimum_size=int(os.getenv("COMPRESSION_MINIMUM_SIZE", "500")),
+        cache=compression.compressed_cache,
+    )
+
+app.add_middleware(metrics.MetricsMiddleware, routes_app=app)
+
 # Include routers
 app.include_router(exercises.router, prefix="/api/exercises", tags=["Exercises"])
 app.include_router(recommendations.router, prefix="/api/recommend", tags=["Recommendations"])
 app.include_router(users.router, prefix="/api/users", tags=["Users"])
+app.include_router(history.router, prefix="/api/users", tags=["History"])
 
 
 @app.get("/", tags=["Health"])
@@ -54,5 +90,46 @@ async def detailed_health():
     return {
         "status": "healthy",
         "api": "up",
-        "version": "1.0.0"
+        "version": "1.0.0",
+        "caches": cache_stats(),
+        "history_buffer": history.history_buffer.stats(),
+        "admission": {recommendations.admission.name: recommendations.admission.stats()}
     }
+
+
+def cache_stats():
+    """Hit-rate metrics for every in-process cache"""
+    return {**users.cache_stats(), **compression.cache_stats()}
+
+
+def collect_runtime_metrics():
+    """Scrape-time gauges for cache hit ratios and the history buffer"""
+    stats_by_cache = cache_stats()
+    yield metrics.gauge_family(
+        "cache_hit_ratio", "Hit ratio of in-process caches", ("cache",),
+        [((name,), stats["hit_rate"]) for name, stats in stats_by_cache.items()]
+    )
+    yield metrics.gauge_family(
+        "cache_entries", "Entries held by in-process caches", ("cache",),
+        [((name,), stats["size"]) for name, stats in stats_by_cache.items()]
+    )
+    catalog = dataset.registry.catalog
+    if catalog is not None:
+        lookups = catalog.selection_hits + catalog.selection_misses
+        yield metrics.gauge_family(
+            "catalog_selection_cache_hit_ratio", "Hit ratio of the catalog facet selection cache", (),
+            [((), catalog.selection_hits / lookups if lookups else 0.0)]
+        )
+    yield metrics.gauge_family(
+        "history_buffer_pending", "Workout history rows waiting to be written", (),
+        [((), history.history_buffer.stats()["pending"])]
+    )
+
+
+metrics.registry.add_collector(collect_runtime_metrics)
+
+
+@app.get("/metrics", tags=["Health"], include_in_schema=False)
+async def prometheus_metrics():
+    """Prometheus text-format metrics"""
+    return Response(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
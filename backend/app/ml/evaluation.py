@@ -0,0 +1,139 @@
+"""
+Offline evaluation helpers for the recommendation model.
+
+Relevance is derived from exercise facets (body part, type, equipment,
+level): a candidate's gain is the number of facets it shares with the
+query exercise. Used by ml/evaluate.py and the training sweep.
+"""
+import math
+import time
+from typing import Any, Callable, Dict, List, Sequence
+
+import numpy as np
+from sklearn.model_selection import train_test_split
+
+
+FACETS = ['bodypart', 'type', 'equipment', 'level']
+
+
+def facet_gain(query: Dict[str, Any], candidate: Dict[str, Any], facets: Sequence[str] = FACETS) -> int:
+    """Number of facets the candidate shares with the query (case-insensitive)"""
+    gain = 0
+    for facet in facets:
+        a, b = query.get(facet), candidate.get(facet)
+        if isinstance(a, str) and isinstance(b, str) and a.lower() == b.lower():
+            gain += 1
+    return gain
+
+
+def precision_at_k(gains: Sequence[float], k: int, threshold: float = 1) -> float:
+    """Share of the top k results whose gain reaches threshold"""
+    if k <= 0:
+        return 0.0
+    return sum(1 for g in list(gains)[:k] if g >= threshold) / k
+
+
+def dcg_at_k(gains: Sequence[float], k: int) -> float:
+    return sum((2 ** g - 1) / math.log2(rank + 2) for rank, g in enumerate(list(gains)[:k]))
+
+
+def ndcg_at_k(gains: Sequence[float], ideal_gains: Sequence[float], k: int) -> float:
+    """DCG of the ranking over the DCG of the best possible ranking"""
+    ideal = dcg_at_k(sorted(ideal_gains, reverse=True), k)
+    if ideal == 0:
+        return 0.0
+    return dcg_at_k(gains, k) / ideal
+
+
+def latency_percentiles(samples_ms: List[float]) -> Dict[str, float]:
+    """p50/p95/p99 (and mean) of latency samples in milliseconds"""
+    if not samples_ms:
+        return {'p50_ms': 0.0, 'p95_ms': 0.0, 'p99_ms': 0.0, 'mean_ms': 0.0}
+    p50, p95, p99 = np.percentile(samples_ms, [50, 95, 99])
+    return {
+        'p50_ms': round(float(p50), 4),
+        'p95_ms': round(float(p95), 4),
+        'p99_ms': round(float(p99), 4),
+        'mean_ms': round(float(np.mean(samples_ms)), 4),
+    }
+
+
+def timed(fn: Callable[[], Any], samples_ms: List[float]) -> Any:
+    """Call fn, append its wall time in milliseconds to samples_ms and return its result"""
+    start = time.perf_counter()
+    result = fn()
+    samples_ms.append((time.perf_counter() - start) * 1000)
+    return result
+
+
+def sample_queries(df, fraction, random_state):
+    """
+    Positions of a reproducible sample of catalog exercises to query with.
+    The model is fitted on the whole catalog it serves, so these queries
+    are in-sample: each query's own row is left out of its results, not
+    out of the index.
+    """
+    _, positions = train_test_split(
+        list(range(len(df))), test_size=fraction, random_state=random_state
+    )
+    return sorted(positions)
+
+
+def evaluate_similar(model, queries, k, repeats):
+    """
+    Query get_similar_exercises with each sampled exercise. Ideal gains
+    are the best k facet gains available anywhere else in the catalog.
+    """
+    records = model.df.to_dict('records')
+    precisions, ndcgs, latencies = [], [], []
+
+    for position in queries:
+        query = records[position]
+        for _ in range(repeats):
+            results = timed(lambda: model.get_similar_exercises(position, limit=k), latencies)
+
+        gains = [facet_gain(query, records[r['id']]) for r in results]
+        ideal = sorted((facet_gain(query, c) for i, c in enumerate(records) if i != position), reverse=True)[:k]
+        precisions.append(precision_at_k(gains, k, threshold=2))
+        ndcgs.append(ndcg_at_k(gains, ideal, k))
+
+    return precisions, ndcgs, latencies
+
+
+def evaluate_recommend(model, queries, k, repeats):
+    """
+    Ask recommend() for the sampled exercise's body part and level (as a
+    user filling in the form would) and score how well the results match
+    its remaining facets, type and equipment.
+    """
+    records = model.df.to_dict('records')
+    precisions, ndcgs, latencies = [], [], []
+
+    for position in queries:
+        query = records[position]
+        body_part, level = query.get('bodypart'), query.get('level')
+        if not isinstance(body_part, str):
+            continue
+        level = level if isinstance(level, str) else None
+
+        for _ in range(repeats):
+            results = timed(
+                lambda: model.recommend(body_part=body_part, level=level, limit=k, exclude_exercises=[query['title']]),
+                latencies
+            )
+
+        gains = [facet_gain(query, records[r['id']], facets=['type', 'equipment']) for r in results]
+        candidates = [
+            c for i, c in enumerate(records)
+            if i != position and isinstance(c.get('bodypart'), str) and c['bodypart'].lower() == body_part.lower()
+            and (level is None or (isinstance(c.get('level'), str) and c['level'].lower() == level.lower()))
+        ]
+        ideal = sorted((facet_gain(query, c, facets=['type', 'equipment']) for c in candidates), reverse=True)[:k]
+        precisions.append(precision_at_k(gains, k, threshold=1))
+        ndcgs.append(ndcg_at_k(gains, ideal, k))
+
+    return precisions, ndcgs, latencies
+
+
+def mean(values):
+    return round(sum(values) / len(values), 4) if values else 0.0
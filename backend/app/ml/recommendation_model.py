@@ -9,11 +9,64 @@ import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 import joblib
+import logging
 import os
-from typing import Optional, List, Dict, Any
+import time
+from typing import Optional, List, Dict, Any, Tuple, Callable
 
-import mlflow
-import mlflow.sklearn
+
+logger = logging.getLogger(__name__)
+
+# TF-IDF defaults, mirrored in ml/params.yaml
+DEFAULT_PARAMS = {
+    'max_features': 5000,
+    'ngram_range': (1, 2),
+    'min_df': 2,
+    'max_df': 0.95,
+    'stop_words': 'english',
+}
+
+
+# Matching rows scored per step of recommend(); deadlines are checked between chunks.
+# Small enough that a deadline takes effect on the ~3k-row shipped catalog.
+SCORE_CHUNK_ROWS = 1500
+
+
+class _StageClock:
+    """Reports the time since the previous lap to a stage observer"""
+    
+    def __init__(self, observer: Callable[[str, float], None]):
+        self.observer = observer
+        self.last = time.perf_counter()
+        self.totals: Dict[str, float] = {}
+    
+    def lap(self, stage: str):
+        now = time.perf_counter()
+        self.observer(stage, now - self.last)
+        self.last = now
+    
+    def add(self, stage: str):
+        """Like lap(), but accumulated until report(stage) (for stages run per chunk)"""
+        now = time.perf_counter()
+        self.totals[stage] = self.totals.get(stage, 0.0) + now - self.last
+        self.last = now
+    
+    def report(self, stage: str):
+        self.observer(stage, self.totals.pop(stage, 0.0))
+
+
+class _NullClock:
+    def lap(self, stage: str):
+        pass
+    
+    def add(self, stage: str):
+        pass
+    
+    def report(self, stage: str):
+        pass
+
+
+_NULL_CLOCK = _NullClock()
 
 
 class GymRecommendationModel:
@@ -28,6 +81,11 @@ class GymRecommendationModel:
         self.tfidf_matrix = None
         self.is_fitted = False
         self.model_version = "1.0.0"
+        self.params = dict(DEFAULT_PARAMS)
+        # Optional callback(stage, seconds) timing the stages of recommend()
+        self.stage_observer: Optional[Callable[[str, float], None]] = None
+        # Dataset catalog version self.df belongs to, when the serving API knows it
+        self.catalog_version = None
     
     def _create_feature_text(self, row: pd.Series) -> str:
         """Create combined feature text for TF-IDF from a row"""
@@ -39,28 +97,57 @@ class GymRecommendationModel:
         
         return ' '.join(parts).lower()
     
-    def fit(self, df: pd.DataFrame, log_to_mlflow: bool = False) -> 'GymRecommendationModel':
-        """
-        Fit the recommendation model on exercise data.
-        """
-        self.df = df.copy()
+    def prepare(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Copy df with cleaned column names and the combined feature text"""
+        df = df.copy()
         
         # Clean column names
-        self.df.columns = self.df.columns.str.strip().str.lower().str.replace(' ', '_')
+        df.columns = df.columns.str.strip().str.lower().str.replace(' ', '_')
         
         # Create feature text
-        self.df['feature_text'] = self.df.apply(self._create_feature_text, axis=1)
+        df['feature_text'] = df.apply(self._create_feature_text, axis=1)
+        return df
+    
+    def fit(
+        self,
+        df: pd.DataFrame,
+        log_to_mlflow: bool = False,
+        max_features: Optional[int] = DEFAULT_PARAMS['max_features'],
+        ngram_range: Tuple[int, int] = DEFAULT_PARAMS['ngram_range'],
+        min_df: float = DEFAULT_PARAMS['min_df'],
+        max_df: float = DEFAULT_PARAMS['max_df'],
+        stop_words: Optional[str] = DEFAULT_PARAMS['stop_words'],
+        analyzer: Any = 'word',
+        documents: Optional[List[Any]] = None
+    ) -> 'GymRecommendationModel':
+        """
+        Fit the recommendation model on exercise data.
+        
+        `analyzer`/`documents` let callers fit on pre-tokenized documents
+        (see app.ml.sweep) instead of re-analyzing the feature text.
+        """
+        self.df = self.prepare(df)
+        self.params = {
+            'max_features': max_features,
+            'ngram_range': tuple(ngram_range),
+            'min_df': min_df,
+            'max_df': max_df,
+            'stop_words': stop_words,
+        }
         
         # Create TF-IDF vectorizer and matrix
         self.tfidf_vectorizer = TfidfVectorizer(
-            stop_words='english',
-            max_features=5000,
-            ngram_range=(1, 2),
-            min_df=2,
-            max_df=0.95
+            stop_words=stop_words if analyzer == 'word' else None,
+            max_features=max_features,
+            ngram_range=tuple(ngram_range) if analyzer == 'word' else (1, 1),
+            min_df=min_df,
+            max_df=max_df,
+            analyzer=analyzer
         )
         
-        self.tfidf_matrix = self.tfidf_vectorizer.fit_transform(self.df['feature_text'])
+        self.tfidf_matrix = self.tfidf_vectorizer.fit_transform(
+            documents if documents is not None else self.df['feature_text']
+        )
         self.is_fitted = True
         
         if log_to_mlflow:
@@ -70,8 +157,13 @@ class GymRecommendationModel:
     
     def _log_to_mlflow(self):
         """Log model parameters and artifacts to MLFlow"""
-        mlflow.log_param("max_features", 5000)
-        mlflow.log_param("ngram_range", "(1, 2)")
+        # Training-only dependency: serving never pays its import time
+        import mlflow
+        
+        mlflow.log_param("max_features", self.params['max_features'])
+        mlflow.log_param("ngram_range", str(self.params['ngram_range']))
+        mlflow.log_param("min_df", self.params['min_df'])
+        mlflow.log_param("max_df", self.params['max_df'])
         mlflow.log_param("num_exercises", len(self.df))
         mlflow.log_param("model_version", self.model_version)
         
@@ -88,7 +180,8 @@ class GymRecommendationModel:
             'tfidf_vectorizer': self.tfidf_vectorizer,
             'tfidf_matrix': self.tfidf_matrix,
             'df': self.df,
-            'model_version': self.model_version
+            'model_version': self.model_version,
+            'params': self.params
         }
         
         os.makedirs(os.path.dirname(model_path), exist_ok=True)
@@ -105,6 +198,7 @@ class GymRecommendationModel:
         self.tfidf_matrix = model_data['tfidf_matrix']
         self.df = model_data['df']
         self.model_version = model_data.get('model_version', '1.0.0')
+        self.params = model_data.get('params', dict(DEFAULT_PARAMS))
         self.is_fitted = True
         
         return self
@@ -121,56 +215,95 @@ class GymRecommendationModel:
         """
         Get exercise recommendations based on user preferences.
         """
+        recommendations, _ = self.recommend_within(
+            None, body_part, equipment, level, exercise_type, limit, exclude_exercises
+        )
+        return recommendations
+    
+    def recommend_within(
+        self,
+        deadline: Optional[float],
+        body_part: Optional[str] = None,
+        equipment: Optional[str] = None,
+        level: Optional[str] = None,
+        exercise_type: Optional[str] = None,
+        limit: int = 10,
+        exclude_exercises: Optional[List[str]] = None
+    ) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        recommend() under a time budget. Returns (recommendations, partial).
+        
+        The catalog is filtered in one vectorised pass, then the matching
+        rows are scored SCORE_CHUNK_ROWS at a time, keeping the best `limit`
+        candidates. Once time.perf_counter() passes `deadline`, the best of
+        the chunks scored so far are returned with partial=True. The first
+        chunk is always scored.
+        """
         if not self.is_fitted:
             raise ValueError("Model must be fitted before making recommendations")
             
-        print("DEBUG: Executing robust recommend method")
-        
-        # Start with all exercises
-        mask = pd.Series([True] * len(self.df), index=self.df.index)
-        
-        # Apply filters
-        if body_part:
-            mask &= self.df['bodypart'].str.lower() == body_part.lower()
-        if equipment:
-            mask &= self.df['equipment'].str.lower() == equipment.lower()
-        if level:
-            mask &= self.df['level'].str.lower() == level.lower()
-        if exercise_type:
-            mask &= self.df['type'].str.lower() == exercise_type.lower()
-        if exclude_exercises:
-            exclude_lower = [e.lower() for e in exclude_exercises]
-            mask &= ~self.df['title'].str.lower().isin(exclude_lower)
+        logger.debug(
+            "recommend body_part=%s equipment=%s level=%s type=%s limit=%s",
+            body_part, equipment, level, exercise_type, limit
+        )
+        clock = _StageClock(self.stage_observer) if self.stage_observer else _NULL_CLOCK
         
-        filtered_df = self.df[mask].copy()
+        filters = {
+            column: value.lower()
+            for column, value in [('bodypart', body_part), ('equipment', equipment),
+                                  ('level', level), ('type', exercise_type)]
+            if value
+        }
+        exclude_lower = [e.lower() for e in exclude_exercises] if exclude_exercises else None
         
-        if filtered_df.empty:
-            return []
+        mask = np.ones(len(self.df), dtype=bool)
+        for column, value in filters.items():
+            mask &= (self.df[column].str.lower() == value).to_numpy()
+        if exclude_lower:
+            mask &= ~self.df['title'].str.lower().isin(exclude_lower).to_numpy()
+        matches = np.flatnonzero(mask)
+        catalog_ratings = pd.to_numeric(self.df['rating'], errors='coerce').to_numpy(dtype=float)
+        clock.lap('filtering')
         
         # Create query from filters
         query_parts = [p for p in [body_part, equipment, level, exercise_type] if p]
-        
+        query_vector = None
         if query_parts:
-            query = ' '.join(query_parts).lower()
-            query_vector = self.tfidf_vectorizer.transform([query])
-            
-            # Get similarity scores
-            filtered_indices = filtered_df.index.tolist()
-            filtered_matrix = self.tfidf_matrix[filtered_indices]
-            similarities = cosine_similarity(query_vector, filtered_matrix)[0]
-            
-            filtered_df['similarity'] = similarities
-            filtered_df = filtered_df.sort_values(
-                by=['similarity', 'rating'],
-                ascending=[False, False]
-            )
-        else:
-            filtered_df['similarity'] = 1.0
-            filtered_df = filtered_df.sort_values(by='rating', ascending=False)
+            query_vector = self.tfidf_vectorizer.transform([' '.join(query_parts).lower()])
+        clock.lap('query_transform')
+        
+        # Best `limit` (positions, similarities, ratings) of each chunk
+        candidates = []
+        partial = False
+        for start in range(0, len(matches), SCORE_CHUNK_ROWS):
+            if deadline is not None and start and time.perf_counter() >= deadline:
+                partial = True
+                break
+            positions = matches[start:start + SCORE_CHUNK_ROWS]
+            if query_vector is not None:
+                # TF-IDF rows are L2-normalised, so the dot product is the cosine
+                # (without cosine_similarity's per-call validation, paid per chunk)
+                similarities = (self.tfidf_matrix[positions] @ query_vector.T).toarray().ravel()
+            else:
+                similarities = np.ones(len(positions))
+            ratings = catalog_ratings[positions]
+            best = self._rank(similarities, ratings)[:limit]
+            candidates.append((positions[best], similarities[best], ratings[best]))
+            clock.add('scoring')
+        
+        clock.report('scoring')
+        
+        if not candidates:
+            return [], partial
+        
+        positions, similarities, ratings = (np.concatenate(parts) for parts in zip(*candidates))
+        best = self._rank(similarities, ratings)[:limit]
+        top_df = self.df.iloc[positions[best]]
+        clock.lap('ranking')
         
         # Return top results
         results = []
-        for idx, row in filtered_df.head(limit).iterrows():
+        for (idx, row), similarity in zip(top_df.iterrows(), similarities[best]):
             
             # Robust field extraction
             def get_val(key):
@@ -197,10 +330,17 @@ class GymRecommendationModel:
                 'equipment': get_val('equipment'),
                 'level': get_val('level'),
                 'rating': get_float('rating'),
-                'similarity_score': round(float(row.get('similarity', 0)), 4)
+                'similarity_score': round(float(similarity), 4)
             })
+        clock.lap('serialization')
         
-        return results
+        return results, partial
+    
+    @staticmethod
+    def _rank(similarities: np.ndarray, ratings: np.ndarray) -> np.ndarray:
+        """Order by similarity, then rating (unrated last), both descending; stable"""
+        ratings = np.where(np.isnan(ratings), -np.inf, ratings)
+        return np.lexsort((-ratings, -similarities))
     
     def get_similar_exercises(self, exercise_id: int, limit: int = 5) -> List[Dict[str, Any]]:
         """
@@ -0,0 +1,155 @@
+"""
+Parallel hyperparameter sweep for the TF-IDF recommendation model.
+
+The catalog is tokenized once; every candidate configuration fits its
+vectorizer on those shared tokens in a process pool, is scored with the
+offline metrics from app.ml.evaluation and measured for latency and
+matrix size. The winner is picked from the quality/latency/memory
+Pareto front. Used by `ml/train_model.py --sweep`.
+"""
+import itertools
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from app.ml.recommendation_model import GymRecommendationModel
+from app.ml.evaluation import evaluate_similar, evaluate_recommend, latency_percentiles, mean
+
+
+SWEPT_PARAMS = ['max_features', 'ngram_range', 'min_df', 'max_df']
+
+
+class NgramAnalyzer:
+    """
+    Word n-gram analyzer over pre-tokenized documents. Produces the same
+    terms as TfidfVectorizer's default word analyzer; raw strings (query
+    text at recommend time) are tokenized on the fly.
+    """
+
+    def __init__(self, ngram_range, stop_words: Optional[str] = 'english'):
+        self.ngram_range = tuple(ngram_range)
+        self.stop_words = stop_words
+        self._tokenize = None
+
+    def tokenize(self, text: str) -> List[str]:
+        if self._tokenize is None:
+            vectorizer = TfidfVectorizer(stop_words=self.stop_words)
+            preprocess, split = vectorizer.build_preprocessor(), vectorizer.build_tokenizer()
+            stop = vectorizer.get_stop_words() or frozenset()
+            self._tokenize = lambda doc: [t for t in split(preprocess(doc)) if t not in stop]
+        return self._tokenize(text)
+
+    def __call__(self, doc) -> List[str]:
+        tokens = self.tokenize(doc) if isinstance(doc, str) else doc
+        min_n, max_n = self.ngram_range
+        terms = list(tokens) if min_n == 1 else []
+        for n in range(max(min_n, 2), max_n + 1):
+            terms.extend(' '.join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+        return terms
+
+    def __getstate__(self):
+        return {'ngram_range': self.ngram_range, 'stop_words': self.stop_words, '_tokenize': None}
+
+
+def tokenize_corpus(texts, stop_words: Optional[str] = 'english') -> List[List[str]]:
+    """Single tokenization pass shared by every candidate"""
+    analyzer = NgramAnalyzer((1, 1), stop_words)
+    return [analyzer.tokenize(text) for text in texts]
+
+
+def expand_grid(space: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    """Every combination of the swept parameter values"""
+    keys = [key for key in SWEPT_PARAMS if key in space]
+    return [dict(zip(keys, values)) for values in itertools.product(*(space[key] for key in keys))]
+
+
+def sample_space(space: Dict[str, List[Any]], trials: int, random_state: int = 42) -> List[Dict[str, Any]]:
+    """`trials` distinct configurations drawn at random from the grid"""
+    grid = expand_grid(space)
+    return random.Random(random_state).sample(grid, min(trials, len(grid)))
+
+
+# Per-process state set up once by the pool initializer
+_worker: Dict[str, Any] = {}
+
+
+def _init_worker(df: pd.DataFrame, tokens: List[List[str]], queries: List[int], k: int, stop_words: Optional[str]):
+    _worker.update(df=df, tokens=tokens, queries=queries, k=k, stop_words=stop_words)
+
+
+def evaluate_config(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Fit one candidate on the shared tokens and score it"""
+    result = {'config': config}
+    try:
+        model = GymRecommendationModel().fit(
+            _worker['df'],
+            stop_words=_worker['stop_words'],
+            analyzer=NgramAnalyzer(config.get('ngram_range', (1, 2)), _worker['stop_words']),
+            documents=_worker['tokens'],
+            **{key: value for key, value in config.items() if key != 'ngram_range'}
+        )
+    except ValueError as e:
+        # e.g. min_df/max_df combinations that prune every term
+        result['error'] = str(e)
+        return result
+
+    _, similar_ndcg, similar_latency = evaluate_similar(model, _worker['queries'], _worker['k'], 1)
+    _, recommend_ndcg, recommend_latency = evaluate_recommend(model, _worker['queries'], _worker['k'], 1)
+
+    matrix = model.tfidf_matrix
+    result.update(
+        quality=mean([mean(similar_ndcg), mean(recommend_ndcg)]),
+        latency_ms=round(float(np.mean([
+            latency_percentiles(similar_latency)['p95_ms'],
+            latency_percentiles(recommend_latency)['p95_ms'],
+        ])), 4),
+        matrix_bytes=int(matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes),
+        vocabulary_size=len(model.tfidf_vectorizer.vocabulary_),
+    )
+    return result
+
+
+def pareto_front(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Candidates no other candidate beats on quality, latency and memory at once"""
+    scored = [r for r in results if 'error' not in r]
+
+    def dominates(a, b):
+        no_worse = a['quality'] >= b['quality'] and a['latency_ms'] <= b['latency_ms'] and a['matrix_bytes'] <= b['matrix_bytes']
+        better = a['quality'] > b['quality'] or a['latency_ms'] < b['latency_ms'] or a['matrix_bytes'] < b['matrix_bytes']
+        return no_worse and better
+
+    return [r for r in scored if not any(dominates(other, r) for other in scored)]
+
+
+def select_best(results: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Highest-quality point of the Pareto front, cheapest on ties"""
+    front = pareto_front(results)
+    if not front:
+        return None
+    return max(front, key=lambda r: (r['quality'], -r['latency_ms'], -r['matrix_bytes']))
+
+
+def run_sweep(
+    df: pd.DataFrame,
+    configs: List[Dict[str, Any]],
+    queries: List[int],
+    k: int = 10,
+    stop_words: Optional[str] = 'english',
+    workers: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """Score every configuration across a process pool (all cores by default)"""
+    prepared = GymRecommendationModel().prepare(df)
+    tokens = tokenize_corpus(prepared['feature_text'], stop_words)
+
+    workers = min(workers or os.cpu_count() or 1, len(configs)) or 1
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(df, tokens, queries, k, stop_words)
+    ) as pool:
+        return list(pool.map(evaluate_config, configs))
@@ -3,7 +3,27 @@ Mock Supabase Client for local development/testing without credentials
 Mimics the supabase-py interface but stores data in memory.
 """
 from uuid import uuid4
+import json
 from datetime import datetime
+import heapq
+import operator
+import threading
+
+# Range filter operators (rows with a NULL column never match, as in SQL)
+RANGE_OPERATORS = {
+    'gt': operator.gt,
+    'gte': operator.ge,
+    'lt': operator.lt,
+    'lte': operator.le,
+}
+
+
+class MockAPIError(Exception):
+    """Constraint violation, shaped like postgrest's APIError (message + code)"""
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        self.message = message
+        self.code = code
 
 class MockResponse:
     def __init__(self, data):
@@ -14,13 +34,18 @@ class MockQueryBuilder:
         self.table_name = table_name
         self.db = db
         self.filters = []
-        self.order_by = None
+        self.order_by = []
+        self.columns = None
+        self.offset = 0
+        self.row_limit = None
         self.action = 'select'
         self.insert_data = None
         self.update_data = None
     
     def select(self, columns="*"):
         self.action = 'select'
+        if columns.strip() != "*":
+            self.columns = [c.strip() for c in columns.split(",")]
         return self
     
     def insert(self, data):
@@ -38,17 +63,67 @@ class MockQueryBuilder:
         return self
     
     def eq(self, column, value):
-        self.filters.append((column, value))
+        self.filters.append((column, 'eq', value))
+        return self
+    
+    def in_(self, column, values):
+        self.filters.append((column, 'in', list(values)))
+        return self
+    
+    def gt(self, column, value):
+        self.filters.append((column, 'gt', value))
+        return self
+    
+    def gte(self, column, value):
+        self.filters.append((column, 'gte', value))
+        return self
+    
+    def lt(self, column, value):
+        self.filters.append((column, 'lt', value))
+        return self
+    
+    def lte(self, column, value):
+        self.filters.append((column, 'lte', value))
         return self
         
     def order(self, column, desc=False):
-        self.order_by = (column, desc)
+        # Chained calls add tie-breakers, like postgrest
+        self.order_by.append((column, desc))
         return self
+    
+    def limit(self, size):
+        self.row_limit = size
+        return self
+    
+    def range(self, start, end):
+        # Inclusive bounds, like postgrest
+        self.offset = start
+        self.row_limit = end - start + 1
+        return self
+        
+    def _matches(self, row):
+        for col, op, val in self.filters:
+            if op == 'in':
+                if row.get(col) not in val:
+                    return False
+            elif op == 'eq':
+                if row.get(col) != val:
+                    return False
+            elif row.get(col) is None or not RANGE_OPERATORS[op](row.get(col), val):
+                return False
+        return True
         
     def execute(self):
+        # Queries may run concurrently from the DB thread pool
+        with self.db.lock:
+            return self._execute()
+        
+    def _execute(self):
+        table = self.db.data[self.table_name]
+        
         # Handle Insert separately as it's not a query on existing data
         if self.action == 'insert':
-            inserted_items = []
+            new_items = []
             for item in self.insert_data:
                 # Copy to avoid modifying the input dict
                 new_item = item.copy()
@@ -58,54 +133,182 @@ class MockQueryBuilder:
                 # Auto-generate timestamps
                 if 'created_at' not in new_item:
                     new_item['created_at'] = datetime.now().isoformat()
-                
-                self.db.data[self.table_name].append(new_item)
+                new_items.append(new_item)
+            
+            # Like a single INSERT statement: all rows or none
+            self.db._check_unique(self.table_name, new_items)
+            
+            inserted_items = []
+            for new_item in new_items:
+                table[id(new_item)] = new_item
+                self.db._index_row(self.table_name, new_item)
                 inserted_items.append(new_item)
             return MockResponse(inserted_items)
 
-        # Start with all data for Select/Update/Delete
-        results = self.db.data.get(self.table_name, [])
+        # Narrow candidates through the smallest matching hash index
+        candidates = None
+        for col, op, val in self.filters:
+            if op in RANGE_OPERATORS:
+                continue
+            if op == 'in':
+                buckets = [self.db._lookup(self.table_name, col, v) for v in val]
+                if any(b is None for b in buckets):
+                    continue
+                bucket = {}
+                for b in buckets:
+                    bucket.update(b)
+            else:
+                bucket = self.db._lookup(self.table_name, col, val)
+            if bucket is not None and (candidates is None or len(bucket) < len(candidates)):
+                candidates = bucket
+        if candidates is None:
+            candidates = table
         
         # Apply filters
-        filtered_results = []
-        for row in results:
-            match = True
-            for col, val in self.filters:
-                if row.get(col) != val:
-                    match = False
-                    break
-            if match:
-                filtered_results.append(row)
+        filtered_results = [row for row in candidates.values() if self._matches(row)]
         
         if self.action == 'update':
             for row in filtered_results:
+                self.db._unindex_row(self.table_name, row)
                 row.update(self.update_data)
+                self.db._index_row(self.table_name, row)
             return MockResponse(filtered_results)
         
         elif self.action == 'delete':
-            # Filter the master list
-            self.db.data[self.table_name] = [r for r in results if r not in filtered_results]
+            # Remove matched rows by identity
+            for row in filtered_results:
+                self.db._unindex_row(self.table_name, row)
+                del table[id(row)]
             return MockResponse(filtered_results)
         
         elif self.action == 'select':
-            # Apply Sorting
+            # Apply Sorting (only the first offset+limit rows when bounded)
             if self.order_by:
-                col, desc = self.order_by
-                filtered_results.sort(key=lambda x: str(x.get(col, "")), reverse=desc)
+                desc = self.order_by[0][1]
+                if all(d == desc for _, d in self.order_by):
+                    columns = [c for c, _ in self.order_by]
+
+                    def sort_key(x):
+                        return tuple(str(x.get(c, "")) for c in columns)
+                    if self.row_limit is not None:
+                        pick = heapq.nlargest if desc else heapq.nsmallest
+                        filtered_results = pick(self.offset + self.row_limit, filtered_results, key=sort_key)
+                    else:
+                        filtered_results.sort(key=sort_key, reverse=desc)
+                else:
+                    # Mixed directions: stable sorts from the last key to the first
+                    for col, d in reversed(self.order_by):
+                        filtered_results.sort(key=lambda x, col=col: str(x.get(col, "")), reverse=d)
+            
+            if self.row_limit is not None:
+                filtered_results = filtered_results[self.offset:self.offset + self.row_limit]
+            elif self.offset:
+                filtered_results = filtered_results[self.offset:]
+            
+            # Apply projection
+            if self.columns:
+                filtered_results = [{c: row.get(c) for c in self.columns} for row in filtered_results]
             return MockResponse(filtered_results)
             
         return MockResponse([])
 
 class MockClient:
+    # Columns used in .eq() filters get a hash index per table
+    INDEXED_COLUMNS = ("id", "email", "user_id", "exercise_title")
+    # Unique constraints mirrored from the Supabase schema (first column must be indexed)
+    UNIQUE_CONSTRAINTS = {
+        "users": [("id",), ("email",)],
+        "favorites": [("id",), ("user_id", "exercise_title")],
+        "history": [("id",)],
+    }
+
     def __init__(self):
+        # Rows are stored per table as {id(row): row}, in insertion order
         self.data = {
-            "users": [],
-            "favorites": [],
-            "history": []
+            "users": {},
+            "favorites": {},
+            "history": {}
         }
+        # table -> column -> value -> {id(row): row}
+        self.indexes = {}
+        self.lock = threading.RLock()
         print("⚠️ Using In-Memory Mock Database (Data will be lost on restart)")
 
+    def load_fixtures(self, path, batch_size=1000):
+        """
+        Bulk-load JSON Lines fixtures ({"table": ..., "row": {...}} per line),
+        e.g. from ml/generate_catalog.py. Returns rows loaded per table.
+        """
+        counts = {}
+        batch_table, batch = None, []
+        with open(path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if record["table"] != batch_table or len(batch) >= batch_size:
+                    if batch:
+                        self.table(batch_table).insert(batch).execute()
+                    batch_table, batch = record["table"], []
+                batch.append(record["row"])
+                counts[batch_table] = counts.get(batch_table, 0) + 1
+        if batch:
+            self.table(batch_table).insert(batch).execute()
+        return counts
+
     def table(self, table_name):
-        if table_name not in self.data:
-            self.data[table_name] = []
+        with self.lock:
+            if table_name not in self.data:
+                self.data[table_name] = {}
         return MockQueryBuilder(table_name, self)
+
+    def _index_row(self, table_name, row):
+        table_indexes = self.indexes.setdefault(table_name, {})
+        for col in self.INDEXED_COLUMNS:
+            value = row.get(col)
+            try:
+                table_indexes.setdefault(col, {}).setdefault(value, {})[id(row)] = row
+            except TypeError:
+                # Unhashable values are only reachable by scanning
+                pass
+
+    def _unindex_row(self, table_name, row):
+        table_indexes = self.indexes.get(table_name, {})
+        for col in self.INDEXED_COLUMNS:
+            value = row.get(col)
+            buckets = table_indexes.get(col, {})
+            try:
+                bucket = buckets.get(value)
+            except TypeError:
+                continue
+            if bucket is not None:
+                bucket.pop(id(row), None)
+                if not bucket:
+                    del buckets[value]
+
+    def _check_unique(self, table_name, rows):
+        """Raise MockAPIError (code 23505) if any row collides with existing or batch rows"""
+        for columns in self.UNIQUE_CONSTRAINTS.get(table_name, []):
+            seen = set()
+            for row in rows:
+                key = tuple(row.get(c) for c in columns)
+                clash = key in seen or any(
+                    all(existing.get(c) == row.get(c) for c in columns)
+                    for existing in (self._lookup(table_name, columns[0], key[0]) or {}).values()
+                )
+                if clash:
+                    raise MockAPIError(
+                        f'duplicate key value violates unique constraint "{table_name}_{"_".join(columns)}_key"',
+                        code="23505"
+                    )
+                seen.add(key)
+
+    def _lookup(self, table_name, column, value):
+        """Rows whose column equals value, or None if the column is not indexed"""
+        if column not in self.INDEXED_COLUMNS:
+            return None
+        try:
+            return self.indexes.get(table_name, {}).get(column, {}).get(value, {})
+        except TypeError:
+            # Unhashable filter value: fall back to a scan
+            return None
@@ -0,0 +1,253 @@
+"""
+Sampled per-request profiling.
+
+ProfilingMiddleware profiles a random PROFILE_SAMPLE fraction of API
+requests, plus any request whose X-Debug-Profile header matches
+PROFILE_TOKEN, and writes one file per request under
+PROFILE_DIR/<route>/:
+
+    pstats     cProfile output (python -m pstats, snakeviz)
+    collapsed  "frame;frame;frame count" lines from a stack sampler
+               thread (flamegraph.pl, speedscope)
+
+At most one request is profiled at a time; others are served as usual.
+A profile covers the event loop thread, so it also contains whatever
+other requests ran concurrently - profile quiet instances, or use the
+header on a single request. CPU-bound work a handler hands to a worker
+thread is only covered when it goes through run_in_worker(), which
+continues the request's profile on that thread. The oldest files are
+deleted past PROFILE_MAX_FILES. Requests that are not sampled pay one
+random() call.
+"""
+import cProfile
+import hmac
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from app.metrics import RouteResolver
+
+
+PROFILE_HEADER = b"x-debug-profile"
+FORMATS = ("pstats", "collapsed")
+
+# The profile of the request being handled, if any
+_active: ContextVar[Optional["RequestProfile"]] = ContextVar("request_profile", default=None)
+
+
+class StackSampler:
+    """Collapsed stacks of the tracked threads, sampled every `interval` seconds from a helper thread"""
+
+    def __init__(self, thread_id: int, interval: float = 0.001):
+        self.thread_ids = {thread_id}
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def track(self, thread_id: int):
+        self.thread_ids = self.thread_ids | {thread_id}
+
+    def untrack(self, thread_id: int):
+        self.thread_ids = self.thread_ids - {thread_id}
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for thread_id in self.thread_ids:
+                frame = frames.get(thread_id)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                if stack:
+                    self.stacks[";".join(reversed(stack))] += 1
+
+    def dump(self, path: str):
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class RequestProfile:
+    """One request's profile: the event loop thread plus any run_in_worker() calls"""
+
+    def __init__(self, output: str):
+        self.output = output
+        self._sampler = StackSampler(threading.get_ident()) if output == "collapsed" else None
+        self._profilers = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self._sampler is not None:
+            self._sampler.start()
+        else:
+            self._profilers.append(cProfile.Profile())
+            self._profilers[0].enable()
+
+    def stop(self):
+        if self._sampler is not None:
+            self._sampler.stop()
+        else:
+            self._profilers[0].disable()
+
+    def run(self, func, *args, **kwargs):
+        """Call func on the current thread, adding it to this profile"""
+        if self._sampler is not None:
+            thread_id = threading.get_ident()
+            self._sampler.track(thread_id)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._sampler.untrack(thread_id)
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+ allows one active profiler, which already covers every thread
+            return func(*args, **kwargs)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler.disable()
+            with self._lock:
+                self._profilers.append(profiler)
+
+    def dump(self, path: str):
+        if self._sampler is not None:
+            self._sampler.dump(path)
+            return
+        with self._lock:
+            stats = pstats.Stats(*self._profilers)
+        stats.dump_stats(path)
+
+
+async def run_in_worker(func, *args, **kwargs):
+    """run_in_threadpool that continues the calling request's profile on the worker thread"""
+    profile = _active.get()
+    if profile is None:
+        return await run_in_threadpool(func, *args, **kwargs)
+    return await run_in_threadpool(profile.run, func, *args, **kwargs)
+
+
+class ProfileStore:
+    """Profile files under `directory`, deleting the oldest past `max_files`"""
+
+    def __init__(self, directory: str, max_files: int = 200):
+        self.directory = directory
+        self.max_files = max_files
+        os.makedirs(directory, exist_ok=True)
+        existing = [
+            os.path.join(root, name) for root, _, names in os.walk(directory) for name in names
+        ]
+        self._files = deque(sorted(existing, key=os.path.getmtime))
+        self._lock = threading.Lock()
+
+    def path_for(self, route: str, method: str, extension: str) -> str:
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", f"{method} {route}").strip("_") or "root"
+        os.makedirs(os.path.join(self.directory, slug), exist_ok=True)
+        name = f"{time.strftime('%Y%m%dT%H%M%S')}-{time.perf_counter_ns() % 10**9:09d}.{extension}"
+        return os.path.join(self.directory, slug, name)
+
+    def added(self, path: str):
+        with self._lock:
+            self._files.append(path)
+            while len(self._files) > self.max_files:
+                try:
+                    os.remove(self._files.popleft())
+                except FileNotFoundError:
+                    pass
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling sampled or explicitly requested HTTP requests"""
+
+    def __init__(self, app, store: ProfileStore, routes_app=None, sample: float = 0.0,
+                 token: Optional[str] = None, output: str = "pstats", prefix: str = "/api"):
+        if output not in FORMATS:
+            raise ValueError(f"PROFILE_FORMAT must be one of {FORMATS}, got {output!r}")
+        self.app = app
+        self.store = store
+        self.resolve = RouteResolver(routes_app) if routes_app is not None else None
+        self.sample = sample
+        self.token = token.encode("latin-1") if token else None
+        self.output = output
+        self.prefix = prefix
+        self._busy = threading.Lock()
+
+    def _requested(self, scope) -> bool:
+        if self.token is None:
+            return False
+        for name, value in scope.get("headers") or ():
+            if name == PROFILE_HEADER:
+                return hmac.compare_digest(value, self.token)
+        return False
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or not scope["path"].startswith(self.prefix)
+            or not (random.random() < self.sample or self._requested(scope))
+            or not self._busy.acquire(blocking=False)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            route = self.resolve(scope) if self.resolve else scope["path"]
+            path = self.store.path_for(route, scope["method"], "prof" if self.output == "pstats" else "collapsed")
+
+            async def send_with_id(message):
+                if message["type"] == "http.response.start":
+                    headers = list(message.get("headers", []))
+                    headers.append((b"x-profile-id", os.path.relpath(path, self.store.directory).encode("latin-1")))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            profile = RequestProfile(self.output)
+            token = _active.set(profile)
+            profile.start()
+            try:
+                await self.app(scope, receive, send_with_id)
+            finally:
+                profile.stop()
+                _active.reset(token)
+            await run_in_threadpool(profile.dump, path)
+            self.store.added(path)
+        finally:
+            self._busy.release()
+
+
+def profiling_from_env(app):
+    """Add ProfilingMiddleware to app if PROFILE_DIR is set"""
+    directory = os.getenv("PROFILE_DIR")
+    if not directory:
+        return None
+    store = ProfileStore(directory, max_files=int(os.getenv("PROFILE_MAX_FILES", "200")))
+    app.add_middleware(
+        ProfilingMiddleware,
+        store=store,
+        routes_app=app,
+        sample=float(os.getenv("PROFILE_SAMPLE", "0")),
+        token=os.getenv("PROFILE_TOKEN") or None,
+        output=os.getenv("PROFILE_FORMAT", "pstats"),
+    )
+    print(f"Profiling sampled requests to {directory}")
+    return store
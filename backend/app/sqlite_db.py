@@ -0,0 +1,341 @@
+"""
+SQLite-backed Supabase stand-in for local development and load testing.
+Mimics the supabase-py table().select().eq().execute() interface like
+MockClient, but persists to a single SQLite file in WAL mode so data
+survives restarts and is shared by every uvicorn worker on the host.
+"""
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from uuid import uuid4
+
+
+# Table -> ordered column definitions. JSON columns hold lists/dicts.
+SCHEMA = {
+    "users": {
+        "columns": {
+            "id": "TEXT PRIMARY KEY",
+            "email": "TEXT NOT NULL UNIQUE",
+            "name": "TEXT",
+            "experience_level": "TEXT",
+            "fitness_goals": "TEXT",
+            "available_equipment": "TEXT",
+            "created_at": "TEXT",
+        },
+        "json": {"fitness_goals", "available_equipment"},
+        "constraints": [],
+        "indexes": [],
+    },
+    "favorites": {
+        "columns": {
+            "id": "TEXT PRIMARY KEY",
+            "user_id": "TEXT NOT NULL REFERENCES users(id) ON DELETE CASCADE",
+            "exercise_title": "TEXT NOT NULL",
+            "created_at": "TEXT",
+        },
+        "json": set(),
+        "constraints": ["UNIQUE (user_id, exercise_title)"],
+        "indexes": [],
+    },
+    "history": {
+        "columns": {
+            "id": "TEXT PRIMARY KEY",
+            "user_id": "TEXT NOT NULL",
+            "exercise_title": "TEXT NOT NULL",
+            "sets": "INTEGER",
+            "reps": "INTEGER",
+            "weight": "REAL",
+            "duration_seconds": "INTEGER",
+            "performed_at": "TEXT",
+            "created_at": "TEXT",
+        },
+        "json": set(),
+        "constraints": [],
+        "indexes": ['CREATE INDEX IF NOT EXISTS history_user_performed ON history (user_id, performed_at)'],
+    },
+    # Cross-worker cache invalidation log (see app.cache.InvalidationChannel)
+    "cache_invalidations": {
+        "columns": {
+            "seq": "INTEGER PRIMARY KEY AUTOINCREMENT",
+            "cache": "TEXT NOT NULL",
+            "key": "TEXT NOT NULL",
+        },
+        "json": set(),
+        "constraints": [],
+        "indexes": [],
+    },
+}
+
+RANGE_OPERATORS = {'gt': '>', 'gte': '>=', 'lt': '<', 'lte': '<='}
+
+# Invalidation log entries kept for late pollers
+INVALIDATION_LOG_SIZE = 10000
+
+
+class SQLiteAPIError(Exception):
+    """
+    Raised for constraint violations. Carries the PostgreSQL error code and
+    wording supabase-py would surface, so callers handle both the same way.
+    """
+
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+
+
+def _translate_integrity_error(table_name, error):
+    message = str(error)
+    if message.startswith("UNIQUE") or "PRIMARY KEY" in message:
+        return SQLiteAPIError(
+            f'duplicate key value violates unique constraint on "{table_name}" ({message})', code="23505"
+        )
+    if "FOREIGN KEY" in message:
+        return SQLiteAPIError(
+            f'insert or update on table "{table_name}" violates foreign key constraint ({message})', code="23503"
+        )
+    return SQLiteAPIError(message, code="23000")
+
+
+class SQLiteResponse:
+    def __init__(self, data):
+        self.data = data
+
+
+class SQLiteQueryBuilder:
+    def __init__(self, table_name, db):
+        self.table_name = table_name
+        self.db = db
+        self.schema = SCHEMA[table_name]
+        self.columns = "*"
+        self.filters = []
+        self.order_by = []
+        self.offset = 0
+        self.row_limit = None
+        self.action = 'select'
+        self.insert_data = None
+        self.update_data = None
+
+    def _column(self, column):
+        # Identifiers cannot be bound as parameters, so only allow known columns
+        if column not in self.schema["columns"]:
+            raise ValueError(f"Unknown column '{column}' for table '{self.table_name}'")
+        return f'"{column}"'
+
+    def select(self, columns="*"):
+        self.action = 'select'
+        self.columns = columns
+        return self
+
+    def insert(self, data):
+        self.insert_data = data if isinstance(data, list) else [data]
+        self.action = 'insert'
+        return self
+
+    def update(self, data):
+        self.update_data = data
+        self.action = 'update'
+        return self
+
+    def delete(self):
+        self.action = 'delete'
+        return self
+
+    def eq(self, column, value):
+        self.filters.append((column, 'eq', value))
+        return self
+
+    def in_(self, column, values):
+        self.filters.append((column, 'in', list(values)))
+        return self
+
+    def gt(self, column, value):
+        self.filters.append((column, 'gt', value))
+        return self
+
+    def gte(self, column, value):
+        self.filters.append((column, 'gte', value))
+        return self
+
+    def lt(self, column, value):
+        self.filters.append((column, 'lt', value))
+        return self
+
+    def lte(self, column, value):
+        self.filters.append((column, 'lte', value))
+        return self
+
+    def order(self, column, desc=False):
+        # Chained calls add tie-breakers, like postgrest
+        self.order_by.append((column, desc))
+        return self
+
+    def limit(self, size):
+        self.row_limit = size
+        return self
+
+    def range(self, start, end):
+        # Inclusive bounds, like postgrest
+        self.offset = start
+        self.row_limit = end - start + 1
+        return self
+
+    def _encode(self, column, value):
+        if column in self.schema["json"] and value is not None:
+            return json.dumps(value)
+        return value
+
+    def _decode(self, row):
+        item = dict(row)
+        for column in self.schema["json"]:
+            if item.get(column) is not None:
+                item[column] = json.loads(item[column])
+        return item
+
+    def _projection(self):
+        if self.columns.strip() == "*":
+            return "*"
+        return ", ".join(self._column(c.strip()) for c in self.columns.split(","))
+
+    def _where(self):
+        if not self.filters:
+            return "", []
+        clauses = []
+        params = []
+        for column, op, value in self.filters:
+            if op == 'in':
+                if not value:
+                    clauses.append("0")
+                    continue
+                clauses.append(f"{self._column(column)} IN ({', '.join('?' for _ in value)})")
+                params.extend(self._encode(column, v) for v in value)
+            elif op in RANGE_OPERATORS:
+                clauses.append(f"{self._column(column)} {RANGE_OPERATORS[op]} ?")
+                params.append(self._encode(column, value))
+            elif value is None:
+                clauses.append(f"{self._column(column)} IS NULL")
+            else:
+                clauses.append(f"{self._column(column)} = ?")
+                params.append(self._encode(column, value))
+        return " WHERE " + " AND ".join(clauses), params
+
+    def execute(self):
+        table = f'"{self.table_name}"'
+        conn = self.db.connection()
+
+        try:
+            if self.action == 'insert':
+                new_items = []
+                for item in self.insert_data:
+                    new_item = item.copy()
+                    if 'id' not in new_item:
+                        new_item['id'] = str(uuid4())
+                    if 'created_at' not in new_item:
+                        new_item['created_at'] = datetime.now().isoformat()
+                    new_items.append(new_item)
+
+                # One multi-row INSERT per distinct column set (normally just one)
+                groups = {}
+                for new_item in new_items:
+                    groups.setdefault(tuple(new_item), []).append(new_item)
+
+                inserted_items = []
+                with conn:
+                    for columns, rows in groups.items():
+                        column_sql = ", ".join(self._column(c) for c in columns)
+                        row_sql = "(" + ", ".join("?" for _ in columns) + ")"
+                        cursor = conn.execute(
+                            f"INSERT INTO {table} ({column_sql}) VALUES {', '.join(row_sql for _ in rows)} RETURNING *",
+                            [self._encode(c, row[c]) for row in rows for c in columns]
+                        )
+                        inserted_items.extend(self._decode(r) for r in cursor.fetchall())
+                return SQLiteResponse(inserted_items)
+
+            where, params = self._where()
+
+            if self.action == 'update':
+                assignments = ", ".join(f"{self._column(c)} = ?" for c in self.update_data)
+                values = [self._encode(c, v) for c, v in self.update_data.items()]
+                with conn:
+                    cursor = conn.execute(f"UPDATE {table} SET {assignments}{where} RETURNING *", values + params)
+                    rows = cursor.fetchall()
+                return SQLiteResponse([self._decode(r) for r in rows])
+
+            if self.action == 'delete':
+                with conn:
+                    cursor = conn.execute(f"DELETE FROM {table}{where} RETURNING *", params)
+                    rows = cursor.fetchall()
+                return SQLiteResponse([self._decode(r) for r in rows])
+
+            sql = f"SELECT {self._projection()} FROM {table}{where}"
+            if self.order_by:
+                sql += " ORDER BY " + ", ".join(
+                    f"{self._column(column)} {'DESC' if desc else 'ASC'}" for column, desc in self.order_by
+                )
+            else:
+                sql += " ORDER BY rowid"
+            if self.row_limit is not None or self.offset:
+                sql += " LIMIT ? OFFSET ?"
+                params = params + [self.row_limit if self.row_limit is not None else -1, self.offset]
+            return SQLiteResponse([self._decode(r) for r in conn.execute(sql, params).fetchall()])
+        except sqlite3.IntegrityError as e:
+            raise _translate_integrity_error(self.table_name, e) from e
+
+
+class SQLiteClient:
+    """
+    Durable local database client. Each thread gets its own pooled
+    connection to the shared WAL-mode database file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._init_schema()
+        print(f"⚠️ Using local SQLite database at {path}")
+
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self.connection()
+        with conn:
+            for table_name, schema in SCHEMA.items():
+                definitions = [f'"{c}" {t}' for c, t in schema["columns"].items()] + schema["constraints"]
+                conn.execute(f'CREATE TABLE IF NOT EXISTS "{table_name}" ({", ".join(definitions)})')
+                for index_sql in schema["indexes"]:
+                    conn.execute(index_sql)
+
+    def publish_invalidation(self, cache, key):
+        conn = self.connection()
+        with conn:
+            conn.execute('INSERT INTO cache_invalidations (cache, key) VALUES (?, ?)', (cache, key))
+            conn.execute(
+                'DELETE FROM cache_invalidations WHERE seq <= (SELECT MAX(seq) FROM cache_invalidations) - ?',
+                (INVALIDATION_LOG_SIZE,)
+            )
+
+    def invalidations_since(self, seq):
+        rows = self.connection().execute(
+            'SELECT seq, cache, key FROM cache_invalidations WHERE seq > ? ORDER BY seq', (seq,)
+        ).fetchall()
+        return [tuple(row) for row in rows]
+
+    def latest_invalidation(self):
+        row = self.connection().execute('SELECT MAX(seq) FROM cache_invalidations').fetchone()
+        return row[0] or 0
+
+    def table(self, table_name):
+        if table_name not in SCHEMA:
+            raise ValueError(f"Unknown table '{table_name}'")
+        return SQLiteQueryBuilder(table_name, self)
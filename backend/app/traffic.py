@@ -0,0 +1,138 @@
+"""
+Traffic capture for load replay.
+
+TrafficCaptureMiddleware records each API request as one JSON line
+(method, path, query, body, plus status and duration for reference) in
+the format benchmarks/replay.py reads. Lines are written by a
+background thread so capture never blocks the event loop.
+
+Enabled by TRAFFIC_CAPTURE_PATH; TRAFFIC_CAPTURE_SAMPLE (0-1) keeps a
+fraction of requests and TRAFFIC_CAPTURE_MAX_BODY caps recorded bodies.
+"""
+import base64
+import json
+import os
+import queue
+import random
+import threading
+import time
+from typing import Any, Dict, Optional
+
+
+def encode_body(body: bytes, content_type: str) -> Dict[str, Any]:
+    """JSON bodies are stored as JSON, anything else as base64"""
+    if not body:
+        return {}
+    if 'json' in content_type:
+        try:
+            return {'json': json.loads(body)}
+        except ValueError:
+            pass
+    return {'body_b64': base64.b64encode(body).decode('ascii')}
+
+
+def decode_body(record: Dict[str, Any]) -> Optional[bytes]:
+    if 'json' in record:
+        return json.dumps(record['json']).encode('utf-8')
+    if 'body_b64' in record:
+        return base64.b64decode(record['body_b64'])
+    return None
+
+
+class TrafficWriter:
+    """Appends records to a JSONL file from a daemon thread"""
+
+    def __init__(self, path: str, max_queue: int = 10000):
+        self.path = path
+        self.dropped = 0
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name="traffic-capture", daemon=True)
+        self._thread.start()
+
+    def write(self, record: Dict[str, Any]):
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            # Never slow requests down to keep up with capture
+            self.dropped += 1
+
+    def _run(self):
+        with open(self.path, 'a') as f:
+            while True:
+                record = self._queue.get()
+                f.write(json.dumps(record) + '\n')
+                if self._queue.empty():
+                    f.flush()
+
+
+class TrafficCaptureMiddleware:
+    """ASGI middleware recording sampled HTTP requests under `prefix`"""
+
+    def __init__(self, app, writer: TrafficWriter, sample: float = 1.0, max_body: int = 65536, prefix: str = "/api"):
+        self.app = app
+        self.writer = writer
+        self.sample = sample
+        self.max_body = max_body
+        self.prefix = prefix
+        self.started = time.monotonic()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.prefix) or random.random() >= self.sample:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.monotonic()
+        chunks = []
+        size = 0
+        status = {}
+
+        async def capture_receive():
+            nonlocal size
+            message = await receive()
+            if message["type"] == "http.request" and size <= self.max_body:
+                chunks.append(message.get("body", b""))
+                size += len(chunks[-1])
+            return message
+
+        async def capture_send(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, capture_receive, capture_send)
+        finally:
+            headers = dict(scope.get("headers") or [])
+            content_type = headers.get(b"content-type", b"").decode("latin-1")
+            body = b"".join(chunks)
+            record = {
+                "t": round(start - self.started, 6),
+                "method": scope["method"],
+                "path": scope["path"],
+                "query": scope.get("query_string", b"").decode("latin-1"),
+                "status": status.get("code", 500),
+                "duration_ms": round((time.monotonic() - start) * 1000, 3),
+            }
+            if content_type:
+                record["content_type"] = content_type
+            if size <= self.max_body:
+                record.update(encode_body(body, content_type))
+            else:
+                record["truncated"] = True
+            self.writer.write(record)
+
+
+def capture_from_env(app):
+    """Add TrafficCaptureMiddleware to app if TRAFFIC_CAPTURE_PATH is set"""
+    path = os.getenv("TRAFFIC_CAPTURE_PATH")
+    if not path:
+        return None
+    writer = TrafficWriter(path)
+    app.add_middleware(
+        TrafficCaptureMiddleware,
+        writer=writer,
+        sample=float(os.getenv("TRAFFIC_CAPTURE_SAMPLE", "1.0")),
+        max_body=int(os.getenv("TRAFFIC_CAPTURE_MAX_BODY", "65536")),
+    )
+    print(f"Capturing API traffic to {path}")
+    return writer
@@ -0,0 +1,157 @@
+"""
+Write-behind buffer for append-only tables.
+
+Rows are accepted into memory and inserted in batches by a background
+task started from the FastAPI lifespan, either when a batch fills up or
+every `flush_interval` seconds. On shutdown the buffer is drained.
+Rows still buffered when the process dies abruptly are lost, so this is
+only used for data where that trade-off is acceptable (workout history).
+
+A batch that fails is retried exactly as it was before any newer rows.
+If a timed-out insert committed after all, the retry hits a unique
+violation on `key` and only the rows not already stored are inserted.
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from app.db import run_query, is_unique_violation
+
+
+class BufferFullError(Exception):
+    """Raised when the buffer stays full for longer than the backpressure timeout"""
+
+
+class WriteBehindBuffer:
+    def __init__(
+        self,
+        db,
+        table_name: str,
+        key: str = "id",
+        batch_size: int = 200,
+        flush_interval: float = 1.0,
+        max_pending: int = 10000,
+        backpressure_timeout: float = 2.0,
+    ):
+        self.db = db
+        self.table_name = table_name
+        self.key = key
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.backpressure_timeout = backpressure_timeout
+        self.pending: deque = deque()
+        self.in_flight: List[Dict[str, Any]] = []
+        self.retry: List[Dict[str, Any]] = []
+        self.flushed = 0
+        self.flush_errors = 0
+        self.rejected = 0
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+
+    def __len__(self) -> int:
+        return len(self.retry) + len(self.in_flight) + len(self.pending)
+
+    async def append(self, row: Dict[str, Any]):
+        """
+        Queue a row for insertion. Waits (up to backpressure_timeout) while
+        the buffer is full, then raises BufferFullError.
+        """
+        if len(self) >= self.max_pending:
+            deadline = time.monotonic() + self.backpressure_timeout
+            while len(self) >= self.max_pending:
+                if time.monotonic() >= deadline:
+                    self.rejected += 1
+                    raise BufferFullError(f"{self.table_name} write buffer is full")
+                self._wake()
+                await asyncio.sleep(0.01)
+
+        self.pending.append(row)
+        if len(self.pending) >= self.batch_size:
+            self._wake()
+
+    def buffered(self, column: str, value: Any) -> List[Dict[str, Any]]:
+        """Rows not yet persisted (or being persisted) whose column equals value"""
+        rows = list(self.retry) + list(self.in_flight) + list(self.pending)
+        return [row for row in rows if row.get(column) == value]
+
+    async def flush(self, drain: bool = False):
+        """Insert one batch (or, with drain=True, everything) into the table"""
+        while (self.retry or self.pending) and not self.in_flight:
+            if self.retry:
+                self.in_flight, self.retry = self.retry, []
+            else:
+                count = min(self.batch_size, len(self.pending))
+                self.in_flight = [self.pending.popleft() for _ in range(count)]
+            batch = self.in_flight
+            try:
+                await self._insert(batch)
+                self.flushed += len(batch)
+            except Exception as e:
+                # Keep the batch as it is and retry it first on the next tick
+                self.flush_errors += 1
+                self.retry = batch
+                print(f"Error flushing {self.table_name} buffer: {e}")
+                return
+            finally:
+                self.in_flight = []
+            if not drain:
+                return
+
+    async def _insert(self, batch: List[Dict[str, Any]]):
+        try:
+            await run_query(self.db.table(self.table_name).insert(batch))
+        except Exception as e:
+            if not is_unique_violation(e):
+                raise
+            # An earlier, timed-out attempt at this batch may have been written
+            keys = [row[self.key] for row in batch]
+            res = await run_query(self.db.table(self.table_name).select(self.key).in_(self.key, keys))
+            stored = {row[self.key] for row in res.data}
+            missing = [row for row in batch if row[self.key] not in stored]
+            if len(missing) == len(batch):
+                raise
+            if missing:
+                await run_query(self.db.table(self.table_name).insert(missing))
+
+    def _wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush(drain=len(self.pending) >= self.batch_size)
+
+    def start(self):
+        """Start the background flusher on the running event loop"""
+        if self._task is None:
+            self._stopping = False
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flusher and write out everything still buffered"""
+        if self._task is not None:
+            # Let an in-progress flush finish rather than cancelling it mid-insert
+            self._stopping = True
+            self._wake()
+            await self._task
+            self._task = None
+            self._wakeup = None
+        await self.flush(drain=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self),
+            "max_pending": self.max_pending,
+            "flushed": self.flushed,
+            "flush_errors": self.flush_errors,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1 @@
+# Micro-benchmarks (run with `python -m benchmarks.run`; not collected by pytest)
@@ -0,0 +1,125 @@
+"""
+Timing, result files and baseline comparison for the benchmark suite.
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+
+# Calls too fast to time individually are looped until a sample takes this long
+MIN_SAMPLE_SECONDS = 0.001
+
+
+class Recorder:
+    """Collects timings as {name, size, median_ms, min_ms, p95_ms, rounds}"""
+
+    def __init__(self, min_rounds: int = 5, max_rounds: int = 200, budget_seconds: float = 1.0):
+        self.min_rounds = min_rounds
+        self.max_rounds = max_rounds
+        self.budget_seconds = budget_seconds
+        self.results: List[Dict[str, Any]] = []
+
+    def bench(self, name: str, size: int, fn: Callable[[], Any], setup: Optional[Callable[[], Any]] = None,
+              rounds: Optional[int] = None):
+        """
+        Time fn() repeatedly: at least min_rounds, then until the time
+        budget or max_rounds runs out (or exactly `rounds` times).
+        `setup` runs untimed before every round.
+        """
+        number = 1 if setup is not None or rounds is not None else self._calibrate(fn)
+        samples = []
+        deadline = time.perf_counter() + self.budget_seconds
+        while True:
+            if setup is not None:
+                setup()
+            start = time.perf_counter()
+            for _ in range(number):
+                fn()
+            samples.append((time.perf_counter() - start) * 1000 / number)
+            if rounds is not None:
+                if len(samples) >= rounds:
+                    break
+            elif len(samples) >= self.max_rounds or (len(samples) >= self.min_rounds and time.perf_counter() > deadline):
+                break
+        return self.record(name, size, samples)
+
+    def record(self, name: str, size: int, samples: List[float]):
+        """Add a result from timings (ms) measured elsewhere, e.g. in a subprocess"""
+        result = {
+            'name': name,
+            'size': size,
+            'median_ms': round(float(np.median(samples)), 4),
+            'min_ms': round(float(np.min(samples)), 4),
+            'p95_ms': round(float(np.percentile(samples, 95)), 4),
+            'rounds': len(samples),
+        }
+        self.results.append(result)
+        print(f"  {name:<40} n={size:<9} median={result['median_ms']:>10.3f}ms  p95={result['p95_ms']:>10.3f}ms")
+        return result
+
+    @staticmethod
+    def _calibrate(fn: Callable[[], Any]) -> int:
+        """Calls per sample so one sample lasts at least MIN_SAMPLE_SECONDS"""
+        number = 1
+        while True:
+            start = time.perf_counter()
+            for _ in range(number):
+                fn()
+            if time.perf_counter() - start >= MIN_SAMPLE_SECONDS or number >= 10000:
+                return number
+            number *= 10
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(path: str, results: List[Dict[str, Any]], sizes: List[int], seed: int):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({
+            'meta': {
+                'timestamp': datetime.now().isoformat(),
+                'commit': _git_commit(),
+                'python': sys.version.split()[0],
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count(),
+                'sizes': sizes,
+                'seed': seed,
+            },
+            'results': results,
+        }, f, indent=2)
+
+
+def compare(baseline: Dict[str, Any], results: List[Dict[str, Any]], threshold: float) -> List[Dict[str, Any]]:
+    """
+    Compare medians against a baseline results file. Returns the rows
+    slower than the baseline by more than `threshold` (0.1 = 10%).
+    """
+    previous = {(r['name'], r['size']): r for r in baseline['results']}
+    regressions = []
+    print(f"\n{'benchmark':<40} {'size':>9} {'baseline':>12} {'current':>12} {'change':>9}")
+    for result in results:
+        before = previous.get((result['name'], result['size']))
+        if before is None or before['median_ms'] <= 0:
+            continue
+        change = result['median_ms'] / before['median_ms'] - 1
+        flag = ''
+        if change > threshold:
+            flag = '  REGRESSION'
+            regressions.append({**result, 'baseline_median_ms': before['median_ms'], 'change': round(change, 4)})
+        elif change < -threshold:
+            flag = '  faster'
+        print(f"{result['name']:<40} {result['size']:>9} {before['median_ms']:>10.3f}ms "
+              f"{result['median_ms']:>10.3f}ms {change:>+8.1%}{flag}")
+    return regressions
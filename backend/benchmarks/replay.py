@@ -0,0 +1,199 @@
+"""
+Replay a JSONL traffic log against the FastAPI app in process.
+
+Requests go through httpx's ASGI transport, so no server or network is
+needed. Logs are captured with TRAFFIC_CAPTURE_PATH (see app.traffic)
+or written by hand, one request per line:
+
+    {"t": 0.0, "method": "POST", "path": "/api/recommend/", "json": {"limit": 10}}
+    {"t": 0.05, "method": "GET", "path": "/api/exercises/", "query": "page=2"}
+
+    cd backend
+    python -m benchmarks.replay traffic.jsonl --concurrency 32 --rate 200 --loops 5
+    python -m benchmarks.replay traffic.jsonl --speed 1.0   # original pacing
+
+Reports throughput, per-route latency percentiles, error rate and
+event-loop lag; --out also writes the report as JSON.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+import httpx
+import numpy as np
+
+from app.metrics import RouteResolver
+from app.traffic import decode_body
+
+
+def load_log(path: str) -> List[Dict[str, Any]]:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {'p50_ms': 0.0, 'p95_ms': 0.0, 'p99_ms': 0.0, 'max_ms': 0.0}
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    return {'p50_ms': round(float(p50), 3), 'p95_ms': round(float(p95), 3),
+            'p99_ms': round(float(p99), 3), 'max_ms': round(float(max(samples)), 3)}
+
+
+class LoopLagMonitor:
+    """Measures how late a periodic timer fires, i.e. how long the loop was blocked"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.lags_ms: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lags_ms.append(max(0.0, (loop.time() - expected) * 1000))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+
+async def replay(
+    app,
+    records: List[Dict[str, Any]],
+    concurrency: int = 16,
+    rate: Optional[float] = None,
+    speed: Optional[float] = None,
+    loops: int = 1,
+) -> Dict[str, Any]:
+    """
+    Send every record `loops` times with at most `concurrency` in flight.
+    Requests start at `rate` per second, at the log's own timestamps
+    scaled by `speed`, or as fast as concurrency allows when neither is set.
+    """
+    resolve = RouteResolver(app)
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    statuses: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    semaphore = asyncio.Semaphore(concurrency)
+    monitor = LoopLagMonitor()
+
+    schedule = []
+    span = (records[-1].get('t', 0.0) - records[0].get('t', 0.0)) if records else 0.0
+    for n in range(loops):
+        for i, record in enumerate(records):
+            if rate:
+                offset = (n * len(records) + i) / rate
+            elif speed:
+                offset = (n * (span + 1e-3) + record.get('t', 0.0) - records[0].get('t', 0.0)) / speed
+            else:
+                offset = None
+            schedule.append((offset, record))
+
+    async def send(client, record):
+        scope = {'type': 'http', 'method': record['method'], 'path': record['path'], 'root_path': ''}
+        route = f"{record['method']} {resolve(scope)}"
+        headers = {'content-type': record['content_type']} if record.get('content_type') else {}
+        if 'json' in record:
+            headers['content-type'] = 'application/json'
+        url = record['path'] + (f"?{record['query']}" if record.get('query') else '')
+        start = time.perf_counter()
+        try:
+            response = await client.request(record['method'], url, content=decode_body(record), headers=headers)
+            status = f'{response.status_code // 100}xx'
+        except Exception:
+            status = 'exception'
+        latencies[route].append((time.perf_counter() - start) * 1000)
+        statuses[route][status] += 1
+
+    async def worker(client, offset, record, started):
+        if offset is not None:
+            delay = started + offset - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        async with semaphore:
+            await send(client, record)
+
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url='http://replay') as client:
+            monitor.start()
+            started = time.perf_counter()
+            if all(offset is None for offset, _ in schedule):
+                # Closed loop: `concurrency` workers pulling from the schedule
+                pending = iter(schedule)
+
+                async def drain():
+                    for _, record in pending:
+                        await send(client, record)
+
+                await asyncio.gather(*(drain() for _ in range(concurrency)))
+            else:
+                await asyncio.gather(*(worker(client, offset, record, started) for offset, record in schedule))
+            elapsed = time.perf_counter() - started
+            await monitor.stop()
+
+    total = sum(len(samples) for samples in latencies.values())
+    errors = sum(counts.get('5xx', 0) + counts.get('exception', 0) for counts in statuses.values())
+    all_latencies = [ms for samples in latencies.values() for ms in samples]
+    return {
+        'requests': total,
+        'elapsed_seconds': round(elapsed, 3),
+        'throughput_rps': round(total / elapsed, 2) if elapsed else 0.0,
+        'error_rate': round(errors / total, 4) if total else 0.0,
+        'latency': percentiles(all_latencies),
+        'routes': {
+            route: {'requests': len(samples), 'statuses': dict(statuses[route]), **percentiles(samples)}
+            for route, samples in sorted(latencies.items())
+        },
+        'event_loop_lag': percentiles(monitor.lags_ms),
+    }
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"\n{report['requests']} requests in {report['elapsed_seconds']}s "
+          f"({report['throughput_rps']} req/s), error rate {report['error_rate']:.2%}")
+    print(f"\n{'route':<45} {'count':>7} {'p50':>9} {'p95':>9} {'p99':>9}  statuses")
+    for route, stats in report['routes'].items():
+        print(f"{route:<45} {stats['requests']:>7} {stats['p50_ms']:>7.2f}ms {stats['p95_ms']:>7.2f}ms "
+              f"{stats['p99_ms']:>7.2f}ms  {stats['statuses']}")
+    lag = report['event_loop_lag']
+    print(f"\nEvent-loop lag: p50 {lag['p50_ms']}ms, p99 {lag['p99_ms']}ms, max {lag['max_ms']}ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a JSONL traffic log against the app in process")
+    parser.add_argument('log', help="JSONL traffic log")
+    parser.add_argument('--concurrency', type=int, default=16, help="Maximum requests in flight")
+    pacing = parser.add_mutually_exclusive_group()
+    pacing.add_argument('--rate', type=float, help="Start requests at this many per second")
+    pacing.add_argument('--speed', type=float, help="Follow the log's timestamps, sped up by this factor")
+    parser.add_argument('--loops', type=int, default=1, help="Times to replay the log")
+    parser.add_argument('--out', help="Also write the report to this JSON file")
+    args = parser.parse_args(argv)
+
+    records = load_log(args.log)
+    if not records:
+        parser.error(f"{args.log} has no requests")
+
+    from app.main import app
+    report = asyncio.run(replay(app, records, args.concurrency, args.rate, args.speed, args.loops))
+    print_report(report)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0 if report['error_rate'] == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,71 @@
+"""
+Run the micro-benchmarks across catalog sizes.
+
+    cd backend
+    python -m benchmarks.run --sizes 1000,10000,100000 --out benchmarks/results/main.json
+    python -m benchmarks.run --sizes 1000,10000,100000 --compare benchmarks/results/main.json --threshold 0.1
+
+Catalogs and fixtures come from ml/generate_catalog.py with a fixed seed
+and are cached between runs. With --compare, the exit status is 1 when
+any benchmark's median is slower than the baseline by more than
+--threshold.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+from benchmarks.harness import Recorder, write_results, compare
+from benchmarks.suites import SUITES
+
+ML_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'ml')
+sys.path.insert(0, ML_DIR)
+import generate_catalog  # noqa: E402
+
+
+def workload(size, seed, cache_dir):
+    """Generated (catalog, fixtures) paths for a size, reused across runs"""
+    catalog_path = os.path.join(cache_dir, f'catalog_{size}_{seed}.csv')
+    fixtures_path = os.path.join(cache_dir, f'fixtures_{size}_{seed}.jsonl')
+    if not (os.path.exists(catalog_path) and os.path.exists(fixtures_path)):
+        generate_catalog.generate(size, catalog_path, seed, max(100, size // 10), fixtures_path)
+    return catalog_path, fixtures_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Model and API micro-benchmarks")
+    parser.add_argument('--sizes', default='1000,10000', help="Comma-separated catalog sizes")
+    parser.add_argument('--suites', default=','.join(SUITES), help=f"Comma-separated subset of {', '.join(SUITES)}")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--budget', type=float, default=1.0, help="Seconds spent per benchmark")
+    parser.add_argument('--out', default=os.path.join(os.path.dirname(__file__), 'results', 'latest.json'))
+    parser.add_argument('--compare', help="Baseline results file to compare against")
+    parser.add_argument('--threshold', type=float, default=0.1, help="Allowed median slowdown (0.1 = 10%%)")
+    parser.add_argument('--cache-dir', default=os.path.join(tempfile.gettempdir(), 'gym-benchmarks'))
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(',')]
+    recorder = Recorder(budget_seconds=args.budget)
+    for size in sizes:
+        catalog_path, fixtures_path = workload(size, args.seed, args.cache_dir)
+        for name in args.suites.split(','):
+            print(f"[{name}] {size} exercises")
+            SUITES[name](recorder, size, catalog_path, fixtures_path)
+
+    write_results(args.out, recorder.results, sizes, args.seed)
+    print(f"\nResults written to {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, recorder.results, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}")
+            return 1
+        print(f"\nNo regressions beyond {args.threshold:.0%}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
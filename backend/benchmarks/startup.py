@@ -0,0 +1,54 @@
+"""
+Cold-start timings for one API worker, measured in a fresh interpreter.
+
+    cd <dir with ml_data/megaGymDataset.csv>
+    PYTHONPATH=path/to/backend python -m benchmarks.startup
+
+Prints one JSON object (milliseconds):
+
+    import_model      app.ml.recommendation_model (inference dependencies)
+    import_app        app.main, including dataset load and model init
+    first_request     first POST /api/recommend/ through the ASGI app
+    mlflow_imported   whether serving pulled in mlflow (it should not)
+
+Run by the `startup` benchmark suite, which records several cold starts.
+"""
+import asyncio
+import json
+import sys
+import time
+
+
+async def _first_request(app) -> float:
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url='http://startup') as client:
+            start = time.perf_counter()
+            response = await client.post('/api/recommend/', json={'limit': 10})
+            elapsed = time.perf_counter() - start
+    response.raise_for_status()
+    return elapsed
+
+
+def measure():
+    start = time.perf_counter()
+    import app.ml.recommendation_model  # noqa: F401
+    import_model = time.perf_counter() - start
+
+    start = time.perf_counter()
+    from app.main import app
+    import_app = time.perf_counter() - start
+
+    first_request = asyncio.run(_first_request(app))
+    return {
+        'import_model': round(import_model * 1000, 3),
+        'import_app': round(import_app * 1000, 3),
+        'first_request': round(first_request * 1000, 3),
+        'mlflow_imported': 'mlflow' in sys.modules,
+    }
+
+
+if __name__ == '__main__':
+    print(json.dumps(measure()))
@@ -0,0 +1,165 @@
+"""
+Benchmark suites. Each suite takes a Recorder, the catalog size and the
+paths of a generated catalog/fixtures pair for that size.
+"""
+import asyncio
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from unittest.mock import patch
+from uuid import uuid4
+
+from fastapi import FastAPI, Response
+from fastapi.testclient import TestClient
+
+from app.dataset import ExerciseCatalog, load_exercises
+from app.ml.recommendation_model import GymRecommendationModel
+from app.mock_db import MockClient
+from app.api import exercises
+
+
+# (body_part, equipment, level, exercise_type) prefixes: 0 to 4 filters
+FILTERS = [
+    {},
+    {'body_part': 'Chest'},
+    {'body_part': 'Chest', 'equipment': 'Barbell'},
+    {'body_part': 'Chest', 'equipment': 'Barbell', 'level': 'Intermediate'},
+    {'body_part': 'Chest', 'equipment': 'Barbell', 'level': 'Intermediate', 'exercise_type': 'Strength'},
+]
+
+
+def model_suite(recorder, size, catalog_path, fixtures_path):
+    df = load_exercises(catalog_path)
+    heavy = 3 if size > 50000 else None
+
+    model = GymRecommendationModel()
+    recorder.bench('model.fit', size, lambda: model.fit(df), rounds=heavy)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'model.joblib')
+        recorder.bench('model.save', size, lambda: model.save(path), rounds=heavy)
+        recorder.bench('model.load', size, lambda: GymRecommendationModel().load(path), rounds=heavy)
+
+    excluded = df['title'].head(20).tolist()
+    for filters in FILTERS:
+        recorder.bench(f'model.recommend[filters={len(filters)}]', size, lambda: model.recommend(limit=10, **filters))
+    recorder.bench('model.recommend[exclude=20]', size,
+                   lambda: model.recommend(body_part='Chest', limit=10, exclude_exercises=excluded))
+    recorder.bench('model.get_similar_exercises', size, lambda: model.get_similar_exercises(size // 2, limit=10))
+
+
+def catalog_suite(recorder, size, catalog_path, fixtures_path):
+    recorder.bench('dataset.load_exercises', size, lambda: load_exercises(catalog_path), rounds=3 if size > 50000 else None)
+    df = load_exercises(catalog_path)
+    recorder.bench('dataset.ExerciseCatalog', size, lambda: ExerciseCatalog(df), rounds=3 if size > 50000 else None)
+    catalog = ExerciseCatalog(df)
+
+    loop = asyncio.new_event_loop()
+
+    def get_exercises(page=1, after_id=None, **filters):
+        query = {'body_part': None, 'equipment': None, 'level': None, 'exercise_type': None, **filters}
+        return loop.run_until_complete(exercises.get_exercises(Response(), page=page, page_size=20, after_id=after_id, **query))
+
+    with patch.object(exercises, 'get_catalog', lambda: catalog):
+        recorder.bench('api.get_exercises[page=1]', size, lambda: get_exercises())
+        recorder.bench('api.get_exercises[page=deep]', size, lambda: get_exercises(page=max(1, size // 40)))
+        recorder.bench('api.get_exercises[after_id]', size, lambda: get_exercises(after_id=size // 2))
+        recorder.bench('api.get_exercises[filters=2]', size, lambda: get_exercises(body_part='Chest', equipment='Barbell'))
+    loop.close()
+
+
+def serialization_suite(recorder, size, catalog_path, fixtures_path):
+    """List and bulk responses through FastAPI with FAST_JSON_RESPONSES on and off"""
+    catalog = ExerciseCatalog(load_exercises(catalog_path))
+    serving = FastAPI()
+    serving.include_router(exercises.router, prefix='/api/exercises')
+    client = TestClient(serving)
+    bulk_ids = list(range(0, size, max(1, size // exercises.MAX_BULK_IDS)))[:exercises.MAX_BULK_IDS]
+
+    def payloads():
+        return (client.get('/api/exercises/', params={'page_size': 100}).json(),
+                client.post('/api/exercises/bulk', json={'ids': bulk_ids}).json())
+
+    with patch.object(exercises, 'get_catalog', lambda: catalog):
+        # Both paths must send the same JSON for the comparison to mean anything
+        with patch.object(exercises, 'FAST_JSON_RESPONSES', False):
+            expected = payloads()
+        with patch.object(exercises, 'FAST_JSON_RESPONSES', True):
+            assert payloads() == expected, "FAST_JSON_RESPONSES changes the response payload"
+        for fast, mode in ((False, 'response_model'), (True, 'fast_json')):
+            with patch.object(exercises, 'FAST_JSON_RESPONSES', fast):
+                recorder.bench(f'serialize.list[page_size=100,{mode}]', size,
+                               lambda: client.get('/api/exercises/', params={'page_size': 100}))
+                recorder.bench(f'serialize.bulk[ids={len(bulk_ids)},{mode}]', size,
+                               lambda: client.post('/api/exercises/bulk', json={'ids': bulk_ids}))
+
+
+def mock_db_suite(recorder, size, catalog_path, fixtures_path):
+    with contextlib.redirect_stdout(io.StringIO()):
+        db = MockClient()
+    recorder.bench('mock_db.load_fixtures', size, lambda: db.load_fixtures(fixtures_path), rounds=1)
+
+    user_ids = [row['id'] for row in db.table('users').select('id').limit(100).execute().data]
+    heavy_user = max(user_ids, key=lambda u: len(db.table('favorites').select('id').eq('user_id', u).execute().data))
+
+    recorder.bench('mock_db.select[eq id]', size, lambda: db.table('users').select('*').eq('id', user_ids[0]).execute())
+    recorder.bench('mock_db.select[favorites page]', size,
+                   lambda: db.table('favorites').select('id, exercise_title').eq('user_id', heavy_user).order('id').limit(20).execute())
+    recorder.bench('mock_db.select[unindexed scan]', size,
+                   lambda: db.table('users').select('id').eq('experience_level', 'Expert').execute())
+    recorder.bench('mock_db.update[eq id]', size,
+                   lambda: db.table('users').update({'name': 'Renamed'}).eq('id', user_ids[3]).execute())
+
+    # Writes go to a fresh user each round so tables grow the same way on every run
+    batch = {}
+
+    def new_batch(count):
+        user_id = str(uuid4())
+        batch['rows'] = [{'user_id': user_id, 'exercise_title': f'Exercise {i}'} for i in range(count)]
+        batch['user_id'] = user_id
+
+    recorder.bench('mock_db.insert[1]', size, lambda: db.table('favorites').insert(batch['rows']).execute(),
+                   setup=lambda: new_batch(1))
+    recorder.bench('mock_db.insert[100]', size, lambda: db.table('favorites').insert(batch['rows']).execute(),
+                   setup=lambda: new_batch(100))
+    recorder.bench('mock_db.delete[eq user_id]', size,
+                   lambda: db.table('favorites').delete().eq('user_id', batch['user_id']).execute(),
+                   setup=lambda: (new_batch(20), db.table('favorites').insert(batch['rows']).execute()))
+
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STARTUP_ROUNDS = 3
+
+
+def startup_suite(recorder, size, catalog_path, fixtures_path):
+    """Cold starts in fresh interpreters serving the generated catalog"""
+    runs = []
+    with tempfile.TemporaryDirectory() as workdir:
+        # app.dataset picks up ./ml_data/megaGymDataset.csv first
+        os.makedirs(os.path.join(workdir, 'ml_data'))
+        os.symlink(os.path.abspath(catalog_path), os.path.join(workdir, 'ml_data', 'megaGymDataset.csv'))
+        env = {**os.environ, 'PYTHONPATH': BACKEND_DIR, 'LOCAL_DB_PATH': '', 'SUPABASE_URL': '', 'SUPABASE_KEY': ''}
+        for _ in range(STARTUP_ROUNDS):
+            output = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.startup'], cwd=workdir, env=env,
+                capture_output=True, text=True, check=True
+            ).stdout
+            runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    for stage in ('import_model', 'import_app', 'first_request'):
+        recorder.record(f'startup.{stage}', size, [run[stage] for run in runs])
+    if any(run['mlflow_imported'] for run in runs):
+        print("  warning: serving imported mlflow")
+
+
+SUITES = {
+    'model': model_suite,
+    'catalog': catalog_suite,
+    'serialization': serialization_suite,
+    'mock_db': mock_db_suite,
+    'startup': startup_suite,
+}
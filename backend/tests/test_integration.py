@@ -2,6 +2,7 @@
 Integration Tests for Gym Exercise Recommendation API
 """
 import pytest
+import pandas as pd
 from fastapi.testclient import TestClient
 import sys
 import os
@@ -19,6 +20,25 @@ MODEL_AVAILABLE = os.path.exists(MODEL_PATH)
 skip_if_no_model = pytest.mark.skipif(not MODEL_AVAILABLE, reason="ML model not available in CI")
 
 
+def sample_exercises():
+    """A small catalog for tests that fit their own model"""
+    return pd.DataFrame({
+        'title': ['Barbell Bench Press', 'Dumbbell Curl', 'Squat', 'Deadlift', 'Push-up'],
+        'desc': [
+            'A strength exercise for chest',
+            'An arm exercise for biceps',
+            'A leg exercise for quadriceps',
+            'A full body exercise',
+            'A bodyweight chest exercise'
+        ],
+        'type': ['Strength'] * 5,
+        'bodypart': ['Chest', 'Arms', 'Legs', 'Full Body', 'Chest'],
+        'equipment': ['Barbell', 'Dumbbell', 'Barbell', 'Barbell', 'Body Only'],
+        'level': ['Intermediate', 'Beginner', 'Intermediate', 'Expert', 'Beginner'],
+        'rating': [9.0, 8.5, 9.2, 9.5, 8.0]
+    })
+
+
 class TestHealthEndpoints:
     """Test health check endpoints"""
     
@@ -39,6 +59,15 @@ class TestHealthEndpoints:
         data = response.json()
         assert data["status"] == "healthy"
         assert data["api"] == "up"
+    
+    def test_metrics_endpoint(self):
+        """Test that /metrics exposes request counts by route template"""
+        client.get("/api/users/metrics-probe")
+        response = client.get("/metrics")
+        
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert 'http_requests_total{method="GET",route="/api/users/{user_id}",status="404"}' in response.text
 
 
 class TestExercisesAPI:
@@ -65,6 +94,54 @@ class TestExercisesAPI:
         assert data["page"] == 1
         assert data["page_size"] == 5
     
+    def test_get_exercises_keyset_pagination(self):
+        """Test that after_id continues from the previous page"""
+        first = client.get("/api/exercises/?page_size=5").json()
+        
+        if first["next_after_id"] is None:
+            assert len(first["exercises"]) == first["total"]
+            return
+        
+        second = client.get(f"/api/exercises/?page_size=5&after_id={first['next_after_id']}").json()
+        by_page = client.get("/api/exercises/?page=2&page_size=5").json()
+        
+        assert second["total"] == first["total"]
+        assert [e["id"] for e in second["exercises"]] == [e["id"] for e in by_page["exercises"]]
+    
+    def test_get_exercises_bulk(self):
+        """Test bulk lookup reports unknown ids as missing"""
+        response = client.post("/api/exercises/bulk", json={"ids": [0, 0, -1]})
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert -1 in data["missing"]
+        assert len(data["exercises"]) + len(data["missing"]) == 2
+    
+    def test_get_exercises_bulk_validates_size(self):
+        """Test that bulk lookup caps the number of ids"""
+        response = client.post("/api/exercises/bulk", json={"ids": list(range(501))})
+        
+        assert response.status_code == 422
+    
+    def test_export_exercises_ndjson(self):
+        """Test that the NDJSON export streams one exercise per line"""
+        import json
+        total = client.get("/api/exercises/").json()["total"]
+        
+        response = client.get("/api/exercises/export")
+        
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert len(lines) == total
+    
+    def test_export_exercises_csv(self):
+        """Test that the CSV export starts with a header row"""
+        response = client.get("/api/exercises/export?format=csv")
+        
+        assert response.status_code == 200
+        assert response.text.splitlines()[0].startswith("id,title")
+    
     def test_get_exercise_filters(self):
         """Test getting available filters"""
         response = client.get("/api/exercises/filters")
@@ -110,6 +187,130 @@ class TestRecommendationsAPI:
         data = response.json()
         assert "recommendations" in data
     
+    def test_overload_returns_503_with_retry_after(self):
+        """Test that shed requests fail fast, or degrade when the fallback is on"""
+        from unittest.mock import patch
+        from app.admission import AdmissionController
+        from app.api import recommendations
+        
+        saturated = AdmissionController("recommend", max_concurrent=0, max_queue=0, retry_after=3)
+        with patch.object(recommendations, "admission", saturated), \
+                patch.object(recommendations.recommendation_model, "is_fitted", True):
+            response = client.post("/api/recommend/", json={"limit": 5})
+            with patch.object(recommendations, "OVERLOAD_FALLBACK", True):
+                degraded = client.post("/api/recommend/", json={"limit": 5})
+        
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == "3"
+        assert degraded.status_code == 200
+        assert degraded.json()["degraded"] is True
+        assert "etag" not in degraded.headers
+    
+    def test_reload_publishes_a_new_model(self, tmp_path):
+        """Test that a refit swaps in a new model and leaves the serving one intact"""
+        from unittest.mock import patch
+        from app.api import recommendations
+        from app.dataset import DatasetRegistry
+        
+        data_path = tmp_path / "exercises.csv"
+        exercises = sample_exercises()
+        exercises.to_csv(data_path, index=False)
+        registry = DatasetRegistry(str(data_path))
+        
+        with patch.object(recommendations, "registry", registry), \
+                patch.object(recommendations, "MODEL_PATH", str(tmp_path / "missing.joblib")), \
+                patch.object(recommendations, "recommendation_model", recommendations.recommendation_model):
+            recommendations.initialize_model()
+            serving = recommendations.recommendation_model
+        
+            exercises.head(3).to_csv(data_path, index=False)
+            registry.reload()
+            recommendations.initialize_model()
+            response = client.post("/api/recommend/", json={"limit": 5})
+            refitted = recommendations.recommendation_model
+        
+        assert refitted is not serving
+        assert len(serving.df) == serving.tfidf_matrix.shape[0] == 5
+        assert len(refitted.df) == refitted.tfidf_matrix.shape[0] == 3
+        assert response.status_code == 200
+        assert response.json()["total_found"] == 3
+
+    def test_etag_names_the_version_that_was_scored(self, tmp_path):
+        """Test that a reload during scoring doesn't tag old results with the new version"""
+        from unittest.mock import patch
+        from app.api import recommendations
+        from app.compression import etag
+        from app.dataset import DatasetRegistry
+        
+        data_path = tmp_path / "exercises.csv"
+        exercises = sample_exercises()
+        exercises.to_csv(data_path, index=False)
+        registry = DatasetRegistry(str(data_path))
+        body = {"limit": 5}
+        identity = {"Accept-Encoding": "identity"}
+        
+        def reload_once(stage, seconds):
+            # Runs on the worker thread while the old model is still scoring
+            if registry.catalog.version == scored_version:
+                exercises.head(3).to_csv(data_path, index=False)
+                registry.reload()
+                recommendations.initialize_model()
+        
+        with patch.object(recommendations, "registry", registry), \
+                patch.object(recommendations, "MODEL_PATH", str(tmp_path / "missing.joblib")), \
+                patch.object(recommendations, "recommendation_model", recommendations.recommendation_model):
+            recommendations.initialize_model()
+            scored_version = registry.catalog.version
+            recommendations.recommendation_model.stage_observer = reload_once
+            during = client.post("/api/recommend/", json=body, headers=identity)
+            after = client.post("/api/recommend/", json=body, headers=identity)
+        
+        expected = recommendations.RecommendationRequest(**body).model_dump_json()
+        assert registry.catalog.version != scored_version
+        assert during.json()["total_found"] == 5
+        assert during.headers["etag"] == etag("recommend", scored_version, expected)
+        assert after.json()["total_found"] == 3
+        assert after.headers["etag"] == etag("recommend", registry.catalog.version, expected)
+    
+    def test_deadline_returns_partial_results(self):
+        """Test that a spent deadline_ms budget gives partial results instead of an error"""
+        import time
+        from unittest.mock import patch
+        from app.admission import AdmissionController
+        from app.api import recommendations
+        from app.ml.recommendation_model import GymRecommendationModel
+        
+        model = GymRecommendationModel().fit(sample_exercises())
+        # A slow dataset refresh uses up the whole budget
+        slow_refresh = lambda: time.sleep(0.01)
+        queue_only = AdmissionController("recommend", max_concurrent=0, max_queue=1, max_wait=5)
+        
+        with patch.object(recommendations, "recommendation_model", model), \
+                patch.object(recommendations.registry, "refresh", slow_refresh), \
+                patch('app.ml.recommendation_model.SCORE_CHUNK_ROWS', 2):
+            response = client.post("/api/recommend/", json={"limit": 5, "deadline_ms": 1})
+            complete = client.post("/api/recommend/", json={"limit": 5})
+            with patch.object(recommendations, "admission", queue_only):
+                queued = client.post("/api/recommend/", json={"limit": 5, "deadline_ms": 1})
+        
+        # Only the first chunk was scored
+        assert response.status_code == 200
+        assert response.json()["partial"] is True
+        assert [r["id"] for r in response.json()["recommendations"]] == [0, 1]
+        assert "etag" not in response.headers
+        assert complete.json()["partial"] is False
+        assert complete.json()["total_found"] == 5
+        # Still queued at the deadline: an empty partial answer, not a 503
+        assert queued.status_code == 200
+        assert queued.json()["partial"] is True
+        assert queued.json()["recommendations"] == []
+    
+    def test_get_recommendations_validates_deadline(self):
+        """Test that deadline_ms must be positive"""
+        response = client.post("/api/recommend/", json={"limit": 5, "deadline_ms": 0})
+        
+        assert response.status_code == 422
+    
     def test_get_recommendations_validates_limit(self):
         """Test that limit is validated"""
         response = client.post(
@@ -173,6 +374,36 @@ class TestUsersAPI:
         response = client.get("/api/users/nonexistent-id")
         
         assert response.status_code == 404
+    
+    def test_create_existing_email_returns_same_user(self):
+        """Test that re-registering an email logs the user in"""
+        payload = {"email": "repeat@example.com", "name": "Repeat User"}
+        first = client.post("/api/users/", json=payload).json()
+        second = client.post("/api/users/", json=payload).json()
+        
+        assert second["id"] == first["id"]
+        
+        # Cleanup
+        client.delete(f"/api/users/{first['id']}")
+    
+    def test_get_user_reflects_updates(self):
+        """Test that cached profiles are invalidated by updates"""
+        user_id = client.post("/api/users/", json={"email": "cache@example.com", "name": "Before"}).json()["id"]
+        client.get(f"/api/users/{user_id}")
+        
+        client.put(f"/api/users/{user_id}", json={"name": "After"})
+        
+        assert client.get(f"/api/users/{user_id}").json()["name"] == "After"
+        assert "caches" in client.get("/health").json()
+        
+        # Cleanup
+        client.delete(f"/api/users/{user_id}")
+    
+    def test_update_and_delete_nonexistent_user_return_404(self):
+        """Test that writes to unknown users return 404"""
+        assert client.put("/api/users/nonexistent-id", json={"name": "X"}).status_code == 404
+        assert client.put("/api/users/nonexistent-id", json={}).status_code == 404
+        assert client.delete("/api/users/nonexistent-id").status_code == 404
 
 
 class TestFavoritesAPI:
@@ -204,6 +435,60 @@ class TestFavoritesAPI:
         assert data["exercise_title"] == "Bench Press"
         assert "id" in data
     
+    def test_add_duplicate_favorite_returns_400(self, test_user):
+        """Test that the same exercise cannot be favorited twice"""
+        client.post(f"/api/users/{test_user}/favorites", json={"exercise_title": "Deadlift"})
+        response = client.post(f"/api/users/{test_user}/favorites", json={"exercise_title": "Deadlift"})
+        
+        assert response.status_code == 400
+    
+    def test_add_favorites_batch(self, test_user):
+        """Test batch add reports added, existing and repeated titles"""
+        client.post(f"/api/users/{test_user}/favorites", json={"exercise_title": "Lunge"})
+        
+        response = client.post(
+            f"/api/users/{test_user}/favorites/batch",
+            json={"exercise_titles": ["Lunge", "Row", "Plank", "Row"]}
+        )
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert data["added"] == 2
+        assert [r["status"] for r in data["results"]] == ["exists", "added", "added", "duplicate"]
+    
+    def test_remove_favorites_batch(self, test_user):
+        """Test batch delete removes only the user's favorites"""
+        added = client.post(
+            f"/api/users/{test_user}/favorites/batch",
+            json={"exercise_titles": ["Dip", "Pull-up"]}
+        ).json()
+        ids = [r["favorite"]["id"] for r in added["results"]]
+        
+        response = client.request(
+            "DELETE",
+            f"/api/users/{test_user}/favorites/batch",
+            json={"favorite_ids": ids + ["missing-id"]}
+        )
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert data["removed"] == 2
+        assert data["results"][-1]["status"] == "not_found"
+        titles = [f["exercise_title"] for f in client.get(f"/api/users/{test_user}/favorites").json()]
+        assert "Dip" not in titles and "Pull-up" not in titles
+    
+    def test_get_favorites_expanded(self, test_user):
+        """Test that expand=exercise embeds catalog records"""
+        client.post(f"/api/users/{test_user}/favorites", json={"exercise_title": "Not A Real Exercise"})
+        
+        plain = client.get(f"/api/users/{test_user}/favorites").json()
+        expanded = client.get(f"/api/users/{test_user}/favorites?expand=exercise").json()
+        
+        assert "exercise" not in plain[0]
+        assert len(expanded) == len(plain)
+        assert expanded[0]["exercise_title"] == plain[0]["exercise_title"]
+        assert expanded[0]["exercise"] is None
+    
     def test_get_favorites(self, test_user):
         """Test getting user favorites"""
         # Add a favorite first
@@ -217,6 +502,359 @@ class TestFavoritesAPI:
         assert response.status_code == 200
         data = response.json()
         assert isinstance(data, list)
+    
+    def test_get_favorites_paginated(self, test_user):
+        """Test keyset pagination with limit/after and the X-Next-After header"""
+        titles = [f"Paged {i}" for i in range(5)]
+        client.post(f"/api/users/{test_user}/favorites/batch", json={"exercise_titles": titles})
+        
+        seen = []
+        after = None
+        while True:
+            params = {"limit": 2, **({"after": after} if after else {})}
+            response = client.get(f"/api/users/{test_user}/favorites", params=params)
+            assert response.status_code == 200
+            assert len(response.json()) <= 2
+            seen.extend(f["exercise_title"] for f in response.json())
+            after = response.headers.get("X-Next-After")
+            if after is None:
+                break
+        
+        # Pages follow the full list's (created_at, id) order
+        everything = client.get(f"/api/users/{test_user}/favorites").json()
+        assert seen == [f["exercise_title"] for f in everything]
+        assert [(f["created_at"], f["id"]) for f in everything] == sorted((f["created_at"], f["id"]) for f in everything)
+        assert sorted(seen) == titles
+        assert client.get(f"/api/users/{test_user}/favorites", params={"limit": 1000}).status_code == 422
+    
+    def test_get_favorites_paged_by_default(self, test_user):
+        """Test that the default response is a capped first page with a cursor to the rest"""
+        from app.api.users import DEFAULT_FAVORITES_PAGE
+        
+        titles = [f"Bulk {i:03d}" for i in range(DEFAULT_FAVORITES_PAGE + 20)]
+        for start in range(0, len(titles), 60):
+            client.post(f"/api/users/{test_user}/favorites/batch", json={"exercise_titles": titles[start:start + 60]})
+        
+        first = client.get(f"/api/users/{test_user}/favorites")
+        rest = client.get(f"/api/users/{test_user}/favorites", params={"after": first.headers["x-next-after"]})
+        
+        assert len(first.json()) == DEFAULT_FAVORITES_PAGE
+        assert len(rest.json()) == 20
+        assert "x-next-after" not in rest.headers
+        assert sorted(f["exercise_title"] for f in first.json() + rest.json()) == titles
+    
+    def test_next_cursor_exposed_to_browsers(self, test_user):
+        """Test that cross-origin scripts can read X-Next-After"""
+        client.post(f"/api/users/{test_user}/favorites/batch", json={"exercise_titles": ["A", "B"]})
+        
+        response = client.get(
+            f"/api/users/{test_user}/favorites", params={"limit": 1},
+            headers={"Origin": "http://localhost:5173"}
+        )
+        
+        assert "x-next-after" in response.headers["access-control-expose-headers"].lower()
+
+
+class TestHistoryAPI:
+    """Test workout history endpoints"""
+    
+    def test_log_and_read_history(self):
+        """Test that logged sets are readable before and after flushing"""
+        with TestClient(app) as lifespan_client:
+            response = lifespan_client.post(
+                "/api/users/history-user/history",
+                json={"exercise_title": "Squat", "sets": 3, "reps": 5, "weight": 100}
+            )
+            assert response.status_code == 202
+            
+            history = lifespan_client.get("/api/users/history-user/history").json()
+            assert history[0]["exercise_title"] == "Squat"
+        
+        # Shutdown drained the buffer into the database
+        history = client.get("/api/users/history-user/history").json()
+        assert [h["id"] for h in history] == [response.json()["id"]]
+    
+    def test_read_during_flush_sees_row(self):
+        """Test that a row flushed while the history query runs is still returned"""
+        from unittest.mock import patch
+        from app.api import history as history_api
+        
+        response = client.post("/api/users/flush-race-user/history", json={"exercise_title": "Squat"})
+        run_query = history_api.run_query
+        
+        async def query_then_flush(query):
+            # The query misses the row, then a flush takes it out of the buffer
+            res = await run_query(query)
+            await history_api.history_buffer.flush(drain=True)
+            return res
+        
+        with patch.object(history_api, "run_query", query_then_flush):
+            history = client.get("/api/users/flush-race-user/history").json()
+        
+        assert [h["id"] for h in history] == [response.json()["id"]]
+
+
+class TestTrafficReplay:
+    """Test traffic capture and in-process replay"""
+    
+    def test_capture_middleware_records_requests(self, tmp_path):
+        """Test that captured lines hold what replay needs"""
+        import json
+        import time
+        from fastapi import FastAPI
+        from app.traffic import TrafficCaptureMiddleware, TrafficWriter
+        
+        path = tmp_path / "traffic.jsonl"
+        captured_app = FastAPI()
+        
+        @captured_app.post("/api/echo")
+        async def echo(payload: dict):
+            return payload
+        
+        captured_app.add_middleware(TrafficCaptureMiddleware, writer=TrafficWriter(str(path)))
+        with TestClient(captured_app) as capture_client:
+            capture_client.post("/api/echo?x=1", json={"limit": 3})
+            capture_client.get("/docs")
+        
+        for _ in range(50):
+            if path.exists() and path.read_text():
+                break
+            time.sleep(0.01)
+        records = [json.loads(line) for line in path.read_text().splitlines()]
+        
+        assert len(records) == 1
+        assert records[0]["method"] == "POST"
+        assert records[0]["path"] == "/api/echo"
+        assert records[0]["query"] == "x=1"
+        assert records[0]["json"] == {"limit": 3}
+        assert records[0]["status"] == 200
+    
+    async def test_replay_reports_per_route(self):
+        """Test that replay groups latencies by route template"""
+        from benchmarks.replay import replay
+        
+        records = [
+            {"method": "GET", "path": "/api/exercises/filters"},
+            {"method": "GET", "path": "/api/users/missing-1"},
+            {"method": "GET", "path": "/api/users/missing-2"},
+        ]
+        
+        report = await replay(app, records, concurrency=2, loops=2)
+        
+        assert report["requests"] == 6
+        assert report["routes"]["GET /api/users/{user_id}"]["requests"] == 4
+        assert report["routes"]["GET /api/users/{user_id}"]["statuses"] == {"4xx": 4}
+        assert "p99_ms" in report["event_loop_lag"]
+    
+    def test_capture_from_env_records_real_app(self, tmp_path):
+        """Test that TRAFFIC_CAPTURE_PATH wires capture into app.main, in a log replay can read"""
+        import subprocess
+        from benchmarks.replay import load_log
+        
+        path = tmp_path / "traffic.jsonl"
+        # app.main reads the variable at import, so drive it in a fresh interpreter
+        code = (
+            "import os, time\n"
+            "from fastapi.testclient import TestClient\n"
+            "from app.main import app\n"
+            "with TestClient(app) as c:\n"
+            "    c.get('/api/exercises/', params={'page_size': 2})\n"
+            "    c.post('/api/users/', json={'email': 'capture@example.com', 'name': 'Capture'})\n"
+            "    c.get('/health')\n"
+            "path = os.environ['TRAFFIC_CAPTURE_PATH']\n"
+            "for _ in range(200):\n"
+            "    if os.path.exists(path) and open(path).read().count('\\n') >= 2:\n"
+            "        break\n"
+            "    time.sleep(0.01)\n"
+        )
+        env = {**os.environ, "TRAFFIC_CAPTURE_PATH": str(path), "MLFLOW_DISABLE_AGENT_HINT": "1"}
+        subprocess.run(
+            [sys.executable, "-c", code], cwd=os.path.join(os.path.dirname(__file__), ".."),
+            env=env, capture_output=True, text=True, check=True
+        )
+        
+        records = load_log(str(path))
+        assert [(r["method"], r["path"]) for r in records] == [("GET", "/api/exercises/"), ("POST", "/api/users/")]
+        assert records[0]["query"] == "page_size=2"
+        assert records[1]["json"] == {"email": "capture@example.com", "name": "Capture"}
+
+
+class TestProfiling:
+    """Test sampled request profiling"""
+    
+    def test_profiling_from_env_profiles_real_route(self, tmp_path):
+        """Test that PROFILE_DIR/PROFILE_TOKEN wire profiling into app.main, filed by route"""
+        import pstats
+        import subprocess
+        
+        # app.main reads the variables at import, so drive it in a fresh interpreter
+        code = (
+            "from fastapi.testclient import TestClient\n"
+            "from app.main import app\n"
+            "c = TestClient(app)\n"
+            "print(c.get('/api/exercises/7').headers.get('x-profile-id'))\n"
+            "print(c.get('/api/exercises/7', headers={'X-Debug-Profile': 'wrong'}).headers.get('x-profile-id'))\n"
+            "print(c.get('/api/exercises/7', headers={'X-Debug-Profile': 'secret'}).headers.get('x-profile-id'))\n"
+        )
+        env = {**os.environ, "PROFILE_DIR": str(tmp_path), "PROFILE_TOKEN": "secret", "MLFLOW_DISABLE_AGENT_HINT": "1"}
+        output = subprocess.run(
+            [sys.executable, "-c", code], cwd=os.path.join(os.path.dirname(__file__), ".."),
+            env=env, capture_output=True, text=True, check=True
+        ).stdout.splitlines()
+        
+        unprofiled, wrong_token, profile_id = output[-3:]
+        assert unprofiled == wrong_token == "None"
+        assert profile_id.startswith("GET_api_exercises_exercise_id/")
+        stats = pstats.Stats(str(tmp_path / profile_id))
+        assert any(func[2] == "get_exercise" for func in stats.stats)
+    
+    def test_collapsed_output_and_file_limit(self, tmp_path):
+        """Test collapsed-stack output of real routes and that old profiles are deleted"""
+        from app.profiling import ProfilingMiddleware, ProfileStore
+        
+        store = ProfileStore(str(tmp_path), max_files=2)
+        profiled_client = TestClient(ProfilingMiddleware(
+            app, store=store, routes_app=app, sample=1.0, output="collapsed"
+        ))
+        
+        for _ in range(4):
+            assert profiled_client.get("/api/exercises/filters").status_code == 200
+        
+        files = [path for path in tmp_path.rglob("*") if path.is_file()]
+        assert len(files) == 2
+        assert all(path.suffix == ".collapsed" for path in files)
+        assert {path.parent.name for path in files} == {"GET_api_exercises_filters"}
+    
+    def test_worker_thread_scoring_in_profiles(self, tmp_path):
+        """Test that recommend scoring, which runs on a worker thread, shows up in both formats"""
+        import pstats
+        import time
+        from unittest.mock import patch
+        from app.api import recommendations
+        from app.ml.recommendation_model import GymRecommendationModel
+        from app.profiling import ProfilingMiddleware, ProfileStore
+        
+        model = GymRecommendationModel().fit(sample_exercises())
+        # Long enough for the 1 ms stack sampler to catch recommend_within
+        model.stage_observer = lambda stage, seconds: time.sleep(0.02)
+        
+        for output in ("pstats", "collapsed"):
+            store = ProfileStore(str(tmp_path / output))
+            profiled_client = TestClient(ProfilingMiddleware(
+                app, store=store, routes_app=app, token="secret", output=output
+            ))
+            with patch.object(recommendations, "recommendation_model", model):
+                recommend = profiled_client.post(
+                    "/api/recommend/", json={"body_part": "Chest", "limit": 3},
+                    headers={"X-Debug-Profile": "secret"}
+                )
+                similar = profiled_client.post("/api/recommend/similar/0", headers={"X-Debug-Profile": "secret"})
+            
+            assert recommend.status_code == similar.status_code == 200
+            recommend_profile = os.path.join(store.directory, recommend.headers["x-profile-id"])
+            similar_profile = os.path.join(store.directory, similar.headers["x-profile-id"])
+            if output == "pstats":
+                assert any(func[2] == "recommend_within" for func in pstats.Stats(recommend_profile).stats)
+                assert any(func[2] == "get_similar_exercises" and func[0].endswith("recommendation_model.py")
+                           for func in pstats.Stats(similar_profile).stats)
+            else:
+                with open(recommend_profile) as f:
+                    assert "recommend_within" in f.read()
+
+
+class TestCompression:
+    """Test response compression and the compressed-body cache"""
+    
+    def make_client(self, cache):
+        from fastapi import FastAPI, Response
+        from fastapi.responses import StreamingResponse
+        from app.compression import CompressionMiddleware
+        
+        compressed_app = FastAPI()
+        
+        @compressed_app.get("/big")
+        async def big():
+            return Response(b'{"items":[' + b",".join([b'"exercise"'] * 200) + b"]}",
+                            media_type="application/json", headers={"ETag": '"v1"'})
+        
+        @compressed_app.get("/small")
+        async def small():
+            return {"ok": True}
+        
+        @compressed_app.get("/stream")
+        async def stream():
+            return StreamingResponse((b"row %d\n" % i for i in range(1000)), media_type="application/x-ndjson")
+        
+        compressed_app.add_middleware(CompressionMiddleware, minimum_size=500, cache=cache)
+        return TestClient(compressed_app)
+    
+    def test_large_bodies_compressed_once_per_version(self):
+        """Test gzip encoding, per-encoding ETag and the compressed-body cache"""
+        from app.cache import TTLCache
+        
+        cache = TTLCache("compressed")
+        compressed_client = self.make_client(cache)
+        
+        first = compressed_client.get("/big", headers={"Accept-Encoding": "gzip"})
+        second = compressed_client.get("/big", headers={"Accept-Encoding": "gzip"})
+        
+        assert first.headers["content-encoding"] == "gzip"
+        assert first.headers["etag"] == '"v1-gzip"'
+        assert first.headers["vary"] == "Accept-Encoding"
+        assert int(first.headers["content-length"]) < len(first.content)
+        assert first.json() == second.json()
+        assert cache.stats()["misses"] == 1 and cache.stats()["hits"] == 1
+    
+    def test_small_and_unaccepted_responses_untouched(self):
+        """Test the size threshold and Accept-Encoding negotiation"""
+        compressed_client = self.make_client(None)
+        
+        assert "content-encoding" not in compressed_client.get("/small", headers={"Accept-Encoding": "gzip"}).headers
+        assert "content-encoding" not in compressed_client.get("/big", headers={"Accept-Encoding": "identity"}).headers
+        assert "content-encoding" not in compressed_client.get("/big", headers={"Accept-Encoding": "gzip;q=0"}).headers
+    
+    def test_streaming_response_compressed(self):
+        """Test that streamed bodies are compressed chunk by chunk"""
+        compressed_client = self.make_client(None)
+        
+        response = compressed_client.get("/stream", headers={"Accept-Encoding": "gzip"})
+        
+        assert response.headers["content-encoding"] == "gzip"
+        assert "content-length" not in response.headers
+        assert response.text.splitlines()[-1] == "row 999"
+    
+    def test_catalog_endpoints_send_etag(self):
+        """Test that cacheable API responses carry an ETag"""
+        response = client.get("/api/exercises/filters")
+        
+        assert response.status_code == 200
+        assert response.headers["etag"] == client.get("/api/exercises/filters").headers["etag"]
+    
+    def test_exercise_page_gzipped_and_cached_by_app(self):
+        """Test that app.main compresses a real exercises page once per catalog version"""
+        from unittest.mock import patch
+        from app import compression
+        from app.api import exercises
+        from app.dataset import ExerciseCatalog
+        
+        df = pd.concat([sample_exercises()] * 30, ignore_index=True)
+        df['title'] = [f"{title} {i}" for i, title in enumerate(df['title'])]
+        catalog = ExerciseCatalog(df, ("compression-test", 1))
+        
+        with patch.object(exercises, "get_catalog", lambda: catalog):
+            before = compression.compressed_cache.stats()
+            first = client.get("/api/exercises/?page_size=100", headers={"Accept-Encoding": "gzip"})
+            second = client.get("/api/exercises/?page_size=100", headers={"Accept-Encoding": "gzip"})
+            after = compression.compressed_cache.stats()
+        
+        assert first.status_code == 200
+        assert first.headers["content-encoding"] == "gzip"
+        assert first.headers["etag"].endswith('-gzip"')
+        assert int(first.headers["content-length"]) < len(first.content)
+        assert len(first.json()["exercises"]) == 100
+        assert first.content == second.content
+        assert after["misses"] - before["misses"] == 1
+        assert after["hits"] - before["hits"] == 1
 
 
 if __name__ == '__main__':
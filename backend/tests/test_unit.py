@@ -1,6 +1,7 @@
 """
 Unit Tests for Gym Exercise Recommendation API
 """
+import asyncio
 import pytest
 import pandas as pd
 import numpy as np
@@ -12,6 +13,19 @@ import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
 from app.ml.recommendation_model import GymRecommendationModel
+from app.api.exercises import ExerciseCatalog
+from app.dataset import DatasetRegistry
+from app.mock_db import MockClient
+from app.sqlite_db import SQLiteClient, SQLiteAPIError
+from app.db import run_query
+from app.cache import TTLCache, InvalidationChannel
+from app.write_buffer import WriteBehindBuffer, BufferFullError
+from app.fastjson import splice_object
+from app.ml.sweep import NgramAnalyzer, tokenize_corpus, expand_grid, sample_space, select_best
+from benchmarks.harness import Recorder, compare
+from app.ml.evaluation import facet_gain, precision_at_k, ndcg_at_k, latency_percentiles, sample_queries
+from app.metrics import Registry
+from app.admission import AdmissionController, Overloaded
 
 
 # Sample test data
@@ -119,6 +133,32 @@ class TestGymRecommendationModel:
         
         for rec in recommendations:
             assert rec['title'] not in exclude
+    
+    def test_recommend_within_deadline_returns_partial(self):
+        """Test that an expired deadline stops after the first chunk"""
+        model = GymRecommendationModel()
+        model.fit(SAMPLE_EXERCISES)
+        
+        with patch('app.ml.recommendation_model.SCORE_CHUNK_ROWS', 2):
+            complete, complete_partial = model.recommend_within(None, limit=5)
+            early, early_partial = model.recommend_within(0.0, limit=5)
+        
+        assert complete_partial is False
+        assert [r['id'] for r in complete] == [3, 2, 0, 1, 4]
+        assert early_partial is True
+        assert [r['id'] for r in early] == [0, 1]
+    
+    def test_serving_import_skips_mlflow(self):
+        """Test that importing the model does not import mlflow"""
+        import subprocess
+        
+        code = "import sys, app.ml.recommendation_model; print('mlflow' in sys.modules)"
+        output = subprocess.run(
+            [sys.executable, "-c", code], cwd=os.path.join(os.path.dirname(__file__), ".."),
+            capture_output=True, text=True, check=True
+        ).stdout
+        
+        assert output.strip() == "False"
 
 
 class TestRecommendationResponse:
@@ -169,5 +209,668 @@ class TestSimilarExercises:
             assert s['id'] != 0
 
 
+class TestExerciseCatalog:
+    """Test the in-memory exercise catalog and facet index"""
+    
+    def test_catalog_builds_records(self):
+        """Test that records are prebuilt for every row"""
+        catalog = ExerciseCatalog(SAMPLE_EXERCISES)
+        
+        assert len(catalog) == 5
+        assert catalog.get(0).title == 'Barbell Bench Press'
+        assert catalog.get(0).body_part == 'Chest'
+        assert catalog.get(99) is None
+    
+    def test_catalog_select_intersects_facets(self):
+        """Test that filters are case-insensitive and combined"""
+        catalog = ExerciseCatalog(SAMPLE_EXERCISES)
+        
+        assert catalog.select(body_part='chest') == [0, 4]
+        assert catalog.select(body_part='Chest', equipment='barbell') == [0]
+        assert catalog.select(body_part='Chest', level='Expert') == []
+        assert catalog.select() == [0, 1, 2, 3, 4]
+    
+    def test_catalog_keyset_matches_offset_pages(self):
+        """Test that after_id cursors walk the same rows as page offsets"""
+        catalog = ExerciseCatalog(SAMPLE_EXERCISES)
+        ids = catalog.select()
+        
+        first = catalog.page(ids, page=1, page_size=2)
+        second = catalog.page(ids, page=2, page_size=2)
+        after = catalog.page(ids, page=1, page_size=2, after_id=first[-1].id)
+        
+        assert [e.id for e in after] == [e.id for e in second]
+    
+    def test_catalog_title_index(self):
+        """Test case-insensitive title lookups"""
+        catalog = ExerciseCatalog(SAMPLE_EXERCISES)
+        
+        assert catalog.find_by_title('squat') == 2
+        assert catalog.find_by_title('Unknown Move') is None
+    
+    def test_catalog_facet_values(self):
+        """Test that facet values keep their original casing"""
+        catalog = ExerciseCatalog(SAMPLE_EXERCISES)
+        
+        assert catalog.facet_values['level'] == ['Beginner', 'Expert', 'Intermediate']
+
+    
+    def test_catalog_fragments_match_records(self):
+        """Test that pre-serialized fragments decode to the records"""
+        import json
+        catalog = ExerciseCatalog(SAMPLE_EXERCISES)
+        
+        body = splice_object("exercises", catalog.fragments_for([1, 3]), {"total": 2})
+        data = json.loads(body)
+        
+        assert data["total"] == 2
+        assert data["exercises"] == [catalog.get(1).model_dump(), catalog.get(3).model_dump()]
+    
+    def test_catalog_top_rated(self):
+        """Test rating-ordered fallback selection with exclusions"""
+        catalog = ExerciseCatalog(SAMPLE_EXERCISES)
+        
+        assert [e.id for e in catalog.top_rated(catalog.select(), 3)] == [3, 2, 0]
+        assert [e.id for e in catalog.top_rated(catalog.select(body_part='Chest'), 5, exclude=[0])] == [4]
+
+
+class TestDatasetRegistry:
+    """Test the shared dataset registry"""
+    
+    def test_registry_reloads_when_csv_changes(self, tmp_path):
+        """Test that a changed CSV produces a new catalog and notifies listeners"""
+        data_path = tmp_path / "exercises.csv"
+        SAMPLE_EXERCISES.to_csv(data_path, index=False)
+        registry = DatasetRegistry(str(data_path))
+        reloads = []
+        registry.on_reload(lambda: reloads.append(registry.generation))
+        
+        assert len(registry.get_catalog()) == 5
+        assert reloads == []
+        
+        SAMPLE_EXERCISES.head(3).to_csv(data_path, index=False)
+        os.utime(data_path, ns=(0, 0))
+        
+        assert len(registry.get_catalog()) == 3
+        assert reloads == [registry.generation]
+    
+    def test_registry_matches_model_frame(self, tmp_path):
+        """Test that a model fitted on the same rows is recognised"""
+        data_path = tmp_path / "exercises.csv"
+        SAMPLE_EXERCISES.to_csv(data_path, index=False)
+        registry = DatasetRegistry(str(data_path))
+        model = GymRecommendationModel().fit(registry.get_dataframe())
+        
+        assert registry.matches(model.df)
+        assert not registry.matches(model.df.head(2))
+    
+    def test_registry_adopts_frame_without_csv(self, tmp_path):
+        """Test serving a model's DataFrame when no CSV exists"""
+        registry = DatasetRegistry(str(tmp_path / "missing.csv"))
+        assert len(registry.get_catalog()) == 0
+        
+        registry.adopt(SAMPLE_EXERCISES)
+        
+        assert len(registry.get_catalog()) == 5
+        assert registry.get_catalog().get(2).title == 'Squat'
+
+
+class TestMockClient:
+    """Test the in-memory Supabase stand-in"""
+    
+    def test_indexed_select_and_update(self):
+        """Test that lookups follow updates to indexed columns"""
+        db = MockClient()
+        db.table("users").insert([{"id": "u1", "email": "a@x.com"}, {"id": "u2", "email": "b@x.com"}]).execute()
+        
+        db.table("users").update({"email": "c@x.com"}).eq("id", "u1").execute()
+        
+        assert db.table("users").select("*").eq("email", "a@x.com").execute().data == []
+        assert db.table("users").select("*").eq("email", "c@x.com").execute().data[0]["id"] == "u1"
+    
+    def test_delete_removes_only_matches(self):
+        """Test that deletes remove matched rows and keep insertion order"""
+        db = MockClient()
+        for user_id, title in [("u1", "Squat"), ("u2", "Deadlift"), ("u1", "Deadlift"), ("u2", "Squat")]:
+            db.table("favorites").insert({"user_id": user_id, "exercise_title": title}).execute()
+        
+        deleted = db.table("favorites").delete().eq("user_id", "u1").execute()
+        
+        assert len(deleted.data) == 2
+        remaining = db.table("favorites").select("*").execute().data
+        assert [(r["user_id"], r["exercise_title"]) for r in remaining] == [("u2", "Deadlift"), ("u2", "Squat")]
+        assert db.table("favorites").select("*").eq("exercise_title", "Squat").execute().data[0]["user_id"] == "u2"
+    
+    def test_unique_constraints(self):
+        """Test that inserts violating unique constraints fail as a whole"""
+        from app.mock_db import MockAPIError
+        db = MockClient()
+        db.table("users").insert({"email": "a@x.com"}).execute()
+        
+        with pytest.raises(MockAPIError) as exc:
+            db.table("users").insert([{"email": "b@x.com"}, {"email": "a@x.com"}]).execute()
+        
+        assert exc.value.code == "23505"
+        assert db.table("users").select("*").eq("email", "b@x.com").execute().data == []
+    
+    def test_in_filter(self):
+        """Test that in_() matches any of the given values"""
+        db = MockClient()
+        db.table("favorites").insert([
+            {"user_id": "u1", "exercise_title": t} for t in ["Squat", "Row", "Plank"]
+        ]).execute()
+        
+        res = db.table("favorites").select("*").eq("user_id", "u1").in_("exercise_title", ["Row", "Plank", "Dip"]).execute()
+        
+        assert sorted(r["exercise_title"] for r in res.data) == ["Plank", "Row"]
+    
+    def test_unindexed_filter_scans(self):
+        """Test that filters on other columns still work"""
+        db = MockClient()
+        db.table("history").insert([{"user_id": "u1", "sets": 3}, {"user_id": "u1", "sets": 5}]).execute()
+        
+        res = db.table("history").select("*").eq("user_id", "u1").eq("sets", 5).execute()
+        
+        assert len(res.data) == 1
+    
+    def test_projection_limit_and_range(self):
+        """Test column projection, ordered limits and inclusive ranges"""
+        db = MockClient()
+        db.table("favorites").insert([
+            {"id": f"f{i}", "user_id": "u1", "exercise_title": f"Ex {i}"} for i in range(5)
+        ]).execute()
+        
+        first = db.table("favorites").select("id").eq("user_id", "u1").order("id").limit(2).execute()
+        rest = db.table("favorites").select("id").eq("user_id", "u1").gt("id", "f1").order("id").execute()
+        window = db.table("favorites").select("id").order("id", desc=True).range(1, 2).execute()
+        
+        assert first.data == [{"id": "f0"}, {"id": "f1"}]
+        assert [r["id"] for r in rest.data] == ["f2", "f3", "f4"]
+        assert [r["id"] for r in window.data] == ["f3", "f2"]
+    
+    def test_chained_order(self):
+        """Test that chained order() calls break ties, in either direction"""
+        db = MockClient()
+        db.table("favorites").insert([
+            {"id": f"f{i}", "user_id": "u1", "exercise_title": f"Ex {i}", "created_at": f"t{i % 2}"} for i in range(4)
+        ]).execute()
+        
+        ascending = db.table("favorites").select("id").order("created_at").order("id").limit(3).execute()
+        mixed = db.table("favorites").select("id").order("created_at").order("id", desc=True).execute()
+        
+        assert [r["id"] for r in ascending.data] == ["f0", "f2", "f1"]
+        assert [r["id"] for r in mixed.data] == ["f2", "f0", "f3", "f1"]
+    
+    def test_range_filters_skip_nulls(self):
+        """Test that comparison filters never match NULL columns"""
+        db = MockClient()
+        db.table("history").insert([{"user_id": "u1", "sets": 3}, {"user_id": "u1", "sets": None}]).execute()
+        
+        assert len(db.table("history").select("*").gte("sets", 1).lte("sets", 3).execute().data) == 1
+        assert db.table("history").select("*").lt("sets", 3).execute().data == []
+    
+    def test_load_fixtures(self, tmp_path):
+        """Test bulk-loading JSON Lines fixtures into indexed tables"""
+        import json
+        path = tmp_path / "fixtures.jsonl"
+        records = [{"table": "users", "row": {"id": f"u{i}", "email": f"u{i}@x.com"}} for i in range(3)]
+        records += [{"table": "favorites", "row": {"user_id": "u1", "exercise_title": t}} for t in ["Squat", "Row"]]
+        path.write_text("\n".join(json.dumps(r) for r in records) + "\n")
+        db = MockClient()
+        
+        counts = db.load_fixtures(str(path), batch_size=2)
+        
+        assert counts == {"users": 3, "favorites": 2}
+        assert len(db.table("favorites").select("*").eq("user_id", "u1").execute().data) == 2
+        assert db.table("users").select("id").eq("email", "u2@x.com").execute().data == [{"id": "u2"}]
+
+
+class TestSQLiteClient:
+    """Test the SQLite-backed local database client"""
+    
+    def test_roundtrip_and_persistence(self, tmp_path):
+        """Test that rows (including list columns) survive a new client"""
+        path = str(tmp_path / "local.db")
+        db = SQLiteClient(path)
+        created = db.table("users").insert({"email": "a@x.com", "name": "A", "fitness_goals": ["Strength"]}).execute()
+        user_id = created.data[0]["id"]
+        
+        reopened = SQLiteClient(path)
+        res = reopened.table("users").select("*").eq("id", user_id).execute()
+        
+        assert res.data[0]["email"] == "a@x.com"
+        assert res.data[0]["fitness_goals"] == ["Strength"]
+    
+    def test_unique_constraints(self, tmp_path):
+        """Test that duplicate emails and favorites raise unique violations"""
+        db = SQLiteClient(str(tmp_path / "local.db"))
+        db.table("users").insert({"id": "u1", "email": "a@x.com", "name": "A"}).execute()
+        db.table("favorites").insert({"user_id": "u1", "exercise_title": "Squat"}).execute()
+        
+        with pytest.raises(SQLiteAPIError) as exc:
+            db.table("users").insert({"id": "u2", "email": "a@x.com", "name": "B"}).execute()
+        assert exc.value.code == "23505"
+        
+        with pytest.raises(SQLiteAPIError) as exc:
+            db.table("favorites").insert({"user_id": "u1", "exercise_title": "Squat"}).execute()
+        assert exc.value.code == "23505"
+    
+    def test_update_delete_and_cascade(self, tmp_path):
+        """Test that updates return rows and user deletes cascade to favorites"""
+        db = SQLiteClient(str(tmp_path / "local.db"))
+        db.table("users").insert({"id": "u1", "email": "a@x.com", "name": "A"}).execute()
+        db.table("favorites").insert({"user_id": "u1", "exercise_title": "Squat"}).execute()
+        
+        updated = db.table("users").update({"name": "B"}).eq("id", "u1").execute()
+        assert updated.data[0]["name"] == "B"
+        
+        deleted = db.table("users").delete().eq("id", "u1").execute()
+        assert len(deleted.data) == 1
+        assert db.table("favorites").select("*").eq("user_id", "u1").execute().data == []
+    
+    def test_in_filter_and_bulk_insert(self, tmp_path):
+        """Test multi-row inserts and in_() filters"""
+        db = SQLiteClient(str(tmp_path / "local.db"))
+        db.table("users").insert({"id": "u1", "email": "a@x.com", "name": "A"}).execute()
+        inserted = db.table("favorites").insert([
+            {"user_id": "u1", "exercise_title": t} for t in ["Squat", "Row", "Plank"]
+        ]).execute()
+        
+        res = db.table("favorites").select("exercise_title").in_("exercise_title", ["Row", "Dip"]).execute()
+        
+        assert len(inserted.data) == 3
+        assert res.data == [{"exercise_title": "Row"}]
+    
+    def test_foreign_key_violation(self, tmp_path):
+        """Test that favorites for unknown users are rejected"""
+        db = SQLiteClient(str(tmp_path / "local.db"))
+        
+        with pytest.raises(SQLiteAPIError) as exc:
+            db.table("favorites").insert({"user_id": "missing", "exercise_title": "Squat"}).execute()
+        assert "foreign key constraint" in str(exc.value)
+    
+    def test_keyset_limit_and_range(self, tmp_path):
+        """Test gt() keyset reads, LIMIT and inclusive range()"""
+        db = SQLiteClient(str(tmp_path / "local.db"))
+        db.table("users").insert({"id": "u1", "email": "a@x.com", "name": "A"}).execute()
+        db.table("favorites").insert([
+            {"id": f"f{i}", "user_id": "u1", "exercise_title": f"Ex {i}"} for i in range(5)
+        ]).execute()
+        
+        page = db.table("favorites").select("id").eq("user_id", "u1").gt("id", "f1").order("id").limit(2).execute()
+        window = db.table("favorites").select("id").order("id", desc=True).range(1, 2).execute()
+        
+        assert page.data == [{"id": "f2"}, {"id": "f3"}]
+        assert window.data == [{"id": "f3"}, {"id": "f2"}]
+        
+        db.table("favorites").update({"created_at": "t0"}).eq("user_id", "u1").execute()
+        db.table("favorites").update({"created_at": "t1"}).in_("id", ["f3", "f4"]).execute()
+        chained = db.table("favorites").select("id").order("created_at", desc=True).order("id").execute()
+        assert [r["id"] for r in chained.data] == ["f3", "f4", "f0", "f1", "f2"]
+
+
+class TestRunQuery:
+    """Test non-blocking query execution"""
+    
+    class SlowQuery:
+        def __init__(self, delay):
+            self.delay = delay
+        
+        def execute(self):
+            import time
+            time.sleep(self.delay)
+            return "done"
+    
+    async def test_sync_queries_overlap(self):
+        """Test that blocking queries run concurrently off the event loop"""
+        import asyncio
+        import time
+        
+        start = time.perf_counter()
+        results = await asyncio.gather(*[run_query(self.SlowQuery(0.2)) for _ in range(4)])
+        
+        assert results == ["done"] * 4
+        assert time.perf_counter() - start < 0.6
+    
+    async def test_timeout_maps_to_504(self):
+        """Test that slow queries fail fast with a gateway timeout"""
+        from fastapi import HTTPException
+        
+        with pytest.raises(HTTPException) as exc:
+            await run_query(self.SlowQuery(0.5), timeout=0.05)
+        assert exc.value.status_code == 504
+    
+    async def test_async_execute_is_awaited(self):
+        """Test that async clients are awaited directly"""
+        class AsyncQuery:
+            async def execute(self):
+                return "async"
+        
+        assert await run_query(AsyncQuery()) == "async"
+
+
+class TestTTLCache:
+    """Test the LRU/TTL cache used for profiles and favorites"""
+    
+    def test_hit_miss_and_stats(self):
+        """Test that lookups are counted"""
+        cache = TTLCache("test", maxsize=10, ttl=60)
+        cache.put("a", 1)
+        
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert cache.stats()["hit_rate"] == 0.5
+    
+    def test_lru_eviction_and_expiry(self):
+        """Test that the least recently used entry is evicted and entries expire"""
+        cache = TTLCache("test", maxsize=2, ttl=60)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+        
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        
+        expiring = TTLCache("test", ttl=0)
+        expiring.put("a", 1)
+        assert expiring.get("a") is None
+    
+    def test_put_after_invalidation_is_dropped(self):
+        """Test that a read racing an invalidation does not cache stale data"""
+        cache = TTLCache("test")
+        epoch = cache.epoch()
+        cache.invalidate("a")
+        cache.put("a", "stale", epoch)
+        
+        assert cache.get("a") is None
+    
+    def test_invalidation_channel_across_workers(self, tmp_path):
+        """Test that invalidations published by one worker reach another"""
+        path = str(tmp_path / "local.db")
+        cache_a, cache_b = TTLCache("user"), TTLCache("user")
+        channel_a = InvalidationChannel(SQLiteClient(path), [cache_a], poll_interval=0)
+        channel_b = InvalidationChannel(SQLiteClient(path), [cache_b], poll_interval=0)
+        cache_b.put("u1", "profile")
+        
+        channel_a.publish("user", "u1")
+        channel_b.poll()
+        
+        assert cache_b.get("u1") is None
+
+
+class TestWriteBehindBuffer:
+    """Test the batched write-behind buffer"""
+    
+    async def test_flush_inserts_in_batches(self):
+        """Test that rows are written batch_size at a time"""
+        db = MockClient()
+        buffer = WriteBehindBuffer(db, "history", batch_size=2)
+        for i in range(5):
+            await buffer.append({"user_id": "u1", "n": i})
+        
+        await buffer.flush()
+        assert len(db.table("history").select("*").execute().data) == 2
+        assert len(buffer.buffered("user_id", "u1")) == 3
+        
+        await buffer.flush(drain=True)
+        assert len(db.table("history").select("*").execute().data) == 5
+        assert len(buffer) == 0
+    
+    async def test_backpressure_rejects_when_full(self):
+        """Test that a full buffer rejects appends after the timeout"""
+        buffer = WriteBehindBuffer(MockClient(), "history", max_pending=1, backpressure_timeout=0.05)
+        await buffer.append({"user_id": "u1"})
+        
+        with pytest.raises(BufferFullError):
+            await buffer.append({"user_id": "u1"})
+        assert buffer.stats()["rejected"] == 1
+    
+    async def test_stop_drains_buffer(self):
+        """Test that stopping the flusher writes out remaining rows"""
+        db = MockClient()
+        buffer = WriteBehindBuffer(db, "history", batch_size=100, flush_interval=60)
+        buffer.start()
+        await buffer.append({"user_id": "u1"})
+        
+        await buffer.stop()
+        
+        assert len(db.table("history").select("*").execute().data) == 1
+    
+    async def test_failed_flush_keeps_rows(self):
+        """Test that rows survive a failed insert and keep their order"""
+        class FailingClient:
+            def table(self, name):
+                raise RuntimeError("database down")
+        
+        buffer = WriteBehindBuffer(FailingClient(), "history", batch_size=1)
+        await buffer.append({"user_id": "u1", "n": 1})
+        await buffer.append({"user_id": "u1", "n": 2})
+        
+        await buffer.flush()
+        
+        assert [r["n"] for r in buffer.buffered("user_id", "u1")] == [1, 2]
+        assert buffer.stats()["flush_errors"] == 1
+    
+    async def test_retry_after_late_commit_keeps_newer_rows(self):
+        """Test that a batch whose timed-out insert committed is not retried with newer rows"""
+        from fastapi import HTTPException
+        
+        class LateCommitClient(MockClient):
+            """Commits the first insert, then reports a timeout"""
+            timed_out = False
+        
+            def table(self, name):
+                query = super().table(name)
+                insert = query.insert
+        
+                def late_insert(rows):
+                    builder = insert(rows)
+                    if self.timed_out:
+                        return builder
+                    self.timed_out = True
+                    builder.execute()
+                    builder.execute = MagicMock(side_effect=HTTPException(status_code=504))
+                    return builder
+                query.insert = late_insert
+                return query
+        
+        db = LateCommitClient()
+        buffer = WriteBehindBuffer(db, "history", batch_size=3)
+        for i in range(2):
+            await buffer.append({"id": f"h{i}", "user_id": "u1"})
+        
+        await buffer.flush()
+        await buffer.append({"id": "h2", "user_id": "u1"})
+        assert [r["id"] for r in buffer.buffered("user_id", "u1")] == ["h0", "h1", "h2"]
+        
+        await buffer.flush(drain=True)
+        
+        stored = db.table("history").select("id").execute().data
+        assert sorted(r["id"] for r in stored) == ["h0", "h1", "h2"]
+        assert buffer.stats()["flushed"] == 3
+        assert len(buffer) == 0
+
+
+class TestEvaluationMetrics:
+    """Test the offline ranking and latency metrics"""
+    
+    def test_facet_gain(self):
+        """Test that gain counts shared facets case-insensitively"""
+        query = {"bodypart": "Chest", "type": "Strength", "equipment": "Barbell", "level": None}
+        candidate = {"bodypart": "chest", "type": "Strength", "equipment": "Dumbbell", "level": None}
+        
+        assert facet_gain(query, candidate) == 2
+        assert facet_gain(query, candidate, facets=["equipment"]) == 0
+    
+    def test_precision_and_ndcg(self):
+        """Test precision@k and nDCG@k against hand-computed values"""
+        assert precision_at_k([2, 0, 1, 0], 4) == 0.5
+        assert precision_at_k([2, 0, 1, 0], 4, threshold=2) == 0.25
+        assert ndcg_at_k([2, 1, 0], [2, 1, 0], 3) == pytest.approx(1.0)
+        assert ndcg_at_k([0, 1, 2], [2, 1, 0], 3) < 1.0
+        assert ndcg_at_k([0, 0], [0, 0], 2) == 0.0
+    
+    def test_latency_percentiles(self):
+        """Test percentile summary of latency samples"""
+        stats = latency_percentiles([float(i) for i in range(1, 101)])
+        
+        assert stats["p50_ms"] == pytest.approx(50.5)
+        assert stats["p99_ms"] > stats["p95_ms"] > stats["p50_ms"]
+        assert latency_percentiles([])["p95_ms"] == 0.0
+    
+    def test_sample_queries_reproducible(self):
+        """Test that the query sample is a sorted, seeded subset of catalog positions"""
+        queries = sample_queries(SAMPLE_EXERCISES, 0.4, 42)
+        
+        assert queries == sorted(queries) == sample_queries(SAMPLE_EXERCISES, 0.4, 42)
+        assert len(queries) == 2
+        assert set(queries) <= set(range(len(SAMPLE_EXERCISES)))
+
+
+class TestSweep:
+    """Test the hyperparameter sweep building blocks"""
+    
+    def test_shared_tokens_match_default_analyzer(self):
+        """Test that fitting on pre-tokenized text gives the same vocabulary as raw text"""
+        raw = GymRecommendationModel().fit(SAMPLE_EXERCISES, ngram_range=(1, 2), min_df=1)
+        tokens = tokenize_corpus(raw.df['feature_text'])
+        shared = GymRecommendationModel().fit(
+            SAMPLE_EXERCISES, ngram_range=(1, 2), min_df=1,
+            analyzer=NgramAnalyzer((1, 2)), documents=tokens
+        )
+        
+        assert shared.tfidf_vectorizer.vocabulary_ == raw.tfidf_vectorizer.vocabulary_
+        assert shared.recommend(body_part="Chest", limit=3) == raw.recommend(body_part="Chest", limit=3)
+    
+    def test_fit_uses_params(self):
+        """Test that fit passes its parameters to the vectorizer"""
+        model = GymRecommendationModel().fit(SAMPLE_EXERCISES, max_features=3, ngram_range=(1, 1), min_df=1)
+        
+        assert len(model.tfidf_vectorizer.vocabulary_) == 3
+        assert model.params["max_features"] == 3
+    
+    def test_grid_and_sampling(self):
+        """Test grid expansion and reproducible random sampling"""
+        space = {"min_df": [1, 2], "max_df": [0.9, 1.0], "ngram_range": [[1, 1]]}
+        
+        grid = expand_grid(space)
+        
+        assert len(grid) == 4
+        assert {"ngram_range": [1, 1], "min_df": 2, "max_df": 0.9} in grid
+        assert sample_space(space, 2, random_state=1) == sample_space(space, 2, random_state=1)
+        assert len(sample_space(space, 10)) == 4
+    
+    def test_select_best_from_pareto_front(self):
+        """Test that the winner is the best-quality non-dominated candidate"""
+        results = [
+            {"config": "a", "quality": 0.8, "latency_ms": 5.0, "matrix_bytes": 100},
+            {"config": "b", "quality": 0.7, "latency_ms": 6.0, "matrix_bytes": 200},
+            {"config": "c", "quality": 0.8, "latency_ms": 4.0, "matrix_bytes": 300},
+            {"config": "d", "error": "no terms"},
+        ]
+        
+        assert select_best(results)["config"] == "c"
+        assert select_best([results[-1]]) is None
+
+
+class TestBenchmarkHarness:
+    """Test benchmark recording and baseline comparison"""
+    
+    def test_recorder_rounds_and_setup(self):
+        """Test that setup runs before every timed round"""
+        calls = []
+        recorder = Recorder()
+        
+        result = recorder.bench("noop", 10, lambda: calls.append("fn"), setup=lambda: calls.append("setup"), rounds=3)
+        
+        assert result["rounds"] == 3
+        assert calls == ["setup", "fn"] * 3
+        assert recorder.results == [result]
+    
+    def test_compare_flags_regressions(self):
+        """Test that only slowdowns beyond the threshold are reported"""
+        baseline = {"results": [
+            {"name": "a", "size": 10, "median_ms": 1.0},
+            {"name": "b", "size": 10, "median_ms": 1.0},
+        ]}
+        current = [
+            {"name": "a", "size": 10, "median_ms": 1.05},
+            {"name": "b", "size": 10, "median_ms": 1.5},
+            {"name": "c", "size": 10, "median_ms": 9.0},
+        ]
+        
+        regressions = compare(baseline, current, threshold=0.1)
+        
+        assert [r["name"] for r in regressions] == ["b"]
+        assert regressions[0]["change"] == pytest.approx(0.5)
+
+
+class TestMetrics:
+    """Test the metrics registry and recommend stage timings"""
+    
+    def test_render_counter_and_histogram(self):
+        """Test Prometheus text output for labelled metrics"""
+        registry = Registry()
+        requests = registry.counter("requests_total", "Requests", ("route",))
+        latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+        
+        requests.inc(route="/a")
+        requests.inc(2, route="/a")
+        latency.observe(0.05)
+        latency.observe(0.5)
+        output = registry.render()
+        
+        assert '# TYPE requests_total counter' in output
+        assert 'requests_total{route="/a"} 3' in output
+        assert 'latency_seconds_bucket{le="0.1"} 1' in output
+        assert 'latency_seconds_bucket{le="+Inf"} 2' in output
+        assert 'latency_seconds_count 2' in output
+    
+    def test_stage_observer_sees_every_stage(self):
+        """Test that recommend reports each stage to the observer"""
+        model = GymRecommendationModel().fit(SAMPLE_EXERCISES)
+        stages = []
+        model.stage_observer = lambda stage, seconds: stages.append(stage)
+        
+        model.recommend(body_part="Chest", limit=2)
+        
+        assert stages == ["filtering", "query_transform", "scoring", "ranking", "serialization"]
+
+
+class TestAdmissionController:
+    """Test admission control and load shedding"""
+    
+    async def test_queue_full_sheds_immediately(self):
+        """Test that requests past the queue depth are rejected"""
+        admission = AdmissionController("test", max_concurrent=1, max_queue=1, max_wait=5.0, retry_after=2)
+        await admission.acquire()
+        waiting = asyncio.ensure_future(admission.acquire())
+        await asyncio.sleep(0)
+        
+        with pytest.raises(Overloaded) as shed:
+            await admission.acquire()
+        assert shed.value.retry_after == 2
+        assert admission.stats()["queued"] == 1
+        
+        admission.release()
+        await waiting
+        assert admission.stats()["in_flight"] == 1
+        assert admission.stats()["shed"] == {"queue_full": 1, "timeout": 0}
+    
+    async def test_queue_wait_times_out(self):
+        """Test that queued requests are shed after max_wait"""
+        admission = AdmissionController("test", max_concurrent=1, max_queue=4, max_wait=0.01)
+        
+        async with admission.slot():
+            with pytest.raises(Overloaded):
+                await admission.acquire()
+        
+        assert admission.stats() == {
+            "max_concurrent": 1, "in_flight": 0, "queued": 0, "admitted": 1,
+            "shed": {"queue_full": 0, "timeout": 1}
+        }
+
+
 if __name__ == '__main__':
     pytest.main([__file__, '-v'])
@@ -52,7 +52,7 @@ function Exercises() {
         if (!userId) return;
 
         try {
-            const data = await usersApi.getFavorites(userId);
+            const data = await usersApi.getAllFavorites(userId);
             setFavorites(data);
         } catch (err) {
             console.error('Error loading favorites:', err);
@@ -4,6 +4,7 @@ import { usersApi } from '../services/api';
 function Profile() {
     const [user, setUser] = useState(null);
     const [favorites, setFavorites] = useState([]);
+    const [favoritesAfter, setFavoritesAfter] = useState(null);
 
     const [isCreating, setIsCreating] = useState(false);
     const [formData, setFormData] = useState({
@@ -33,10 +34,11 @@ function Profile() {
         }
     };
 
-    const loadFavorites = async (userId) => {
+    const loadFavorites = async (userId, after = null) => {
         try {
-            const data = await usersApi.getFavorites(userId);
-            setFavorites(data);
+            const page = await usersApi.getFavorites(userId, { after });
+            setFavorites(prev => after ? [...prev, ...page.favorites] : page.favorites);
+            setFavoritesAfter(page.nextAfter);
         } catch (err) {
             console.error('Error loading favorites:', err);
         }
@@ -72,6 +74,7 @@ function Profile() {
         localStorage.removeItem('gymrec_user_id');
         setUser(null);
         setFavorites([]);
+        setFavoritesAfter(null);
 
     };
 
@@ -216,6 +219,15 @@ function Profile() {
                             No favorites yet. Browse exercises and add some!
                         </p>
                     )}
+                    {favoritesAfter && (
+                        <button
+                            className="btn btn-secondary"
+                            style={{ marginTop: '1rem' }}
+                            onClick={() => loadFavorites(user.id, favoritesAfter)}
+                        >
+                            Load more
+                        </button>
+                    )}
                 </div>
 
 
@@ -48,7 +48,7 @@ function Recommend() {
         if (!userId) return;
 
         try {
-            const data = await usersApi.getFavorites(userId);
+            const data = await usersApi.getAllFavorites(userId);
             setFavorites(data);
         } catch (err) {
             console.error('Error loading favorites:', err);
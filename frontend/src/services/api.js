@@ -22,6 +22,11 @@ export const exercisesApi = {
         return response.data;
     },
 
+    getExercisesBulk: async (ids) => {
+        const response = await api.post('/api/exercises/bulk', { ids });
+        return response.data;
+    },
+
     getFilters: async () => {
         const response = await api.get('/api/exercises/filters');
         return response.data;
@@ -64,9 +69,24 @@ export const usersApi = {
     },
 
     // Favorites
-    getFavorites: async (userId) => {
-        const response = await api.get(`/api/users/${userId}/favorites`);
-        return response.data;
+    getFavorites: async (userId, { expand, limit, after } = {}) => {
+        const params = {};
+        if (expand) params.expand = expand;
+        if (limit) params.limit = limit;
+        if (after) params.after = after;
+        const response = await api.get(`/api/users/${userId}/favorites`, { params });
+        return { favorites: response.data, nextAfter: response.headers['x-next-after'] || null };
+    },
+
+    getAllFavorites: async (userId, { expand } = {}) => {
+        const favorites = [];
+        let after = null;
+        do {
+            const page = await usersApi.getFavorites(userId, { expand, after });
+            favorites.push(...page.favorites);
+            after = page.nextAfter;
+        } while (after);
+        return favorites;
     },
 
     addFavorite: async (userId, exerciseTitle) => {
@@ -79,6 +99,27 @@ export const usersApi = {
         return response.data;
     },
 
+    // Workout history
+    logHistory: async (userId, entry) => {
+        const response = await api.post(`/api/users/${userId}/history`, entry);
+        return response.data;
+    },
+
+    getHistory: async (userId, limit = 50) => {
+        const response = await api.get(`/api/users/${userId}/history`, { params: { limit } });
+        return response.data;
+    },
+
+    addFavoritesBatch: async (userId, exerciseTitles) => {
+        const response = await api.post(`/api/users/${userId}/favorites/batch`, { exercise_titles: exerciseTitles });
+        return response.data;
+    },
+
+    removeFavoritesBatch: async (userId, favoriteIds) => {
+        const response = await api.delete(`/api/users/${userId}/favorites/batch`, { data: { favorite_ids: favoriteIds } });
+        return response.data;
+    },
+
 
 };
 
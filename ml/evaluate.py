@@ -0,0 +1,67 @@
+"""
+Offline Evaluation Script
+Replays a sample of catalog exercises as queries against the trained
+model and records ranking quality (precision@k, nDCG@k) and latency
+percentiles. The model is fitted on the whole catalog, so the quality
+metrics are in-sample.
+"""
+import json
+import os
+import sys
+
+import yaml
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+from app.ml.recommendation_model import GymRecommendationModel
+from app.ml.evaluation import sample_queries, evaluate_similar, evaluate_recommend, latency_percentiles, mean
+
+
+def load_params():
+    """Load parameters from params.yaml"""
+    params_path = os.path.join(os.path.dirname(__file__), 'params.yaml')
+    with open(params_path, 'r') as f:
+        return yaml.safe_load(f)
+
+
+def evaluate():
+    """Evaluate the trained model and write eval_metrics.json"""
+    params = load_params()
+    k = params['evaluation']['k']
+    repeats = params['evaluation']['latency_repeats']
+
+    model_path = os.path.join(os.path.dirname(__file__), 'models', 'recommendation_model.joblib')
+    model = GymRecommendationModel().load(model_path)
+
+    queries = sample_queries(model.df, params['training']['test_size'], params['training']['random_state'])
+    print(f"Evaluating {len(queries)} sampled queries at k={k}")
+
+    similar_p, similar_ndcg, similar_latency = evaluate_similar(model, queries, k, repeats)
+    recommend_p, recommend_ndcg, recommend_latency = evaluate_recommend(model, queries, k, repeats)
+
+    metrics = {
+        'num_queries': len(queries),
+        'k': k,
+        'similar': {
+            f'precision_at_{k}': mean(similar_p),
+            f'ndcg_at_{k}': mean(similar_ndcg),
+            'latency': latency_percentiles(similar_latency),
+        },
+        'recommend': {
+            f'precision_at_{k}': mean(recommend_p),
+            f'ndcg_at_{k}': mean(recommend_ndcg),
+            'latency': latency_percentiles(recommend_latency),
+        },
+    }
+
+    metrics_path = os.path.join(os.path.dirname(__file__), 'eval_metrics.json')
+    with open(metrics_path, 'w') as f:
+        json.dump(metrics, f, indent=2)
+
+    print(f"Metrics saved to {metrics_path}")
+    return metrics
+
+
+if __name__ == '__main__':
+    metrics = evaluate()
+    print("\nEvaluation complete!")
+    print(f"Metrics: {json.dumps(metrics, indent=2)}")
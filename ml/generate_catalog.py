@@ -0,0 +1,231 @@
+"""
+Synthetic Catalog Generator
+Writes a megaGymDataset.csv-schema catalog of any size (10k to 10M rows)
+plus matching user/favorites fixtures for MockClient, for scale testing.
+
+Output is fully determined by --seed and --rows. Rows are generated and
+written in fixed-size chunks, so memory stays flat whatever the size.
+Facet, rating and description distributions approximate the real dataset.
+
+Usage:
+    python ml/generate_catalog.py --rows 1000000 --out ml/data/synthetic_1m.csv \\
+        --users 10000 --fixtures ml/data/synthetic_1m_fixtures.jsonl
+"""
+import argparse
+import csv
+import json
+import os
+import uuid
+from datetime import datetime, timedelta
+
+import numpy as np
+
+
+# Rows generated per chunk; part of the output definition (keeps --seed reproducible)
+CHUNK_ROWS = 50000
+
+COLUMNS = ['', 'Title', 'Desc', 'Type', 'BodyPart', 'Equipment', 'Level', 'Rating', 'RatingDesc']
+
+# Facet shares, roughly those of megaGymDataset.csv
+TYPES = {
+    'Strength': 0.87, 'Stretching': 0.05, 'Plyometrics': 0.033, 'Powerlifting': 0.013,
+    'Olympic Weightlifting': 0.012, 'Cardio': 0.012, 'Strongman': 0.01,
+}
+BODY_PARTS = {
+    'Abdominals': 0.227, 'Quadriceps': 0.221, 'Shoulders': 0.117, 'Chest': 0.09, 'Biceps': 0.058,
+    'Triceps': 0.052, 'Lats': 0.042, 'Hamstrings': 0.041, 'Middle Back': 0.04, 'Lower Back': 0.033,
+    'Glutes': 0.028, 'Calves': 0.016, 'Forearms': 0.011, 'Traps': 0.008, 'Abductors': 0.007,
+    'Adductors': 0.006, 'Neck': 0.003,
+}
+EQUIPMENT = {
+    'Body Only': 0.369, 'Dumbbell': 0.177, 'Barbell': 0.097, 'Cable': 0.077, 'Machine': 0.06,
+    'Other': 0.054, 'Kettlebells': 0.051, 'Bands': 0.034, 'Medicine Ball': 0.013,
+    'Exercise Ball': 0.012, 'E-Z Curl Bar': 0.008, 'Foam Roll': 0.004,
+}
+LEVELS = {'Intermediate': 0.838, 'Beginner': 0.157, 'Expert': 0.005}
+
+MOVEMENTS = {
+    'Abdominals': ['Crunch', 'Plank', 'Leg Raise', 'Russian Twist', 'Rollout', 'Sit-Up', 'Woodchop'],
+    'Quadriceps': ['Squat', 'Lunge', 'Leg Press', 'Step-Up', 'Leg Extension', 'Split Squat'],
+    'Shoulders': ['Shoulder Press', 'Lateral Raise', 'Front Raise', 'Upright Row', 'Face Pull'],
+    'Chest': ['Bench Press', 'Fly', 'Push-Up', 'Dip', 'Pullover', 'Crossover'],
+    'Biceps': ['Curl', 'Hammer Curl', 'Preacher Curl', 'Concentration Curl', 'Drag Curl'],
+    'Triceps': ['Extension', 'Pushdown', 'Kickback', 'Skullcrusher', 'Close-Grip Press'],
+    'Lats': ['Pulldown', 'Pull-Up', 'Chin-Up', 'Straight-Arm Pulldown', 'Pullover'],
+    'Hamstrings': ['Romanian Deadlift', 'Leg Curl', 'Good Morning', 'Nordic Curl', 'Glute-Ham Raise'],
+    'Middle Back': ['Row', 'Bent-Over Row', 'Seated Row', 'Reverse Fly', 'Inverted Row'],
+    'Lower Back': ['Hyperextension', 'Deadlift', 'Superman', 'Back Extension'],
+    'Glutes': ['Hip Thrust', 'Glute Bridge', 'Kickback', 'Step-Up', 'Sumo Deadlift'],
+    'Calves': ['Calf Raise', 'Seated Calf Raise', 'Donkey Calf Raise', 'Jump Rope'],
+    'Forearms': ['Wrist Curl', 'Reverse Wrist Curl', 'Farmer Walk', 'Plate Pinch'],
+    'Traps': ['Shrug', 'High Pull', 'Carry'],
+    'Abductors': ['Hip Abduction', 'Side-Lying Leg Raise', 'Monster Walk'],
+    'Adductors': ['Hip Adduction', 'Copenhagen Plank', 'Side Lunge'],
+    'Neck': ['Neck Flexion', 'Neck Extension', 'Neck Bridge'],
+}
+MODIFIERS = [
+    'Incline', 'Decline', 'Seated', 'Standing', 'Single-Arm', 'Single-Leg', 'Alternating', 'Wide-Grip',
+    'Narrow-Stance', 'Pause', 'Tempo', 'Kneeling', 'Lying', 'Reverse', 'Weighted', 'Isometric',
+]
+
+# Description vocabulary
+OPENERS = [
+    'The {movement} is a {type} exercise that targets the {body_part}.',
+    'A {level} {movement} variation for the {body_part} using {equipment}.',
+    'This {equipment} movement builds {body_part} {quality}.',
+]
+CUES = [
+    'Keep your core braced and your spine neutral throughout.',
+    'Control the lowering phase and pause briefly at the bottom.',
+    'Drive through your heels and squeeze at the top.',
+    'Exhale as you lift and inhale as you return to the start position.',
+    'Avoid using momentum; the movement should be slow and deliberate.',
+    'Keep your shoulders down and away from your ears.',
+    'Use a weight that allows full range of motion.',
+    'Start with a light load to practice the technique.',
+]
+QUALITIES = ['strength', 'endurance', 'stability', 'power', 'mobility', 'size']
+
+RATING_MISSING = 0.65   # share of rows without a rating
+RATING_ZERO = 0.3       # share of rated rows rated 0.0
+DESC_MISSING = 0.45     # share of rows without a description
+
+FITNESS_GOALS = ['Strength', 'Muscle Gain', 'Weight Loss', 'Endurance', 'Flexibility', 'General Fitness']
+
+
+def _choice(rng, weights, size):
+    names = list(weights)
+    probs = np.array([weights[n] for n in names])
+    return np.array(names, dtype=object)[rng.choice(len(names), size=size, p=probs / probs.sum())]
+
+
+def _ratings(rng, size):
+    """Ratings skewed high (like the real data), with a block of zeros and many missing"""
+    ratings = np.round(10 * rng.beta(8, 2, size=size), 1)
+    ratings[rng.random(size) < RATING_ZERO] = 0.0
+    ratings[rng.random(size) < RATING_MISSING] = np.nan
+    return ratings
+
+
+def generate_chunk(rng, start, size):
+    """Rows start..start+size-1 as a list of CSV records"""
+    types = _choice(rng, TYPES, size)
+    body_parts = _choice(rng, BODY_PARTS, size)
+    equipment = _choice(rng, EQUIPMENT, size)
+    levels = _choice(rng, LEVELS, size)
+    ratings = _ratings(rng, size)
+    modifiers = rng.integers(len(MODIFIERS), size=size)
+    movement_picks = rng.integers(1 << 16, size=size)
+    openers = rng.integers(len(OPENERS), size=size)
+    cue_picks = rng.integers(len(CUES), size=(size, 2))
+    qualities = rng.integers(len(QUALITIES), size=size)
+    has_desc = rng.random(size) >= DESC_MISSING
+
+    rows = []
+    for i in range(size):
+        movements = MOVEMENTS[body_parts[i]]
+        movement = movements[movement_picks[i] % len(movements)]
+        gear = '' if equipment[i] in ('Body Only', 'Other') else equipment[i] + ' '
+        # Row number keeps titles unique (favorites key on title)
+        title = f"{MODIFIERS[modifiers[i]]} {gear}{movement} {start + i}"
+
+        desc = ''
+        if has_desc[i]:
+            opener = OPENERS[openers[i]].format(
+                movement=movement.lower(), type=types[i].lower(), body_part=body_parts[i].lower(),
+                level=levels[i].lower(), equipment=equipment[i].lower(), quality=QUALITIES[qualities[i]],
+            )
+            first, second = cue_picks[i]
+            desc = ' '.join([opener, CUES[first]] + ([CUES[second]] if second != first else []))
+
+        rating = ratings[i]
+        rows.append([
+            start + i, title, desc, types[i], body_parts[i], equipment[i], levels[i],
+            '' if np.isnan(rating) else rating,
+            '' if np.isnan(rating) or rating == 0 else 'Average',
+        ])
+    return rows
+
+
+def sample_users(rng, num_users, num_rows, max_favorites=200):
+    """
+    Users with a heavy-tailed favorites count and a popularity-skewed
+    choice of exercises. Returns (users, {user_id: [row numbers]}).
+    """
+    base = datetime(2025, 1, 1)
+    users, picks = [], {}
+    counts = np.minimum(rng.zipf(1.7, size=num_users), min(max_favorites, num_rows))
+    for n in range(num_users):
+        user_id = str(uuid.UUID(bytes=rng.bytes(16), version=4))
+        users.append({
+            'id': user_id,
+            'email': f'user{n}@example.com',
+            'name': f'Synthetic User {n}',
+            'experience_level': str(_choice(rng, LEVELS, 1)[0]),
+            'fitness_goals': sorted(set(rng.choice(FITNESS_GOALS, size=2).tolist())),
+            'available_equipment': sorted(set(_choice(rng, EQUIPMENT, 3).tolist())),
+            'created_at': (base + timedelta(minutes=int(n))).isoformat(),
+        })
+        # Zipf ranks scattered over the catalog by a multiplicative hash
+        chosen = []
+        while len(chosen) < counts[n]:
+            row = int(rng.zipf(1.3)) * 2654435761 % num_rows
+            if row not in chosen:
+                chosen.append(row)
+        picks[user_id] = chosen
+    return users, picks
+
+
+def generate(rows, out_path, seed=42, num_users=0, fixtures_path=None):
+    """Stream the catalog to out_path and, optionally, fixtures to fixtures_path"""
+    rng = np.random.default_rng(seed)
+    users, picks = sample_users(np.random.default_rng([seed, 1]), num_users, rows) if num_users else ([], {})
+    wanted = {row for chosen in picks.values() for row in chosen}
+    titles = {}
+
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    with open(out_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        for start in range(0, rows, CHUNK_ROWS):
+            chunk = generate_chunk(rng, start, min(CHUNK_ROWS, rows - start))
+            writer.writerows(chunk)
+            titles.update((record[0], record[1]) for record in chunk if record[0] in wanted)
+            print(f"  {start + len(chunk)}/{rows} rows", end='\r')
+    print(f"\nWrote {rows} exercises to {out_path}")
+
+    if fixtures_path:
+        write_fixtures(fixtures_path, users, picks, titles)
+        print(f"Wrote {len(users)} users and {sum(map(len, picks.values()))} favorites to {fixtures_path}")
+
+
+def write_fixtures(path, users, picks, titles):
+    """JSON Lines of {"table": ..., "row": ...}, users before their favorites"""
+    base = datetime(2025, 6, 1)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        for user in users:
+            f.write(json.dumps({'table': 'users', 'row': user}) + '\n')
+        for n, user in enumerate(users):
+            for k, row in enumerate(picks[user['id']]):
+                favorite = {
+                    'id': str(uuid.uuid5(uuid.NAMESPACE_URL, f"{user['id']}/{row}")),
+                    'user_id': user['id'],
+                    'exercise_title': titles[row],
+                    'created_at': (base + timedelta(minutes=n, seconds=k)).isoformat(),
+                }
+                f.write(json.dumps({'table': 'favorites', 'row': favorite}) + '\n')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate a synthetic exercise catalog")
+    parser.add_argument('--rows', type=int, default=10000, help="Catalog size")
+    parser.add_argument('--out', default=os.path.join(os.path.dirname(__file__), 'data', 'synthetic_catalog.csv'))
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--users', type=int, default=0, help="Synthetic users for the fixtures file")
+    parser.add_argument('--fixtures', help="Where to write user/favorites fixtures (JSON Lines)")
+    args = parser.parse_args()
+
+    if args.users and not args.fixtures:
+        parser.error("--users requires --fixtures")
+    generate(args.rows, args.out, args.seed, args.users, args.fixtures)
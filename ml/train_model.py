@@ -4,6 +4,7 @@ Trains the recommendation model and logs to MLFlow
 """
 import pandas as pd
 import numpy as np
+import argparse
 import os
 import json
 import yaml
@@ -22,8 +23,6 @@ if os.getenv('DAGSHUB_USERNAME') and not os.getenv('MLFLOW_TRACKING_USERNAME'):
 if os.getenv('DAGSHUB_TOKEN') and not os.getenv('MLFLOW_TRACKING_PASSWORD'):
     os.environ['MLFLOW_TRACKING_PASSWORD'] = os.getenv('DAGSHUB_TOKEN')
 
-import mlflow
-import mlflow.sklearn
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 
@@ -31,6 +30,8 @@ from sklearn.metrics.pairwise import cosine_similarity
 import sys
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
 from app.ml.recommendation_model import GymRecommendationModel
+from app.ml.evaluation import sample_queries
+from app.ml.sweep import expand_grid, sample_space, run_sweep, pareto_front, select_best
 
 
 def load_params():
@@ -40,7 +41,60 @@ def load_params():
         return yaml.safe_load(f)
 
 
-def train_model():
+def model_params(params):
+    """Vectorizer keyword arguments from the `model` section of params.yaml"""
+    model_params = dict(params['model'])
+    model_params['ngram_range'] = tuple(model_params['ngram_range'])
+    return model_params
+
+
+def sweep(df, params, strategy, trials=None, workers=None):
+    """
+    Score candidate vectorizer configurations in parallel and return the
+    `model` params of the Pareto-best one, plus a summary for metrics.json
+    """
+    space = params['sweep']['space']
+    if strategy == 'grid':
+        configs = expand_grid(space)
+    else:
+        configs = sample_space(space, trials or params['sweep']['trials'], params['training']['random_state'])
+    
+    queries = sample_queries(df, params['training']['test_size'], params['training']['random_state'])
+    print(f"Sweeping {len(configs)} configurations ({strategy}) over {len(queries)} sampled queries")
+    
+    results = run_sweep(
+        df,
+        configs,
+        queries,
+        k=params['evaluation']['k'],
+        stop_words=params['model']['stop_words'],
+        workers=workers or params['sweep'].get('workers')
+    )
+    
+    for result in sorted(results, key=lambda r: -r.get('quality', -1)):
+        if 'error' in result:
+            print(f"  {result['config']}: failed ({result['error']})")
+        else:
+            print(f"  {result['config']}: quality={result['quality']} "
+                  f"p95={result['latency_ms']}ms matrix={result['matrix_bytes']}B")
+    
+    best = select_best(results)
+    if best is None:
+        raise ValueError("No sweep configuration could be fitted")
+    print(f"Best configuration: {best['config']}")
+    
+    best_params = {**model_params(params), **best['config']}
+    best_params['ngram_range'] = tuple(best_params['ngram_range'])
+    summary = {
+        'strategy': strategy,
+        'candidates': len(configs),
+        'pareto_front_size': len(pareto_front(results)),
+        'best': {**best, 'config': {**best['config'], 'ngram_range': list(best_params['ngram_range'])}},
+    }
+    return best_params, summary
+
+
+def train_model(sweep_strategy=None, trials=None, workers=None):
     """Train and save the recommendation model"""
     
     # Load parameters
@@ -53,9 +107,14 @@ def train_model():
     print(f"Loaded {len(df)} exercises")
     print(f"Columns: {df.columns.tolist()}")
     
-    # Initialize and fit model
+    fit_params = model_params(params)
+    sweep_summary = None
+    if sweep_strategy:
+        fit_params, sweep_summary = sweep(df, params, sweep_strategy, trials, workers)
+    
+    # Initialize and fit model (the sweep winner is refit on the raw text)
     model = GymRecommendationModel()
-    model.fit(df)
+    model.fit(df, **fit_params)
     
     # Calculate metrics
     metrics = {
@@ -68,6 +127,8 @@ def train_model():
     # Test the model
     test_recommendations = model.recommend(body_part='Chest', limit=5)
     metrics['test_recommendations_count'] = len(test_recommendations)
+    if sweep_summary:
+        metrics['sweep'] = sweep_summary
     
     # Save model
     model_path = os.path.join(os.path.dirname(__file__), 'models', 'recommendation_model.joblib')
@@ -85,10 +146,16 @@ def train_model():
     
     # Log to MLFlow if configured
     if os.getenv('MLFLOW_TRACKING_URI'):
+        # Imported only when logging: mlflow is slow to import
+        import mlflow
+        import mlflow.sklearn
+        
         with mlflow.start_run():
             # Log parameters
-            mlflow.log_param('max_features', params['model']['max_features'])
-            mlflow.log_param('ngram_range', str(params['model']['ngram_range']))
+            mlflow.log_param('max_features', fit_params['max_features'])
+            mlflow.log_param('ngram_range', str(fit_params['ngram_range']))
+            mlflow.log_param('min_df', fit_params['min_df'])
+            mlflow.log_param('max_df', fit_params['max_df'])
             mlflow.log_param('num_exercises', len(df))
             
             # Log metrics
@@ -114,6 +181,12 @@ def train_model():
 
 
 if __name__ == '__main__':
-    model, metrics = train_model()
+    parser = argparse.ArgumentParser(description="Train the recommendation model")
+    parser.add_argument('--sweep', choices=['grid', 'random'], help="Sweep params.yaml `sweep.space` before training")
+    parser.add_argument('--trials', type=int, help="Configurations to sample with --sweep random")
+    parser.add_argument('--workers', type=int, help="Sweep processes (default: all cores)")
+    args = parser.parse_args()
+    
+    model, metrics = train_model(args.sweep, args.trials, args.workers)
     print("\nTraining complete!")
     print(f"Metrics: {json.dumps(metrics, indent=2)}")